@@ -1,7 +1,6 @@
 from flask import Flask, request, render_template, jsonify, redirect, url_for, Response
 import requests
 import json
-import time
 import os
 import sys
 from datetime import datetime
@@ -9,18 +8,30 @@ from datetime import datetime
 # Add parent directory to path for module imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from modules.llm_provider import LLMProvider
+from modules.llm_provider import LLMProvider, ResponseCache
 from modules.story_processor import SimpleStoryProcessor
 from modules.corpus_manager import process_entire_corpus
-from modules.visualization import prepare_visualization_data, export_for_html_visualization
+from modules.checkpoint import default_checkpoint_dir
+from modules.result_cache import VisualizationResultCache, corpus_fingerprint
+from modules.jobs import JobManager, ACTIVE_STATES
+from modules.telemetry import TELEMETRY
+from modules.endpoint_pool import probe_ollama, split_urls
 
 app = Flask(__name__)
 
 API_KEYS = {}
+# 'url' may list several Ollama hosts separated by commas; requests are then balanced across them
 OLLAMA_CONFIG = {'url': 'http://172.21.144.1:11434', 'enabled_models': {}}
 CORPUS_DIR = os.path.join(os.getcwd(), 'corpus_uploads')
 CORPUS_CLEAN_DIR = os.path.join(os.getcwd(), 'corpus_clean')
 os.makedirs(CORPUS_DIR, exist_ok=True)
+# Shared with the CLI runners so re-runs only pay for prompts that changed
+RESPONSE_CACHE = ResponseCache(os.getenv('LLM_CACHE_PATH', os.path.join(os.getcwd(), 'llm_response_cache.sqlite3')))
+# Finished dashboard data per corpus content, provider and model; misses run as corpus jobs on JOBS
+VISUALIZATION_CACHE = VisualizationResultCache(os.getenv('VISUALIZATION_CACHE_DIR', os.path.join(os.getcwd(), 'visualization_cache')))
+# Corpus runs happen on this bounded pool, not in request threads; state survives restarts
+JOBS = JobManager(os.getenv('JOB_STATE_PATH', os.path.join(os.getcwd(), 'jobs', 'jobs.json')),
+                  max_workers=int(os.getenv('MAX_CORPUS_JOBS', '1')))
 
 def resolve_corpus_path(corpus_name):
     """Convert corpus name to actual file path"""
@@ -48,7 +59,8 @@ def get_corpus_folders():
 # List available models from Ollama endpoint
 @app.route('/ollama_models')
 def ollama_models():
-    ollama_url = request.args.get('url', OLLAMA_CONFIG['url'])
+    # Pooled hosts serve the same models, so the first one answers for all
+    ollama_url = split_urls(request.args.get('url', OLLAMA_CONFIG['url']))[0]
     try:
         resp = requests.get(f'{ollama_url}/api/tags', timeout=5)
         if resp.status_code == 200:
@@ -74,23 +86,17 @@ def ollama_models():
 # Test Ollama connection
 @app.route('/test_ollama')
 def test_ollama():
-    ollama_url = request.args.get('url', OLLAMA_CONFIG['url'])
-    try:
-        resp = requests.get(f'{ollama_url}/api/tags', timeout=5)
-        if resp.status_code == 200:
-            try:
-                data = resp.json()
-                return jsonify({'success': True, 'models_count': len(data.get('models', []))})
-            except ValueError:
-                return jsonify({'success': False, 'error': f'Invalid JSON response. Got HTML instead. Response: {resp.text[:200]}...'})
-        else:
-            return jsonify({'success': False, 'error': f'HTTP {resp.status_code}: {resp.text[:200]}'})
-    except requests.exceptions.ConnectTimeout:
-        return jsonify({'success': False, 'error': 'Connection timeout. Is Ollama running?'})
-    except requests.exceptions.ConnectionError:
-        return jsonify({'success': False, 'error': 'Connection refused. Check if Ollama is running and URL is correct.'})
-    except Exception as e:
-        return jsonify({'success': False, 'error': f'Unexpected error: {str(e)}'})
+    urls = split_urls(request.args.get('url', OLLAMA_CONFIG['url']))
+    if len(urls) <= 1:
+        return jsonify(probe_ollama(urls[0] if urls else ''))
+    # Endpoint pool: usable while any host answers; per-host results for the settings page
+    endpoints = {url: probe_ollama(url) for url in urls}
+    healthy = [result for result in endpoints.values() if result['success']]
+    if healthy:
+        return jsonify({'success': True, 'models_count': healthy[0]['models_count'],
+                        'healthy_endpoints': len(healthy), 'endpoints': endpoints})
+    return jsonify({'success': False, 'error': '; '.join(f"{url}: {result['error']}" for url, result in endpoints.items()),
+                    'endpoints': endpoints})
 
 # List available results (JSON files)
 @app.route('/list_results')
@@ -175,6 +181,40 @@ def upload_corpus():
         return jsonify({'status': 'success', 'filename': filename})
     return jsonify({'status': 'error'})
 
+def run_corpus_job(job):
+    params = job.params
+    llm = LLMProvider(params['provider'], params['model'], API_KEYS, OLLAMA_CONFIG['url'], cache=RESPONSE_CACHE)
+    processor = SimpleStoryProcessor(llm)
+    # Resumable runs checkpoint per model and append to their output instead of truncating it;
+    # checkpointed phases are only reused for unchanged book text and processor settings
+    checkpoint_dir = default_checkpoint_dir(params['corpus_path'], params['model']) if params.get('resume') else None
+    # Books stream to disk as they finish; progress and cancellation are checked per book
+    results = process_entire_corpus(params['corpus_path'], processor, params.get('sample_size'),
+                                    checkpoint_dir=checkpoint_dir, resume=bool(params.get('resume')),
+                                    output_file=params['json_file'], keep_results=False,
+                                    progress_callback=job.report, cancel_event=job.cancel_event)
+    return {'json_file': params['json_file'], 'books': len(results)}
+
+def corpus_job_params(provider, model, corpus, corpus_path, json_file, sample_size=None, **extra):
+    return {
+        'provider': provider,
+        'model': model,
+        'corpus': corpus,
+        'corpus_path': corpus_path,
+        'sample_size': sample_size,
+        'json_file': json_file,
+        **extra
+    }
+
+def submit_corpus_job(provider, model, corpus, corpus_path, json_file, sample_size=None, **extra):
+    """(job, created) for a corpus run; an identical queued or running job is reused"""
+    params = corpus_job_params(provider, model, corpus, corpus_path, json_file, sample_size, **extra)
+    return JOBS.submit('corpus', params, run_corpus_job)
+
+def upload_output_file(corpus, model):
+    """Visualization file for a corpus_uploads folder, named per model"""
+    return f"{corpus.replace(' ', '_')}_{model}_visualization.json"
+
 @app.route('/process_corpus', methods=['POST'])
 def process_corpus():
     provider = request.form.get('provider', 'ollama')
@@ -184,74 +224,169 @@ def process_corpus():
     
     # Resolve corpus path properly
     corpus_path = resolve_corpus_path(corpus)
-    
-    llm = LLMProvider(provider, model, API_KEYS, OLLAMA_CONFIG['url'])
-    processor = SimpleStoryProcessor(llm)
-    results = process_entire_corpus(corpus_path, processor, sample_size)
-    viz_data = prepare_visualization_data(results)
+    if not os.path.exists(corpus_path):
+        return jsonify({'error': f'Corpus not found: {corpus}'}), 404
     # Save with corpus/model in filename for switching
     corpus_name = corpus.replace('clean/', '').replace('uploads/', '')
-    result_name = f"{corpus_name}_{model}_visualization.json"
-    json_file = export_for_html_visualization(viz_data, filename=result_name)
-    return jsonify({'status': 'complete', 'json_file': str(json_file)})
+    job, created = submit_corpus_job(provider, model, corpus, corpus_path,
+                                     f"{corpus_name}_{model}_visualization.json", sample_size)
+    return jsonify({'status': job['status'], 'job_id': job['job_id'], 'deduplicated': not created,
+                    'json_file': job['params']['json_file']}), 202
+
+# Job status and control
+@app.route('/jobs')
+def list_jobs():
+    return jsonify(JOBS.list_jobs(request.args.get('status')))
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+# Share of one book's analysis each phase covers, for per-scene progress percentages
+PHASE_SPANS = {'segmentation': (0.0, 0.3), 'goals': (0.3, 0.35), 'conflicts': (0.65, 0.35), 'fused': (0.3, 0.7)}
 
-# Streaming corpus processing endpoint
+def job_event_messages(event, state):
+    """Translate a job event into the pipeline step messages index.html understands.
+
+    state carries the current book's position between events of one stream.
+    """
+    kind = event.get('type')
+    
+    def percentage(book_fraction):
+        total_books = max(1, state.get('total_books', 1))
+        return round(100 * (state.get('book_index', 1) - 1 + book_fraction) / total_books, 1)
+    
+    if kind == 'job_status':
+        status = event['status']
+        if status == 'queued':
+            return [{'type': 'step_start', 'step': 1, 'message': 'Queued, waiting for a free worker...'}]
+        if status == 'running':
+            return [{'type': 'progress', 'step': 1, 'percentage': 50, 'message': 'Job started, loading corpus...'}]
+        if status == 'completed':
+            return [{'type': 'step_complete', 'step': 3, 'message': 'Visualization data ready'},
+                    {'type': 'complete', 'message': 'All steps completed successfully'}]
+        if status == 'cancelled':
+            return [{'type': 'error', 'message': 'Job cancelled'}]
+        return [{'type': 'error', 'message': event.get('error') or f'Job {status}'}]
+    if kind == 'cancel_requested':
+        return [{'type': 'step_start', 'step': 2, 'message': 'Cancelling after the current book...'}]
+    if kind == 'corpus_started':
+        state['total_books'] = event['total_books']
+        return [{'type': 'step_complete', 'step': 1, 'message': f"Corpus loaded: {event['total_books']} books"},
+                {'type': 'step_start', 'step': 2, 'message': 'Analyzing scenes, goals and conflicts...'}]
+    if kind == 'corpus_book_started':
+        state['book_index'] = event['index']
+        state['total_books'] = event['total_books']
+        return [{'type': 'progress', 'step': 2, 'percentage': percentage(0),
+                 'message': f"Book {event['index']}/{event['total_books']}: {event['book_id']}"}]
+    if kind == 'chapter_finished':
+        start, span = PHASE_SPANS['segmentation']
+        state['chapters_done'] = state.get('chapters_done', 0) + 1 if state.get('chapters_book') == event['book_id'] else 1
+        state['chapters_book'] = event['book_id']
+        total_chapters = event.get('total_chapters') or state['chapters_done']
+        return [{'type': 'progress', 'step': 2,
+                 'percentage': percentage(start + span * min(1, state['chapters_done'] / total_chapters)),
+                 'message': f"{event['book_id']}: chapter {state['chapters_done']}/{total_chapters} "
+                            f"segmented into {event['scenes']} scenes"}]
+    if kind == 'scene_finished':
+        start, span = PHASE_SPANS.get(event['phase'], (0.3, 0.7))
+        key = (event['book_id'], event['phase'])
+        state['scenes_done'] = state.get('scenes_done', 0) + 1 if state.get('scenes_key') == key else 1
+        state['scenes_key'] = key
+        return [{'type': 'progress', 'step': 2,
+                 'percentage': percentage(start + span * state['scenes_done'] / max(1, event['total_scenes'])),
+                 'message': f"{event['book_id']}: {event['phase']} for scene {event['index']}/{event['total_scenes']}"}]
+    if kind == 'error':
+        # Recoverable problems inside a book; the run continues, so report without ending the stream
+        where = event.get('book_id') or event.get('phase') or 'pipeline'
+        return [{'type': 'progress', 'step': 2, 'percentage': percentage(0) if 'book_index' in state else 0,
+                 'message': f"⚠️ {where}: {event['message']}"}]
+    if kind == 'corpus_book_finished':
+        if not event['ok']:
+            message = f"Failed to process {event['book_id']}"
+        else:
+            message = (f"Finished {event['book_id']}: {event['scenes']} scenes, {event['goals']} goals, "
+                       f"{event['conflicts']} conflicts so far")
+        return [{'type': 'progress', 'step': 2, 'percentage': percentage(1), 'message': message}]
+    if kind == 'corpus_finished':
+        return [{'type': 'step_complete', 'step': 2, 'message': f"Analyzed {event['books_done']} books"},
+                {'type': 'step_start', 'step': 3, 'message': 'Preparing visualization data...'},
+                {'type': 'progress', 'step': 3, 'percentage': 100, 'message': f"Saved to {event['output_file']}"}]
+    return []
+
+# Raw job events (book/chapter/scene/LLM call) for any number of listeners
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    if JOBS.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    
+    def generate():
+        nonlocal after
+        while True:
+            events = JOBS.wait_events(job_id, after=after, timeout=15)
+            for event in events:
+                after = event['seq']
+                yield f"id: {after}\ndata: {json.dumps(event, default=str)}\n\n"
+            if not events:
+                if JOBS.get(job_id)['status'] not in ACTIVE_STATES:
+                    return
+                yield ": keepalive\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream')
+
+# Streaming corpus progress: submits (or attaches to) a job and relays its real progress
 @app.route('/process_corpus_stream')
 def process_corpus_stream():
-    def generate():
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = JOBS.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+    else:
         provider = request.args.get('provider', 'ollama')
         model = request.args.get('model', 'gpt-oss:latest')
         corpus = request.args.get('corpus', 'clean corpus no paratext')
-        
-        try:
-            # Step 1: Scene Segmentation
-            yield f"data: {json.dumps({'type': 'step_start', 'step': 1, 'message': 'Starting scene segmentation...'})}\n\n"
-            
-            corpus_path = os.path.join(CORPUS_DIR, corpus)
-            if not os.path.exists(corpus_path):
-                yield f"data: {json.dumps({'type': 'error', 'message': f'Corpus not found: {corpus}'})}\n\n"
+        corpus_path = os.path.join(CORPUS_DIR, corpus)
+        if not os.path.exists(corpus_path):
+            return Response(f"data: {json.dumps({'type': 'error', 'message': f'Corpus not found: {corpus}'})}\n\n",
+                            mimetype='text/event-stream')
+        job, _ = submit_corpus_job(provider, model, corpus, corpus_path, upload_output_file(corpus, model),
+                                   request.args.get('sample_size', type=int))
+    job_id = job['job_id']
+    # EventSource reconnects send Last-Event-ID, so a dropped connection resumes without repeats
+    after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    
+    def generate():
+        nonlocal after
+        state = {}
+        yield f"data: {json.dumps({'type': 'job', 'job_id': job_id})}\n\n"
+        while True:
+            events = JOBS.wait_events(job_id, after=after, timeout=15)
+            for event in events:
+                after = event['seq']
+                for message in job_event_messages(event, state):
+                    if message['type'] == 'complete':
+                        message['file'] = JOBS.get(job_id)['params']['json_file']
+                    yield f"id: {after}\ndata: {json.dumps(message)}\n\n"
+            current = JOBS.get(job_id)
+            if current is None or (current['status'] not in ACTIVE_STATES and not events):
                 return
-            
-            # Simulate progress for scene segmentation
-            for i in range(0, 101, 20):
-                yield f"data: {json.dumps({'type': 'progress', 'step': 1, 'percentage': i, 'message': f'Processing scenes... {i}%'})}\n\n"
-                time.sleep(0.5)
-            
-            yield f"data: {json.dumps({'type': 'step_complete', 'step': 1, 'message': 'Scene segmentation complete'})}\n\n"
-            
-            # Step 2: Goal & Conflict Analysis
-            yield f"data: {json.dumps({'type': 'step_start', 'step': 2, 'message': 'Analyzing goals and conflicts...'})}\n\n"
-            
-            llm = LLMProvider(provider, model, API_KEYS if provider != 'ollama' else {})
-            processor = SimpleStoryProcessor(llm)
-            
-            # This is where actual processing happens
-            yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'percentage': 10, 'message': 'Initializing LLM...'})}\n\n"
-            
-            results = process_entire_corpus(corpus_path, processor)
-            
-            yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'percentage': 80, 'message': 'Analysis complete, processing results...'})}\n\n"
-            yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'percentage': 100, 'message': 'Goal and conflict analysis complete'})}\n\n"
-            yield f"data: {json.dumps({'type': 'step_complete', 'step': 2, 'message': 'Analysis complete'})}\n\n"
-            
-            # Step 3: Visualization Preparation
-            yield f"data: {json.dumps({'type': 'step_start', 'step': 3, 'message': 'Preparing visualization data...'})}\n\n"
-            
-            viz_data = prepare_visualization_data(results)
-            yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'percentage': 50, 'message': 'Generating visualization data...'})}\n\n"
-            
-            # Save with corpus/model in filename for switching
-            result_name = f"{corpus.replace(' ', '_')}_{model}_visualization.json"
-            json_file = export_for_html_visualization(viz_data, filename=result_name)
-            
-            yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'percentage': 100, 'message': f'Saved to {result_name}'})}\n\n"
-            yield f"data: {json.dumps({'type': 'step_complete', 'step': 3, 'message': 'Visualization data ready'})}\n\n"
-            
-            yield f"data: {json.dumps({'type': 'complete', 'message': 'All steps completed successfully', 'file': str(json_file)})}\n\n"
-            
-        except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            if not events:
+                # Keep proxies from closing an idle stream while a long book is analyzed
+                yield ": keepalive\n\n"
     
+    # Closing the browser only ends this stream; the job keeps running
     return Response(generate(), mimetype='text/event-stream')
 
 # List available corpus folders
@@ -269,14 +404,38 @@ def get_visualization_data():
     corpus_path = os.path.join(CORPUS_DIR, corpus)
     if not os.path.exists(corpus_path):
         return jsonify({'error': 'Corpus not found'}), 404
-    # Process corpus and return visualization data
     provider = request.args.get('provider', 'ollama')
     model = request.args.get('model', 'gpt-oss:latest')
-    llm = LLMProvider(provider, model, API_KEYS)
-    processor = SimpleStoryProcessor(llm)
-    results = process_entire_corpus(corpus_path, processor)
-    viz_data = prepare_visualization_data(results)
-    return jsonify(viz_data)
+    fingerprint = corpus_fingerprint(corpus_path)
+    key = VISUALIZATION_CACHE.make_key(fingerprint, provider, model)
+    viz_data = VISUALIZATION_CACHE.get(key)
+    if viz_data is not None:
+        return jsonify(viz_data)
+    
+    # A miss runs the corpus as a resumable job on the bounded JOBS pool, never in this request.
+    # Its output file is keyed like the cache entry, so it only ever holds books of this corpus content
+    # (never a /process_corpus_stream run's), and edited books start a new job instead of reusing old output.
+    params = corpus_job_params(provider, model, corpus, corpus_path, str(VISUALIZATION_CACHE.run_output_file(key)),
+                               resume=True, fingerprint=fingerprint)
+    job = JOBS.latest('corpus', params)
+    if job is not None and job['status'] == 'completed':
+        try:
+            with open(params['json_file'], 'r', encoding='utf-8') as f:
+                viz_data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Output of job {job['job_id']} is unreadable, running it again: {e}")
+        else:
+            VISUALIZATION_CACHE.put(key, viz_data)
+            return jsonify(viz_data)
+    elif job is not None and job['status'] == 'failed' and not request.args.get('retry'):
+        return jsonify({'error': job['error'], 'job_id': job['job_id'], 'status': 'failed'}), 500
+    job, _ = JOBS.submit('corpus', params, run_corpus_job)
+    return jsonify({'status': job['status'], 'job_id': job['job_id'], 'json_file': params['json_file']}), 202
+
+# Per-call LLM latency/token histograms and counters for Prometheus
+@app.route('/metrics')
+def metrics():
+    return Response(TELEMETRY.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/visualization')
 def visualization():
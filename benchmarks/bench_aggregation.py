@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Compare corpus-level visualization aggregation strategies on synthetic corpora.
+
+"rebuild" re-runs the original from-scratch aggregation after every book, as
+the results file used to be regenerated; "incremental" folds each book into a
+VisualizationAggregator. Also times replacing one re-analyzed book, and checks
+that both strategies produce the same visualization data.
+
+    python benchmarks/bench_aggregation.py --books 200 1000 5000
+"""
+
+import argparse
+import random
+import time
+
+from bench_utils import print_table, synthetic_book
+
+from modules.visualization import VisualizationAggregator, book_to_visualization, new_visualization_data, build_metadata
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Full rebuild vs incremental visualization aggregation")
+    parser.add_argument('--books', type=int, nargs='+', default=[200, 1000, 5000], help="Corpus sizes to test")
+    parser.add_argument('--scenes', type=int, default=40, help="Scenes per book")
+    parser.add_argument('--characters', type=int, default=2000, help="Distinct character names in the corpus")
+    parser.add_argument('--rebuild-limit', type=int, default=200,
+                        help="Largest corpus for the quadratic rebuild-per-book timing (projected above this)")
+    parser.add_argument('--seed', type=int, default=7)
+    return parser.parse_args()
+
+def legacy_prepare(results_dict):
+    """The original from-scratch aggregation, kept here as the reference implementation"""
+    visualization_data = new_visualization_data(build_metadata(
+        total_books=len(results_dict),
+        total_scenes=sum(r['scene_count'] for r in results_dict.values()),
+        total_goals=sum(r['goal_count'] for r in results_dict.values()),
+        total_conflicts=sum(r['conflict_count'] for r in results_dict.values())
+    ))
+    all_characters = set()
+    for book_id, book_data in results_dict.items():
+        book_viz = book_to_visualization(book_id, book_data)
+        visualization_data["books"].append(book_viz)
+        for goal in book_viz["goals"]:
+            all_characters.add(goal.get('character', 'Unknown'))
+        for conflict in book_viz["conflicts"]:
+            for char in conflict.get('characters_involved', []):
+                all_characters.add(char)
+        for goal in book_viz["goals"]:
+            char = goal.get('character', 'Unknown')
+            if char not in visualization_data["character_books"]:
+                visualization_data["character_books"][char] = []
+            if book_id not in visualization_data["character_books"][char]:
+                visualization_data["character_books"][char].append(book_id)
+        for conflict in book_viz["conflicts"]:
+            chars = conflict.get('characters_involved', [])
+            if len(chars) >= 2:
+                visualization_data["conflict_network"].append({
+                    "conflict_id": conflict.get('conflict_id'),
+                    "characters": chars,
+                    "book_id": book_id,
+                    "conflict_type": conflict.get('conflict_type'),
+                    "description": conflict.get('description', ''),
+                    "evidence": conflict.get('evidence', '')
+                })
+    for char in all_characters:
+        if char != 'Unknown':
+            char_books = visualization_data["character_books"].get(char, [])
+            char_conflicts = [c for c in visualization_data["conflict_network"] if char in c["characters"]]
+            visualization_data["characters"][char] = {
+                "books": char_books,
+                "book_count": len(char_books),
+                "conflict_count": len(char_conflicts)
+            }
+    return visualization_data
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def run_size(rng, book_count, args, names):
+    results = {f"book_{i:05d}": synthetic_book(rng, f"book_{i:05d}", args.scenes, names) for i in range(book_count)}
+    book_ids = list(results)
+
+    legacy, legacy_seconds = timed(lambda: legacy_prepare(results))
+
+    def incremental():
+        aggregator = VisualizationAggregator()
+        for book_id in book_ids:
+            aggregator.add_book(book_id, results[book_id])
+        return aggregator
+    aggregator, incremental_seconds = timed(incremental)
+    # Dict key order of "characters" followed set iteration before, so compare as mappings
+    matches = aggregator.to_visualization_data() == legacy
+
+    # Rebuild after every book: sum over prefixes, measured on a stride and projected
+    stride = max(1, book_count // 20)
+    if book_count <= args.rebuild_limit:
+        rebuild_seconds = 0.0
+        for n in range(stride, book_count + 1, stride):
+            prefix = {book_id: results[book_id] for book_id in book_ids[:n]}
+            rebuild_seconds += timed(lambda: legacy_prepare(prefix))[1] * stride
+        rebuild = round(rebuild_seconds, 2)
+    else:
+        # Per-book rebuild cost grows linearly, so the total is about n/2 full rebuilds
+        rebuild = f"~{round(legacy_seconds * book_count / 2, 1)}"
+
+    # Replace one re-analyzed book in the middle of the corpus
+    replaced_id = book_ids[book_count // 2]
+    replacement = synthetic_book(rng, replaced_id, args.scenes, names)
+    _, replace_seconds = timed(lambda: aggregator.replace_book(replaced_id, replacement))
+    results[replaced_id] = replacement
+    legacy_after, rebuild_after_seconds = timed(lambda: legacy_prepare(results))
+    matches = matches and aggregator.to_visualization_data() == legacy_after
+
+    return {
+        'books': book_count,
+        'full_build_s': round(legacy_seconds, 3),
+        'incremental_build_s': round(incremental_seconds, 3),
+        'rebuild_per_book_total_s': rebuild,
+        'replace_one_ms': round(replace_seconds * 1000, 3),
+        'rebuild_after_replace_s': round(rebuild_after_seconds, 3),
+        'identical': matches
+    }
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    names = [f"Character {i}" for i in range(args.characters)]
+    rows = [run_size(rng, book_count, args, names) for book_count in args.books]
+    print_table(rows, ['books', 'full_build_s', 'incremental_build_s', 'rebuild_per_book_total_s',
+                       'replace_one_ms', 'rebuild_after_replace_s', 'identical'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Chapter splitting over a whole corpus: the original six-pattern splitter against
+the single-pass chapter_boundaries engine, on str and on an mmap of each file.
+
+Every book is checked for identical chapters (ids, numbers, text) between the
+original splitter and segment_chapters; the script exits with status 1 on any
+mismatch. Without --corpus, --books synthetic books are written to a temp folder.
+
+    python benchmarks/bench_chapters.py --corpus "corpus_clean/clean corpus no paratext"
+    python benchmarks/bench_chapters.py --books 200 --marker number
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from bench_utils import print_table, synthetic_book_text
+
+from modules.call_planner import DryRunProvider
+from modules.chapter_boundaries import chapter_spans, mapped_text
+from modules.corpus_manager import list_corpus_files
+from modules.story_processor import SimpleStoryProcessor
+
+def legacy_segment_chapters(story_text, story_id="story"):
+    """segment_chapters as it was before chapter_boundaries: one full scan per pattern"""
+    chapter_patterns = [
+        r'Chapter \d+',
+        r'CHAPTER \d+',
+        r'Chapter [IVX]+',
+        r'CHAPTER [IVX]+',
+        r'\n\d+\n',
+        r'\n[IVX]+\n'
+    ]
+    chapters = []
+    current_pos = 0
+    for pattern in chapter_patterns:
+        matches = list(re.finditer(pattern, story_text, re.IGNORECASE))
+        if matches:
+            for i, match in enumerate(matches):
+                if i > 0:
+                    chapter_text = story_text[matches[i-1].end():match.start()].strip()
+                    if len(chapter_text) > 100:
+                        chapters.append({'chapter_id': f"{story_id}_chapter_{i}", 'chapter_num': i,
+                                         'text': chapter_text})
+                current_pos = match.end()
+            final_text = story_text[current_pos:].strip()
+            if len(final_text) > 100:
+                chapters.append({'chapter_id': f"{story_id}_chapter_{len(matches)+1}",
+                                 'chapter_num': len(matches) + 1, 'text': final_text})
+            break
+    if not chapters:
+        chapters = [{'chapter_id': f"{story_id}_chapter_1", 'chapter_num': 1, 'text': story_text}]
+    return chapters
+
+# Heading formats for synthetic books, one per marker style
+HEADINGS = {
+    'chapter_number': lambda n: f"Chapter {n}",
+    'chapter_roman': lambda n: f"CHAPTER {to_roman(n)}",
+    'number': lambda n: f"{n}",
+    'roman': lambda n: f"{to_roman(n)}",
+    'none': lambda n: "* * *"
+}
+
+def to_roman(n):
+    numerals = [(10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')]
+    out = ''
+    for value, numeral in numerals:
+        while n >= value:
+            out += numeral
+            n -= value
+    return out
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Chapter splitting throughput and parity over a corpus")
+    parser.add_argument('--corpus', help="Folder of *.txt books (default: generated books)")
+    parser.add_argument('--books', type=int, default=100, help="Generated books, or a limit with --corpus")
+    parser.add_argument('--chapters', type=int, default=15)
+    parser.add_argument('--paragraphs', type=int, default=40)
+    parser.add_argument('--marker', default='mixed', choices=list(HEADINGS) + ['mixed'],
+                        help="Heading style of generated books")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+def write_synthetic_corpus(args, folder):
+    rng = random.Random(args.seed)
+    styles = list(HEADINGS) if args.marker == 'mixed' else [args.marker]
+    for i in range(args.books):
+        heading = HEADINGS[styles[i % len(styles)]]
+        text = synthetic_book_text(rng, args.chapters, args.paragraphs)
+        text = re.sub(r'Chapter (\d+)', lambda match: heading(int(match.group(1))), text)
+        (Path(folder) / f"{i:04d}.txt").write_text(text, encoding='utf-8')
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def run(args, folder):
+    files = list_corpus_files(folder, args.books if args.corpus else None)
+    books = [(path.stem, path.read_text(encoding='utf-8').strip()) for path in files]
+    processor = SimpleStoryProcessor(DryRunProvider('ollama', 'benchmark'))
+
+    mismatches = []
+    markers = Counter()
+    for book_id, text in books:
+        chapters = processor.segment_chapters(text, book_id)
+        markers[chapters[0]['marker'] or 'none'] += 1
+        current = [{key: chapter[key] for key in ('chapter_id', 'chapter_num', 'text')} for chapter in chapters]
+        if current != legacy_segment_chapters(text, book_id):
+            mismatches.append(book_id)
+
+    def map_files():
+        for path in files:
+            with mapped_text(path) as view:
+                chapter_spans(view)
+
+    modes = {
+        'legacy (6 scans)': lambda: [legacy_segment_chapters(text, book_id) for book_id, text in books],
+        'segment_chapters': lambda: [processor.segment_chapters(text, book_id) for book_id, text in books],
+        'chapter_spans (str)': lambda: [chapter_spans(text) for _, text in books],
+        'chapter_spans (mmap)': map_files
+    }
+    megabytes = sum(path.stat().st_size for path in files) / 1e6
+    rows = []
+    baseline = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, fn in modes.items():
+            seconds = best_of(fn, args.repeat)
+            baseline = baseline or seconds
+            rows.append({
+                'mode': name,
+                'books': len(books),
+                'seconds': round(seconds, 4),
+                'ms_per_book': round(seconds / len(books) * 1000, 3) if books else 0.0,
+                'mb_per_s': round(megabytes / seconds, 1) if seconds else 0.0,
+                'speedup': round(baseline / seconds, 2) if seconds else 0.0
+            })
+    return rows, markers, mismatches
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        folder = args.corpus
+        if not folder:
+            write_synthetic_corpus(args, workdir)
+            folder = workdir
+        print(f"📚 Splitting chapters in {folder}")
+        rows, markers, mismatches = run(args, folder)
+
+    print()
+    print_table(rows, ['mode', 'books', 'seconds', 'ms_per_book', 'mb_per_s', 'speedup'])
+    print(f"\n🔖 Marker styles: {dict(markers)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'runs': rows, 'markers': dict(markers), 'mismatches': mismatches},
+                      f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+    if mismatches:
+        print(f"❌ {len(mismatches)} book(s) split differently from the original splitter: {mismatches[:10]}")
+        sys.exit(1)
+    print("✅ Chapters identical to the original splitter for every book")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compare the fused single-call scene analysis against the two-phase
+(goals, then conflicts) path on the same scenes.
+
+Reports call count, prompt/response tokens, wall time and output parity.
+Scenes are segmented once and shared by both paths; the response cache is
+disabled so every call reaches the model.
+
+    python benchmarks/bench_fused_analysis.py --book "corpus_clean/clean corpus no paratext/001.txt"
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from bench_utils import InstrumentedProvider, print_table
+
+from modules.llm_provider import LLMProvider
+from modules.story_processor import SimpleStoryProcessor
+from modules.concurrency import map_ordered
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fused vs two-phase scene analysis benchmark")
+    parser.add_argument('--book', required=True, help="Path to a book .txt file")
+    parser.add_argument('--provider', default='ollama')
+    parser.add_argument('--model', default='gpt-oss:latest')
+    parser.add_argument('--ollama-url', default='http://localhost:11434')
+    parser.add_argument('--max-scenes', type=int, default=20, help="Limit the number of scenes compared")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+def run_two_phase(processor, scenes, workers):
+    goals_per_scene = map_ordered(processor.analyze_goals, scenes, workers)
+    all_goals = [goal for scene_goals in goals_per_scene for goal in scene_goals]
+    conflicts_per_scene = map_ordered(lambda scene: processor.analyze_conflicts(scene, all_goals), scenes, workers)
+    return goals_per_scene, conflicts_per_scene
+
+def run_fused(processor, scenes, workers):
+    fused = map_ordered(processor.analyze_scene_fused, scenes, workers)
+    return [goals for goals, _ in fused], [conflicts for _, conflicts in fused]
+
+def goal_characters(goals):
+    return {goal.character.strip().lower() for goal in goals}
+
+def parity_report(two_phase, fused):
+    """Per-scene agreement between the two paths' outputs"""
+    goal_jaccard = []
+    for goals_a, goals_b in zip(two_phase[0], fused[0]):
+        chars_a, chars_b = goal_characters(goals_a), goal_characters(goals_b)
+        union = chars_a | chars_b
+        goal_jaccard.append(len(chars_a & chars_b) / len(union) if union else 1.0)
+    scene_count = len(goal_jaccard)
+    return {
+        'scenes': scene_count,
+        'goal_character_jaccard': round(sum(goal_jaccard) / scene_count, 3) if scene_count else 0.0,
+        'goal_count_matches': sum(1 for a, b in zip(two_phase[0], fused[0]) if len(a) == len(b)),
+        'conflict_count_matches': sum(1 for a, b in zip(two_phase[1], fused[1]) if len(a) == len(b))
+    }
+
+def main():
+    args = parse_args()
+    book_path = Path(args.book)
+    text = book_path.read_text(encoding='utf-8').strip()
+    
+    llm = InstrumentedProvider(LLMProvider(args.provider, args.model, {}, args.ollama_url))
+    processor = SimpleStoryProcessor(llm, max_workers=args.workers)
+    
+    print(f"🎬 Segmenting {book_path.stem} once for both paths...")
+    scenes = processor.segment_scenes(text, book_path.stem)[:args.max_scenes]
+    print(f"✅ Comparing on {len(scenes)} scenes")
+    
+    rows = []
+    outputs = {}
+    for name, runner in [('two_phase', run_two_phase), ('fused', run_fused)]:
+        llm.reset()
+        start = time.perf_counter()
+        goals_per_scene, conflicts_per_scene = runner(processor, scenes, args.workers)
+        wall = time.perf_counter() - start
+        outputs[name] = (goals_per_scene, conflicts_per_scene)
+        rows.append({
+            'mode': name,
+            **llm.summary(),
+            'wall_seconds': round(wall, 2),
+            'goals': sum(len(goals) for goals in goals_per_scene),
+            'conflicts': sum(len(conflicts) for conflicts in conflicts_per_scene)
+        })
+    
+    print()
+    print_table(rows, ['mode', 'calls', 'input_tokens', 'output_tokens', 'wall_seconds', 'goals', 'conflicts'])
+    parity = parity_report(outputs['two_phase'], outputs['fused'])
+    print(f"\n🔍 Parity: goal-character Jaccard {parity['goal_character_jaccard']}, "
+          f"goal counts equal in {parity['goal_count_matches']}/{parity['scenes']} scenes, "
+          f"conflict counts equal in {parity['conflict_count_matches']}/{parity['scenes']} scenes")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': rows, 'parity': parity}, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
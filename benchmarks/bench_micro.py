@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the CPU-side hot paths, with baselines and regression thresholds.
+
+Per-book cases (chapter splitting, JSON extraction, token counting) time one
+operation over a sample of synthetic books; corpus cases (visualization data,
+results file serialization, the /preview_result parse and re-serialize) run
+on synthetic corpora of each --sizes. Every case is repeated and the fastest
+repeat is compared, which is the least noisy estimate of the cost.
+
+    python benchmarks/bench_micro.py --save-baseline benchmarks/baselines/micro_baseline.json
+    python benchmarks/bench_micro.py --compare benchmarks/baselines/micro_baseline.json
+
+--compare exits with status 1 when a case is slower than its baseline by more
+than its threshold (--threshold, or THRESHOLDS for noisier cases). Baselines are
+machine-specific; refresh them on the machine that runs the comparison.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench_utils import print_table, synthetic_book, synthetic_book_text
+
+from modules.call_planner import DryRunProvider
+from modules.corpus_manager import save_corpus_results
+from modules.story_processor import SimpleStoryProcessor
+from modules.token_estimator import TokenEstimator
+from modules.visualization import prepare_visualization_data
+
+# Allowed slowdown per case before --compare reports a regression (default: --threshold)
+THRESHOLDS = {
+    'save_corpus_results': 0.35,  # Dominated by disk writes
+    'preview_result': 0.35
+}
+
+_REPLY = {'goals': [{'character': 'Kristy', 'goal': 'To keep the club together', 'evidence': 'She called a meeting.',
+                     'category': 'social', 'is_narrator': True}] * 4}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CPU hot-path micro-benchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                        help="Corpus sizes (books) for the corpus-level cases")
+    parser.add_argument('--text-books', type=int, default=20, help="Books sampled for the per-book cases")
+    parser.add_argument('--chapters', type=int, default=15)
+    parser.add_argument('--paragraphs', type=int, default=40)
+    parser.add_argument('--scenes', type=int, default=40, help="Scenes per analyzed book in corpus cases")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cases', nargs='+', help="Only run these cases")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--save-baseline', help="Write results to this baseline file")
+    parser.add_argument('--compare', help="Compare against this baseline file")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown, e.g. 0.2 = 20%%")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+def measure(fn, repeat):
+    """(min, median) seconds over repeat calls of fn"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+def book_cases(args, rng):
+    """case -> (items, fn) for the per-book hot paths"""
+    texts = [synthetic_book_text(rng, args.chapters, args.paragraphs) for _ in range(args.text_books)]
+    processor = SimpleStoryProcessor(DryRunProvider('ollama', 'benchmark'))
+    # Replies as models send them: bare, fenced and wrapped in prose
+    reply = json.dumps(_REPLY, indent=2)
+    replies = [reply, f"```json\n{reply}\n```", f"Here is the analysis you asked for:\n{reply}\nLet me know!"] * 100
+    estimator = TokenEstimator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        chapter_texts = [chapter['text'] for text in texts for chapter in processor.segment_chapters(text)]
+
+    def segment():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for text in texts:
+                processor.segment_chapters(text)
+
+    return {
+        'segment_chapters': (len(texts), segment),
+        'extract_json': (len(replies), lambda: [processor._extract_json(text) for text in replies]),
+        'count_tokens': (len(chapter_texts), lambda: [estimator.count_tokens(text, 'gpt-4') for text in chapter_texts])
+    }
+
+def corpus_cases(args, rng, size, workdir):
+    names = [f"Character {i}" for i in range(2000)]
+    results = {f"book_{i:05d}": synthetic_book(rng, f"book_{i:05d}", args.scenes, names) for i in range(size)}
+    output_file = os.path.join(workdir, f"corpus_{size}_visualization.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_corpus_results(results, workdir, is_incremental=False, output_file=output_file)
+
+    def save():
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_corpus_results(results, workdir, is_incremental=False, output_file=output_file)
+
+    def preview():
+        # What /preview_result does per request: read, parse, re-serialize (jsonify)
+        with open(output_file, 'r', encoding='utf-8') as f:
+            data = f.read()
+        json.dumps(json.loads(data))
+
+    return {
+        'prepare_visualization_data': (size, lambda: prepare_visualization_data(results)),
+        'save_corpus_results': (size, save),
+        'preview_result': (size, preview)
+    }
+
+def run_case(name, size, items, fn, repeat):
+    best, median = measure(fn, repeat)
+    return {
+        'case': name,
+        'size': size,
+        'items': items,
+        'min_s': round(best, 6),
+        'median_s': round(median, 6),
+        'per_item_us': round(best / items * 1e6, 2) if items else None
+    }
+
+def machine_info():
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+def result_key(row):
+    return f"{row['case']}@{row['size']}"
+
+def compare(rows, baseline, default_threshold):
+    """Annotate rows with the change against the baseline; returns the regressed rows"""
+    if baseline['machine'] != machine_info():
+        print(f"⚠️ Baseline was recorded on a different machine: {baseline['machine']}")
+    regressions = []
+    for row in rows:
+        previous = baseline['results'].get(result_key(row))
+        if previous is None:
+            row['status'] = 'new'
+            continue
+        change = row['min_s'] / previous['min_s'] - 1 if previous['min_s'] else 0.0
+        threshold = THRESHOLDS.get(row['case'], default_threshold)
+        row['baseline_min_s'] = previous['min_s']
+        row['change_pct'] = round(change * 100, 1)
+        if change > threshold:
+            row['status'] = 'REGRESSION'
+            regressions.append(row)
+        else:
+            row['status'] = 'faster' if change < -threshold else 'ok'
+    return regressions
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    wanted = set(args.cases) if args.cases else None
+    rows = []
+
+    print(f"📏 Per-book cases over {args.text_books} synthetic books, {args.repeat} repeats")
+    for name, (items, fn) in book_cases(args, rng).items():
+        if wanted is None or name in wanted:
+            rows.append(run_case(name, args.text_books, items, fn, args.repeat))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            print(f"📚 Corpus cases with {size} books")
+            for name, (items, fn) in corpus_cases(args, random.Random(args.seed + size), size, workdir).items():
+                if wanted is None or name in wanted:
+                    rows.append(run_case(name, size, items, fn, args.repeat))
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(rows, json.load(f), args.threshold)
+
+    print()
+    columns = ['case', 'size', 'items', 'min_s', 'median_s', 'per_item_us']
+    if args.compare:
+        columns += ['baseline_min_s', 'change_pct', 'status']
+    print_table(rows, columns)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'machine': machine_info(),
+        'args': {key: value for key, value in vars(args).items() if key not in ('save_baseline', 'compare', 'output')},
+        'results': {result_key(row): row for row in rows}
+    }
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Baseline written to {args.save_baseline}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s): " +
+              ", ".join(f"{result_key(row)} +{row['change_pct']}%" for row in regressions))
+        sys.exit(1)
+    if args.compare:
+        print(f"\n✅ No regressions against {args.compare}")
+
+if __name__ == '__main__':
+    main()
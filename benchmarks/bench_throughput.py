@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline throughput for each execution mode against the synthetic backend.
+
+Every mode runs the real SimpleStoryProcessor and LLMProvider over the same
+books, with the model replaced by modules.synthetic_backend: in-process by
+default, or over HTTP through the Ollama-compatible server with --http (needs
+the ollama package). Latency follows --latency (e.g. "lognormal:0.8:0.5" or
+"fixed:0.05") plus --per-token seconds per output token; --failure-rate
+injects 503/429/500 errors, which the retry policy absorbs.
+
+Reports books/hour, calls/sec and p50/p99 call latency per mode.
+
+    python benchmarks/bench_throughput.py --books 4 --latency fixed:0.05 --workers 8
+    python benchmarks/bench_throughput.py --corpus "corpus_clean/clean corpus no paratext" --books 2 \\
+        --replay-cache llm_response_cache.sqlite3 --replay-model gpt-oss:latest
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+
+from bench_utils import percentile, print_table, synthetic_book_text
+
+from modules.corpus_manager import list_corpus_files
+from modules.llm_provider import LLMProvider, ResponseCache
+from modules.rate_limit import RetryPolicy
+from modules.story_processor import SimpleStoryProcessor
+from modules.synthetic_backend import LatencyModel, SyntheticLLMProvider, SyntheticOllamaServer, SyntheticResponder
+from modules.telemetry import Telemetry
+
+# name -> (SimpleStoryProcessor options, run through aanalyze_story, stream responses)
+MODES = {
+    'sequential': ({'max_workers': 1}, False, False),
+    'threaded': ({}, False, False),
+    'adaptive': ({'adaptive_concurrency': True}, False, False),
+    'async': ({}, True, False),
+    'streaming': ({}, False, True),
+    'fused': ({'fused_analysis': True}, False, False),
+    'batched': ({'batch_scenes': True}, False, False),
+    'optimized': ({'narrator_heuristics': True, 'offset_segmentation': True, 'structured_output': True},
+                  False, True)
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pipeline throughput per execution mode on a synthetic backend")
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--books', type=int, default=3, help="Books per mode")
+    parser.add_argument('--corpus', help="Use books from this folder instead of generated text")
+    parser.add_argument('--chapters', type=int, default=6, help="Chapters per generated book")
+    parser.add_argument('--paragraphs', type=int, default=24, help="Paragraphs per generated chapter")
+    parser.add_argument('--workers', type=int, default=8, help="max_workers / max_in_flight for concurrent modes")
+    parser.add_argument('--latency', default='lognormal:0.2:0.5', help="kind:median[:spread] per request")
+    parser.add_argument('--per-token', type=float, default=0.0, help="Extra seconds per output token")
+    parser.add_argument('--parallel', type=int, default=None, help="Concurrent generations the backend serves")
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--replay-cache', help="ResponseCache file recorded against a real model")
+    parser.add_argument('--replay-model', help="Model the replay cache was recorded with")
+    parser.add_argument('--http', action='store_true', help="Go through the Ollama-compatible HTTP server")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+def load_books(args, rng):
+    if args.corpus:
+        return [(book_file.stem, book_file.read_text(encoding='utf-8').strip())
+                for book_file in list_corpus_files(args.corpus, args.books)]
+    return [(f"synthetic_{i:03d}", synthetic_book_text(rng, args.chapters, args.paragraphs)) for i in range(args.books)]
+
+def build_responder(args):
+    replay_cache = ResponseCache(args.replay_cache) if args.replay_cache else None
+    return SyntheticResponder(LatencyModel.from_spec(args.latency, args.per_token, seed=args.seed),
+                              failure_rate=args.failure_rate, replay_cache=replay_cache,
+                              replay_model=args.replay_model, seed=args.seed)
+
+def build_provider(args, responder, server, stream):
+    provider_kwargs = {'stream': stream, 'telemetry': Telemetry(),
+                       'retry_policy': RetryPolicy(max_attempts=6, base_delay=0.01, max_delay=0.2, max_retry_after=0.2)}
+    model = args.replay_model or 'synthetic'
+    if server is not None:
+        return LLMProvider('ollama', model, {}, server.url, **provider_kwargs)
+    return SyntheticLLMProvider(responder, model=model, parallel=args.parallel, **provider_kwargs)
+
+def run_mode(name, args, books, responder, server):
+    processor_kwargs, use_async, stream = MODES[name]
+    llm = build_provider(args, responder, server, stream)
+    processor = SimpleStoryProcessor(llm, **{'max_workers': args.workers, 'max_in_flight': args.workers,
+                                             **processor_kwargs})
+    calls = []
+    processor.events.subscribe(lambda event: event['type'] == 'llm_call' and calls.append(event))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for book_id, text in books:
+            if use_async:
+                asyncio.run(processor.aanalyze_story(text, book_id))
+            else:
+                processor.analyze_story(text, book_id)
+    wall = time.perf_counter() - start
+
+    latencies = sorted(call['latency_s'] for call in calls)
+    retries = sum(llm.telemetry.counters['llm_retries_total'].values())
+    return {
+        'mode': name,
+        'books': len(books),
+        'calls': len(calls),
+        'retries': retries,
+        'failed_calls': sum(1 for call in calls if not call['ok']),
+        'wall_s': round(wall, 2),
+        'books_per_hour': round(len(books) / wall * 3600, 1) if wall else 0.0,
+        'calls_per_s': round(len(calls) / wall, 2) if wall else 0.0,
+        'p50_latency': percentile(latencies, 50),
+        'p99_latency': percentile(latencies, 99)
+    }
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    books = load_books(args, rng)
+    responder = build_responder(args)
+    server = None
+    if args.http:
+        server = SyntheticOllamaServer(responder, models=[args.replay_model or 'synthetic'], parallel=args.parallel)
+        server.serve_in_background()
+        print(f"🌐 Synthetic Ollama server at {server.url}")
+
+    print(f"📚 {len(books)} books, latency {args.latency}, failure rate {args.failure_rate}, workers {args.workers}")
+    rows = []
+    try:
+        for name in args.modes:
+            print(f"⏱️ {name}...")
+            rows.append(run_mode(name, args, books, responder, server))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print()
+    print_table(rows, ['mode', 'books', 'calls', 'retries', 'failed_calls', 'wall_s', 'books_per_hour',
+                       'calls_per_s', 'p50_latency', 'p99_latency'])
+    print(f"\n🧪 Backend: {responder.get_status()}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'runs': rows, 'backend': responder.get_status()}, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+"""
+
+import sys
+import math
+import time
+import threading
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.token_estimator import TokenEstimator
+
+class InstrumentedProvider:
+    """Wraps an LLMProvider and records calls, prompt/response tokens and latency per call"""
+
+    def __init__(self, inner, token_estimator=None):
+        self.inner = inner
+        self.provider = inner.provider
+        self.model = inner.model
+        self.token_estimator = token_estimator or TokenEstimator()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _record(self, prompt, response_text, latency):
+        call = {
+            'input_tokens': self.token_estimator.count_tokens(prompt, self.model),
+            'output_tokens': self.token_estimator.count_tokens(response_text or '', self.model),
+            'latency': latency,
+            'ok': bool(response_text)
+        }
+        with self._lock:
+            self.calls.append(call)
+
+    def call_llm(self, prompt, **kwargs):
+        start = time.perf_counter()
+        response_text = self.inner.call_llm(prompt, **kwargs)
+        self._record(prompt, response_text, time.perf_counter() - start)
+        return response_text
+
+    async def acall_llm(self, prompt, **kwargs):
+        start = time.perf_counter()
+        response_text = await self.inner.acall_llm(prompt, **kwargs)
+        self._record(prompt, response_text, time.perf_counter() - start)
+        return response_text
+
+    def __getattr__(self, name):
+        # Everything else (cache, generation_params, ...) comes from the wrapped provider
+        return getattr(self.inner, name)
+
+    def reset(self):
+        with self._lock:
+            self.calls = []
+
+    def summary(self):
+        with self._lock:
+            calls = list(self.calls)
+        latencies = sorted(call['latency'] for call in calls)
+        return {
+            'calls': len(calls),
+            'failed_calls': sum(1 for call in calls if not call['ok']),
+            'input_tokens': sum(call['input_tokens'] for call in calls),
+            'output_tokens': sum(call['output_tokens'] for call in calls),
+            'call_seconds': round(sum(latencies), 3),
+            'p50_latency': percentile(latencies, 50),
+            'p99_latency': percentile(latencies, 99)
+        }
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index], 4)
+
+def print_table(rows, columns):
+    """Print a list of dicts as an aligned text table"""
+    widths = {col: max(len(col), *(len(str(row.get(col, ''))) for row in rows)) for col in columns}
+    print("  ".join(col.ljust(widths[col]) for col in columns))
+    print("  ".join('-' * widths[col] for col in columns))
+    for row in rows:
+        print("  ".join(str(row.get(col, '')).ljust(widths[col]) for col in columns))
+
+# Synthetic corpora, seeded by the caller's random.Random so runs are reproducible
+_SENTENCES = [
+    "Kristy called the meeting to order at exactly five-thirty.",
+    "Claudia passed around a bag of licorice she had hidden under her bed.",
+    "Mary Anne wrote the new job in the record book without a word.",
+    "Stacey said she could not sit for the Pikes on Saturday.",
+    "Dawn looked out the window at the rain and sighed.",
+    "Nobody wanted to be the one to tell Mrs. Newton."
+]
+
+def synthetic_book_text(rng, chapters, paragraphs):
+    """Book text with "Chapter N" headings over paragraphs of stock sentences"""
+    parts = []
+    for chapter in range(1, chapters + 1):
+        body = "\n\n".join(" ".join(rng.choice(_SENTENCES) for _ in range(rng.randint(3, 7)))
+                           for _ in range(paragraphs))
+        parts.append(f"Chapter {chapter}\n\n{body}")
+    return "\n\n".join(parts)
+
+def synthetic_book(rng, book_id, scenes, names):
+    """An analyzed book entry (scene/goal/conflict lists and counts) with a cast drawn from names"""
+    goals, conflicts = [], []
+    cast = rng.sample(names, 12)
+    for scene in range(scenes):
+        for _ in range(rng.randint(1, 4)):
+            goals.append({'character': rng.choice(cast), 'goal': 'To win', 'evidence': '...',
+                          'scene_id': f"{book_id}_scene_{scene}"})
+        for _ in range(rng.randint(0, 2)):
+            conflicts.append({'conflict_id': f"{book_id}_conflict_{len(conflicts)}",
+                              'characters_involved': rng.sample(cast, rng.randint(1, 3)),
+                              'conflict_type': 'interpersonal', 'description': 'They argue', 'evidence': '...'})
+    return {
+        'book_title': book_id,
+        'scene_count': scenes,
+        'goal_count': len(goals),
+        'conflict_count': len(conflicts),
+        'scenes': [{'scene_id': f"{book_id}_scene_{scene}"} for scene in range(scenes)],
+        'goals': goals,
+        'conflicts': conflicts
+    }
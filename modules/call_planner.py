@@ -0,0 +1,234 @@
+import io
+import re
+import json
+import contextlib
+from pathlib import Path
+from typing import Optional
+
+from .story_processor import SimpleStoryProcessor
+from .token_estimator import TokenEstimator
+from .windowing import paragraph_spans
+
+# Prompt openings identify the phase a request belongs to
+PHASE_MARKERS = [
+    ('narrator', 'Identify the narrator/point-of-view character'),
+    ('segmentation', 'identify scene breaks'),
+    ('fused', 'Analyze character goals and conflicts in this'),
+    ('goals_batch', 'Analyze character goals in each of these'),
+    ('conflicts_batch', 'Analyze conflicts in each of these'),
+    ('goals', 'Analyze character goals in this'),
+    ('conflicts', 'Analyze conflicts in this')
+]
+
+# Rough request latency model: fixed overhead plus prompt processing and generation rates
+DEFAULT_THROUGHPUT = {
+    'ollama': {'request_overhead_s': 0.3, 'prompt_tokens_per_s': 1500, 'output_tokens_per_s': 40},
+    'openai': {'request_overhead_s': 0.5, 'prompt_tokens_per_s': 20000, 'output_tokens_per_s': 80},
+    'anthropic': {'request_overhead_s': 0.5, 'prompt_tokens_per_s': 20000, 'output_tokens_per_s': 70}
+}
+
+# build_processor settings CallPlanner passes on to its SimpleStoryProcessor: the ones that change
+# which requests are sent, or how many run at once. Transport settings (streaming, retries, pacing,
+# hedging, the response cache) do not change the plan.
+PLANNED_SETTINGS = ('max_workers', 'adaptive_concurrency', 'fused_analysis', 'batch_scenes', 'batch_token_budget',
+                    'narrator_heuristics', 'narrator_confidence', 'offset_segmentation', 'token_windows',
+                    'window_overlap_tokens', 'context_size', 'structured_output', 'json_retries')
+
+_FILLER = "She said she would be there right after school, so we waited on the porch for her."
+
+def prompt_phase(prompt: str) -> str:
+    head = prompt[:200]
+    for phase, marker in PHASE_MARKERS:
+        if marker in head:
+            return phase
+    return 'other'
+
+class DryRunProvider:
+    """Stand-in for LLMProvider that records every prompt and answers with synthetic JSON.
+
+    The responses have the shape (and roughly the size) of real ones, so the real
+    pipeline runs end to end: scenes_per_chapter scenes per segmentation request,
+    goals_per_scene goals and conflicts_per_scene conflicts per scene.
+    """
+
+    def __init__(self, provider: str, model: str, scenes_per_chapter: int = 3, goals_per_scene: int = 3,
+                 conflicts_per_scene: int = 1):
+        self.provider = provider
+        self.model = model
+        self.generation_params = {}
+        self.cache = None
+        self.stream = False
+        self.scenes_per_chapter = scenes_per_chapter
+        self.goals_per_scene = goals_per_scene
+        self.conflicts_per_scene = conflicts_per_scene
+        self.calls = []  # (phase, prompt, response)
+
+    def call_llm(self, prompt: str, schema: Optional[dict] = None, phase: Optional[str] = None) -> str:
+        phase = prompt_phase(prompt)
+        response_text = json.dumps(self._respond(phase, prompt), indent=2)
+        self.calls.append((phase, prompt, response_text))
+        return response_text
+
+    async def acall_llm(self, prompt: str, schema: Optional[dict] = None, phase: Optional[str] = None) -> str:
+        return self.call_llm(prompt, schema)
+
+    def get_status(self):
+        return {'provider': self.provider, 'model': self.model, 'client_ready': True, 'dry_run': True}
+
+    def _goals(self):
+        return [{'character': 'Character Name', 'goal': 'To convince her friends to start the club',
+                 'evidence': _FILLER, 'category': 'social', 'is_narrator': i == 0}
+                for i in range(self.goals_per_scene)]
+
+    def _conflicts(self):
+        return [{'character1': 'Character Name', 'character2': 'Other Character', 'conflict_type': 'disagreement',
+                 'description': 'They disagree about who should take the job', 'evidence': _FILLER,
+                 'involves_narrator': True}
+                for _ in range(self.conflicts_per_scene)]
+
+    def _respond(self, phase: str, prompt: str) -> dict:
+        if phase == 'narrator':
+            return {'narrator': 'Character Name', 'confidence': 'high', 'evidence': _FILLER}
+        if phase == 'segmentation':
+            return {'scenes': self._scenes(prompt)}
+        if phase == 'goals':
+            return {'goals': self._goals()}
+        if phase == 'conflicts':
+            return {'conflicts': self._conflicts()}
+        if phase == 'fused':
+            return {'goals': self._goals(), 'conflicts': self._conflicts()}
+        if phase in ('goals_batch', 'conflicts_batch'):
+            key = 'goals' if phase == 'goals_batch' else 'conflicts'
+            items = self._goals() if key == 'goals' else self._conflicts()
+            scene_ids = re.findall(r'^=== Scene: (.+?) ===$', prompt, re.MULTILINE)
+            return {'scenes': [{'scene_id': scene_id, key: items} for scene_id in scene_ids]}
+        return {}
+
+    def _scenes(self, prompt: str):
+        numbered = [int(n) for n in re.findall(r'^\[(\d+)\] ', prompt, re.MULTILINE)]
+        if numbered:
+            # Offset segmentation: spread the scene starts evenly over the numbered paragraphs
+            count = min(self.scenes_per_chapter, len(numbered))
+            return [{'scene_id': f'scene_{i + 1}', 'description': 'What happens in this scene',
+                     'start_paragraph': numbered[i * len(numbered) // count]} for i in range(count)]
+
+        text = prompt.split('\nText:\n', 1)[-1].rsplit('\n\nReturn JSON', 1)[0]
+        spans = paragraph_spans(text) or [(0, len(text))]
+        count = min(self.scenes_per_chapter, len(spans))
+        scenes = []
+        for i in range(count):
+            first, last = i * len(spans) // count, (i + 1) * len(spans) // count - 1
+            scenes.append({'scene_id': f'scene_{i + 1}', 'description': 'What happens in this scene',
+                           'text': text[spans[first][0]:spans[last][1]]})
+        return scenes
+
+class CallPlanner:
+    """Dry run of the real SimpleStoryProcessor pipeline over a corpus, without calling any model.
+
+    Chapters are split locally and every prompt the processor would send is
+    rendered and token-counted, giving per-phase call counts and input tokens.
+    Scene, goal and conflict counts (which need the model) come from the
+    per-chapter/per-scene assumptions; output tokens are counted on synthetic
+    responses of realistic shape.
+    """
+
+    def __init__(self, provider: str, model: str, scenes_per_chapter: int = 3, goals_per_scene: int = 3,
+                 conflicts_per_scene: int = 1, token_estimator: Optional[TokenEstimator] = None,
+                 **processor_kwargs):
+        self.provider = provider
+        self.model = model
+        self.dry_run_provider = DryRunProvider(provider, model, scenes_per_chapter, goals_per_scene,
+                                               conflicts_per_scene)
+        self.processor = SimpleStoryProcessor(self.dry_run_provider, **processor_kwargs)
+        self.token_estimator = token_estimator or self.processor.token_estimator or TokenEstimator()
+        self.assumptions = {
+            'scenes_per_chapter': scenes_per_chapter,
+            'goals_per_scene': goals_per_scene,
+            'conflicts_per_scene': conflicts_per_scene
+        }
+
+    def plan_book(self, text: str, book_id: str) -> dict:
+        start = len(self.dry_run_provider.calls)
+        with contextlib.redirect_stdout(io.StringIO()):
+            chapters = self.processor.segment_chapters(text, book_id)
+            result = self.processor.analyze_story(text, book_id)
+        return {
+            'book_id': book_id,
+            'chapters': len(chapters),
+            'scenes': len(result['scenes']),
+            'calls': len(self.dry_run_provider.calls) - start
+        }
+
+    def plan_corpus(self, data_dir, sample_size: Optional[int] = None, throughput: Optional[dict] = None) -> dict:
+        """Per-phase call counts, tokens, cost (TokenEstimator.calculate_cost) and wall-clock projection"""
+        from .corpus_manager import list_corpus_files
+
+        self.dry_run_provider.calls = []
+        books = []
+        for book_file in list_corpus_files(data_dir, sample_size):
+            with open(book_file, 'r', encoding='utf-8') as f:
+                books.append(self.plan_book(f.read().strip(), book_file.stem))
+
+        calls = self.dry_run_provider.calls
+        input_counts = self.token_estimator.count_tokens_batch([prompt for _, prompt, _ in calls], self.model)
+        output_counts = self.token_estimator.count_tokens_batch([response for _, _, response in calls], self.model)
+
+        phases = {}
+        for (phase, _, _), input_tokens, output_tokens in zip(calls, input_counts, output_counts):
+            totals = phases.setdefault(phase, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0})
+            totals['calls'] += 1
+            totals['input_tokens'] += input_tokens
+            totals['output_tokens'] += output_tokens
+
+        total_input = sum(input_counts)
+        total_output = sum(output_counts)
+        return {
+            'provider': self.provider,
+            'model': self.model,
+            'books': len(books),
+            'chapters': sum(book['chapters'] for book in books),
+            'scenes': sum(book['scenes'] for book in books),
+            'assumptions': self.assumptions,
+            'phases': phases,
+            'total_calls': len(calls),
+            'input_tokens': total_input,
+            'output_tokens': total_output,
+            'cost': self.token_estimator.calculate_cost(self.provider, self.model, total_input, total_output),
+            'time': self.project_time(input_counts, output_counts, throughput),
+            'per_book': books
+        }
+
+    def project_time(self, input_counts, output_counts, throughput: Optional[dict] = None) -> dict:
+        """Serial seconds from the latency model, and wall-clock with max_workers requests in flight"""
+        rates = {**DEFAULT_THROUGHPUT.get(self.provider, DEFAULT_THROUGHPUT['ollama']), **(throughput or {})}
+        serial = sum(rates['request_overhead_s']
+                     + input_tokens / rates['prompt_tokens_per_s']
+                     + output_tokens / rates['output_tokens_per_s']
+                     for input_tokens, output_tokens in zip(input_counts, output_counts))
+        workers = self.processor.max_workers
+        return {
+            'serial_seconds': round(serial, 1),
+            'workers': workers,
+            # Ideal overlap; a single local GPU serializes generation, so treat this as a lower bound
+            'wall_clock_seconds': round(serial / workers, 1),
+            'wall_clock_hours': round(serial / workers / 3600, 2),
+            'rates': rates
+        }
+
+def print_plan(plan: dict):
+    print(f"🧮 Dry run for {plan['provider']}/{plan['model']}: {plan['books']} books, "
+          f"{plan['chapters']} chapters, ~{plan['scenes']} scenes")
+    assumptions = plan['assumptions']
+    print(f"   Assuming {assumptions['scenes_per_chapter']} scenes per segmentation request, "
+          f"{assumptions['goals_per_scene']} goals and {assumptions['conflicts_per_scene']} conflicts per scene")
+    for phase, totals in plan['phases'].items():
+        print(f"   {phase:<16} {totals['calls']:>7,} calls  {totals['input_tokens']:>12,} in  "
+              f"{totals['output_tokens']:>10,} out")
+    print(f"   {'total':<16} {plan['total_calls']:>7,} calls  {plan['input_tokens']:>12,} in  "
+          f"{plan['output_tokens']:>10,} out")
+    cost = plan['cost']
+    if 'error' not in cost:
+        print(f"💰 Estimated cost: ${cost['total_cost']:,.2f} {cost.get('note', '')}".rstrip())
+    time_plan = plan['time']
+    print(f"⏱️ Projected time: {time_plan['wall_clock_hours']} h with {time_plan['workers']} workers "
+          f"({round(time_plan['serial_seconds'] / 3600, 2)} h serial)")
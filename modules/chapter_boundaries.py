@@ -0,0 +1,111 @@
+import mmap
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Chapter marker styles, most preferred first; a book is split on the first style it contains.
+# Matching is case-insensitive, so "CHAPTER 3" is a chapter_number marker.
+MARKER_STYLES = [
+    'chapter_number',  # Chapter 3
+    'chapter_roman',  # Chapter IV
+    'number',  # 3 on a line of its own
+    'roman'  # IV on a line of its own
+]
+# Marker styles matched on a line of their own; the trailing newline is part of the marker
+_LINE_STYLES = frozenset({'number', 'roman'})
+_PRIORITY = {name: i for i, name in enumerate(MARKER_STYLES)}
+
+# One scan finds every style. The case-sensitive first character lets the regex engine skip
+# straight to candidates; the rest is case-insensitive. The trailing newline of line markers is
+# a lookahead, so a marker of one style never swallows the newline another style's marker
+# starts with.
+_COMBINED = (r'[Cc\n](?:(?<=[Cc])(?i:hapter (?:(?P<chapter_number>\d+)|(?P<chapter_roman>[IVX]+)))'
+             r'|(?<=\n)(?i:(?P<number>\d+)|(?P<roman>[IVX]+))(?=\n))')
+_MARKERS = re.compile(_COMBINED)
+_BYTE_MARKERS = re.compile(_COMBINED.encode())
+
+_BYTE_SPACE = frozenset(b' \t\n\r\x0b\x0c')
+
+# Chapters shorter than this after stripping are dropped (title pages, tables of contents)
+MIN_CHAPTER_LENGTH = 100
+
+@dataclass
+class ChapterSpan:
+    chapter_num: int
+    start: int
+    end: int
+    marker: Optional[str]  # None when the whole text is one chapter
+
+def find_chapter_markers(text) -> Tuple[Optional[str], List[Tuple[int, int]]]:
+    """(style, [(start, end), ...]) of the preferred marker style found in text, or (None, [])
+
+    text may be a str, bytes or an mmap; offsets index into it directly.
+    """
+    pattern = _MARKERS if isinstance(text, str) else _BYTE_MARKERS
+    found = {}
+    for match in pattern.finditer(text):
+        style = match.lastgroup
+        start, end = match.span()
+        if style in _LINE_STYLES:
+            end += 1
+        spans = found.setdefault(style, [])
+        # Each style's markers don't overlap, exactly as if it were scanned on its own
+        if not spans or start >= spans[-1][1]:
+            spans.append((start, end))
+    if not found:
+        return None, []
+    style = min(found, key=_PRIORITY.get)
+    return style, found[style]
+
+def _strip_span(text, start: int, end: int) -> Tuple[int, int]:
+    """Offsets of text[start:end].strip() without copying the slice"""
+    if isinstance(text, str):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+    else:
+        while start < end and text[start] in _BYTE_SPACE:
+            start += 1
+        while end > start and text[end - 1] in _BYTE_SPACE:
+            end -= 1
+    return start, end
+
+def chapter_spans(text, min_length: int = MIN_CHAPTER_LENGTH) -> List[ChapterSpan]:
+    """Stripped chapter offsets in text, split on its preferred marker style.
+
+    Text before the first marker is dropped, chapter i runs from marker i to
+    marker i + 1, and the chapter after the last of n markers is numbered
+    n + 1. Without markers, or without any chapter of min_length characters,
+    the whole text is one chapter. For bytes and mmaps lengths are in bytes
+    and only ASCII whitespace is stripped.
+    """
+    style, markers = find_chapter_markers(text)
+    spans = []
+    for i in range(1, len(markers)):
+        start, end = _strip_span(text, markers[i - 1][1], markers[i][0])
+        if end - start > min_length:
+            spans.append(ChapterSpan(i, start, end, style))
+    if markers:
+        start, end = _strip_span(text, markers[-1][1], len(text))
+        if end - start > min_length:
+            spans.append(ChapterSpan(len(markers) + 1, start, end, style))
+    if not spans:
+        spans = [ChapterSpan(1, 0, len(text), None)]
+    return spans
+
+@contextmanager
+def mapped_text(path):
+    """Read-only mmap of a book for chapter_spans(); decode each span with .decode('utf-8')"""
+    with open(path, 'rb') as f:
+        try:
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        try:
+            yield view
+        finally:
+            view.close()
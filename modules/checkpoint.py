@@ -0,0 +1,151 @@
+import hashlib
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from dataclasses import asdict
+from typing import Optional
+
+from .data_models import ProcessingProgress, Scene, Goal, Conflict, write_json_atomic
+
+# Pipeline phases in execution order, and the ProcessingProgress list each one fills
+PHASES = ['narrators', 'segmentation', 'goals', 'conflicts']
+PHASE_PROGRESS_FIELDS = {
+    'narrators': 'books_narrators_identified',
+    'segmentation': 'books_segmented',
+    'goals': 'books_goals_analyzed',
+    'conflicts': 'books_conflicts_analyzed'
+}
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class CheckpointStore:
+    """Durable per-book, per-phase checkpoints for SimpleStoryProcessor.analyze_story.
+
+    Each completed phase is written atomically to <checkpoint_dir>/<book_id>/<phase>.json
+    and recorded in <checkpoint_dir>/progress.json (a ProcessingProgress). With
+    resume=True, phases already on disk are loaded instead of re-run, so a restart
+    after a crash or Ctrl-C only repeats the interrupted phase.
+
+    <book_id>/book.json records the hash of the book's text and the processor's
+    run_info the phases were computed with. begin_book() discards phases saved for
+    other text or settings, and phases are only loaded for a book begun this way.
+    """
+
+    def __init__(self, checkpoint_dir, resume: bool = True):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.resume = resume
+        self.progress_path = self.checkpoint_dir / 'progress.json'
+        self.progress = ProcessingProgress.load(self.progress_path)
+        if not resume:
+            # Fresh run: phases are recomputed and overwritten, so start the bookkeeping over too
+            self.progress = ProcessingProgress([], [], [], datetime.now().isoformat(), 0)
+            self.progress.save(self.progress_path)
+        self._lock = threading.Lock()
+        self._begun = set()  # books whose phases on disk match the current text and run
+
+    def _phase_path(self, book_id: str, phase: str) -> Path:
+        return self.checkpoint_dir / book_id / f"{phase}.json"
+
+    def _manifest_path(self, book_id: str) -> Path:
+        return self.checkpoint_dir / book_id / 'book.json'
+
+    def begin_book(self, book_id: str, text: str, run_info: Optional[dict] = None):
+        """Bind book_id's checkpoints to this text and run, discarding phases saved for anything else"""
+        # Round-trip so the comparison sees exactly what was read back from disk
+        manifest = json.loads(json.dumps({'text_sha256': text_digest(text), 'run_info': run_info},
+                                         sort_keys=True, default=str))
+        try:
+            with open(self._manifest_path(book_id), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            saved = None
+        if saved != manifest:
+            stale = [phase for phase in PHASES if self._phase_path(book_id, phase).exists()]
+            if stale:
+                print(f"   ♻️ Discarding {', '.join(stale)} checkpoints of {book_id}: "
+                      f"the book text or analysis settings changed")
+                for phase in stale:
+                    self._phase_path(book_id, phase).unlink(missing_ok=True)
+                self._unmark_progress(book_id)
+            self._manifest_path(book_id).parent.mkdir(parents=True, exist_ok=True)
+            write_json_atomic(self._manifest_path(book_id), manifest)
+        with self._lock:
+            self._begun.add(book_id)
+
+    def has_phase(self, book_id: str, phase: str) -> bool:
+        return self.resume and book_id in self._begun and self._phase_path(book_id, phase).exists()
+
+    def load_phase(self, book_id: str, phase: str):
+        """Deserialized phase output, or None if it has to be (re)computed"""
+        if not self.has_phase(book_id, phase):
+            return None
+        try:
+            with open(self._phase_path(book_id, phase), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"   ⚠️ Ignoring unreadable {phase} checkpoint for {book_id}: {e}")
+            return None
+
+        if phase == 'narrators':
+            return {int(chapter_num): narrator for chapter_num, narrator in data.items()}
+        item_class = {'segmentation': Scene, 'goals': Goal, 'conflicts': Conflict}[phase]
+        return [item_class(**item) for item in data]
+
+    def save_phase(self, book_id: str, phase: str, value):
+        book_dir = self.checkpoint_dir / book_id
+        book_dir.mkdir(parents=True, exist_ok=True)
+        if phase == 'narrators':
+            data = {str(chapter_num): narrator for chapter_num, narrator in value.items()}
+        else:
+            data = [asdict(item) for item in value]
+        write_json_atomic(self._phase_path(book_id, phase), data)
+        self._mark_progress(book_id, phase)
+
+    def _mark_progress(self, book_id: str, phase: str):
+        with self._lock:
+            # Re-read first so workers sharing the directory do not drop each other's entries
+            self.progress = ProcessingProgress.load(self.progress_path)
+            completed = getattr(self.progress, PHASE_PROGRESS_FIELDS[phase])
+            if book_id not in completed:
+                completed.append(book_id)
+            self.progress.last_updated = datetime.now().isoformat()
+            self.progress.save(self.progress_path)
+
+    def _unmark_progress(self, book_id: str):
+        with self._lock:
+            self.progress = ProcessingProgress.load(self.progress_path)
+            for field_name in PHASE_PROGRESS_FIELDS.values():
+                completed = getattr(self.progress, field_name)
+                if book_id in completed:
+                    completed.remove(book_id)
+            self.progress.last_updated = datetime.now().isoformat()
+            self.progress.save(self.progress_path)
+
+    def set_total_books(self, total_books: int):
+        with self._lock:
+            self.progress.total_books = total_books
+            self.progress.last_updated = datetime.now().isoformat()
+            self.progress.save(self.progress_path)
+
+    def is_book_complete(self, book_id: str) -> bool:
+        return all(self.has_phase(book_id, phase) for phase in PHASES)
+
+    def get_status(self) -> dict:
+        return {
+            'total_books': self.progress.total_books,
+            'narrators_identified': len(self.progress.books_narrators_identified),
+            'segmented': len(self.progress.books_segmented),
+            'goals_analyzed': len(self.progress.books_goals_analyzed),
+            'conflicts_analyzed': len(self.progress.books_conflicts_analyzed),
+            'last_updated': self.progress.last_updated
+        }
+
+def default_checkpoint_dir(data_dir, model: Optional[str] = None) -> Path:
+    """checkpoints/<corpus>[_<model>] under the working directory"""
+    name = Path(data_dir).name
+    if model:
+        name = f"{name}_{model.replace(':', '_').replace('/', '_')}"
+    return Path('checkpoints') / name
@@ -0,0 +1,123 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+# Parallel request slots per provider; override with e.g. OLLAMA_MAX_WORKERS=8
+DEFAULT_MAX_WORKERS = {
+    'ollama': 4,
+    'openai': 8,
+    'anthropic': 8
+}
+
+def default_max_workers(provider: str) -> int:
+    """Worker count for a provider, honouring <PROVIDER>_MAX_WORKERS from the environment"""
+    env_value = os.getenv(f"{provider.upper()}_MAX_WORKERS")
+    if env_value:
+        try:
+            return max(1, int(env_value))
+        except ValueError:
+            pass
+    return DEFAULT_MAX_WORKERS.get(provider, 1)
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to observed latency and error rate.
+
+    Additive increase while calls succeed at close to the best latency seen,
+    multiplicative decrease on errors or when latency climbs past
+    `latency_tolerance` times that baseline (i.e. the server is queueing).
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial_limit: Optional[int] = None,
+                 latency_tolerance: float = 2.0, backoff_factor: float = 0.5, smoothing: float = 0.3):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = initial_limit or self.min_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.successes = 0
+        self.errors = 0
+        self.avg_latency = None
+        self.baseline_latency = None
+        self._successes_at_limit = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: Optional[float], ok: bool = True):
+        """latency=None frees the slot without a sample, e.g. for a response served from cache"""
+        with self._cond:
+            self.in_flight -= 1
+            if not ok:
+                self.errors += 1
+                self._decrease()
+            elif latency is not None:
+                self.successes += 1
+                self._record_latency(latency)
+            self._cond.notify_all()
+
+    def _record_latency(self, latency: float):
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = self.smoothing * latency + (1 - self.smoothing) * self.avg_latency
+        if self.baseline_latency is None or self.avg_latency < self.baseline_latency:
+            self.baseline_latency = self.avg_latency
+
+        if self.avg_latency > self.baseline_latency * self.latency_tolerance:
+            self._decrease()
+            # Let the baseline drift up so one fast outlier cannot pin us at the floor
+            self.baseline_latency = (self.baseline_latency + self.avg_latency) / 2
+            return
+
+        # Grow by one slot after a full window of healthy calls at the current limit
+        self._successes_at_limit += 1
+        if self._successes_at_limit >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes_at_limit = 0
+
+    def _decrease(self):
+        self.limit = max(self.min_limit, int(self.limit * self.backoff_factor))
+        self._successes_at_limit = 0
+
+    def get_status(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'max_limit': self.max_limit,
+                'in_flight': self.in_flight,
+                'successes': self.successes,
+                'errors': self.errors,
+                'avg_latency': self.avg_latency,
+                'baseline_latency': self.baseline_latency
+            }
+
+# Set in map_ordered's worker threads, so a map_ordered called from one of them does not start another pool
+_POOL_WORKER = threading.local()
+
+def map_ordered(fn: Callable, items: Iterable, max_workers: int = 1) -> List:
+    """Apply fn to every item using up to max_workers threads, returning results in input order.
+
+    Called from inside another map_ordered task (e.g. a scene's token windows within
+    the scene pool), items run sequentially in that task, so requests in flight stay
+    bounded by the outer max_workers rather than multiplying with each level.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1 or getattr(_POOL_WORKER, 'active', False):
+        return [fn(item) for item in items]
+
+    def run(item):
+        _POOL_WORKER.active = True
+        try:
+            return fn(item)
+        finally:
+            _POOL_WORKER.active = False
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(run, items))
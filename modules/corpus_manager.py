@@ -1,9 +1,19 @@
 from pathlib import Path
 from modules.story_processor import SimpleStoryProcessor
+from modules.llm_provider import LLMProvider, ResponseCache
+from modules.rate_limit import LLMCallError, RetryPolicy, shared_rate_limiter
+from modules.endpoint_pool import shared_endpoint_pool, split_urls
 from modules.visualization import prepare_visualization_data
+from modules.data_models import analysis_to_dict, analysis_from_dict
+from modules.work_queue import LeaseWorkQueue, default_worker_id
+from modules.checkpoint import CheckpointStore
+from modules.result_sink import StreamingResultSink
 import json
+import multiprocessing
+import traceback
 
-def process_entire_corpus(data_dir, processor, sample_size=None):
+def list_corpus_files(data_dir, sample_size=None):
+    """Sorted *.txt books in data_dir, optionally limited to the first sample_size"""
     corpus_path = Path(data_dir)
     txt_files = list(corpus_path.glob("*.txt"))
     
@@ -13,88 +23,303 @@ def process_entire_corpus(data_dir, processor, sample_size=None):
     # Apply sample size if specified
     if sample_size and sample_size < len(txt_files):
         txt_files = txt_files[:sample_size]
+    return txt_files
+
+def build_book_entry(book_id, result):
+    """Per-book record stored in the corpus results dict"""
+    scenes = result['scenes']
+    goals = result.get('goals', [])
+    conflicts = result.get('conflicts', [])
+    return {
+        'scenes': scenes,
+        'goals': goals,
+        'conflicts': conflicts,
+        'book_title': book_id.replace('_', ' ').title(),
+        'scene_count': len(scenes),
+        'goal_count': len(goals),
+        'conflict_count': len(conflicts)
+    }
+
+def default_output_file(data_dir):
+    # Create filename based on data directory
+    dir_name = Path(data_dir).name
+    return f"{dir_name}_gpt-oss:latest_visualization.json"
+
+def process_entire_corpus(data_dir, processor, sample_size=None, checkpoint_dir=None, resume=False,
+                          output_file=None, keep_results=True, compact_every=None, progress_callback=None,
+                          cancel_event=None):
+    """Analyze every book, streaming each finished book to the result sink.
+
+    Books are appended to <output>.books.jsonl with running totals in
+    <output>.meta.json; the visualization JSON is written once at the end (and
+    every compact_every books, if set, for live dashboards). keep_results=False
+    returns per-book counts only, so memory does not grow with scene text.
+
+    With checkpoint_dir, every phase of every book is checkpointed as it completes;
+    resume=True reuses those checkpoints so a restart only redoes interrupted work.
+
+    Corpus events (corpus_started, corpus_book_started, corpus_book_finished,
+    corpus_finished) go to processor.events alongside the processor's own
+    book/chapter/scene/call events; progress_callback, if given, is subscribed to
+    that bus for the duration of the run. Setting cancel_event stops the run
+    before the next book (finished books are still compacted into the output).
+    """
+    events = processor.events
+    if progress_callback is not None:
+        events.subscribe(progress_callback)
+    try:
+        return _process_corpus_books(data_dir, processor, events, sample_size, checkpoint_dir, resume, output_file,
+                                     keep_results, compact_every, cancel_event)
+    finally:
+        if progress_callback is not None:
+            events.unsubscribe(progress_callback)
+
+def _process_corpus_books(data_dir, processor, events, sample_size, checkpoint_dir, resume, output_file,
+                          keep_results, compact_every, cancel_event):
+    txt_files = list_corpus_files(data_dir, sample_size)
+    output_file = output_file or default_output_file(data_dir)
     
     all_results = {}
     total_books = len(txt_files)
+    checkpoint = CheckpointStore(checkpoint_dir, resume=resume) if checkpoint_dir else None
+    if checkpoint:
+        checkpoint.set_total_books(total_books)
+        if resume:
+            status = checkpoint.get_status()
+            print(f"⏩ Resuming from {checkpoint_dir}: {status['conflicts_analyzed']} books fully checkpointed")
+    sink = StreamingResultSink(output_file, reset=not resume)
     
     print(f"🚀 Starting corpus analysis of {total_books} books...")
-    print(f"📊 Visualization will update after each book")
+    print(f"📊 Progress is appended to {sink.records_file.name} after each book")
     print("=" * 60)
+    events.emit('corpus_started', total_books=total_books, output_file=str(output_file))
+    cancelled = False
+    failed_books = []
     
     for i, book_file in enumerate(txt_files, 1):
         book_id = book_file.stem
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"\n🛑 Cancelled before book {i}/{total_books}")
+            cancelled = True
+            break
         
         print(f"\n📖 Processing book {i}/{total_books}: {book_id}")
+        events.emit('corpus_book_started', book_id=book_id, index=i, total_books=total_books)
         
         with open(book_file, 'r', encoding='utf-8') as f:
             text = f.read().strip()
         
         # Three-phase processing returns {"scenes": [...], "goals": [...], "conflicts": [...]}
-        result = processor.analyze_story(text, book_id)
+        try:
+            result = processor.analyze_story(text, book_id, checkpoint=checkpoint)
+        except LLMCallError as e:
+            # Not recorded as an empty book; finished phases stay checkpointed for --resume
+            print(f"   ❌ {book_id} stopped by a permanent LLM failure: {e}")
+            failed_books.append(book_id)
+            result = None
         
         if result and result.get('scenes'):
-            scenes = result['scenes']
-            goals = result.get('goals', [])
-            conflicts = result.get('conflicts', [])
+            book_entry = build_book_entry(book_id, result)
+            
+            print(f"   ✅ Analysis complete: {book_entry['scene_count']} scenes, "
+                  f"{book_entry['goal_count']} goals, {book_entry['conflict_count']} conflicts")
             
-            all_results[book_id] = {
-                'scenes': scenes,
-                'goals': goals,
-                'conflicts': conflicts,
-                'book_title': book_id.replace('_', ' ').title(),
-                'scene_count': len(scenes),
-                'goal_count': len(goals),
-                'conflict_count': len(conflicts)
-            }
+            # Append this book only; running totals are updated in O(1)
+            sink.append_book(book_id, book_entry)
+            print_result_totals(sink.get_metadata(), output_file, is_incremental=True)
             
-            print(f"   ✅ Analysis complete: {len(scenes)} scenes, {len(goals)} goals, {len(conflicts)} conflicts")
+            if keep_results:
+                all_results[book_id] = book_entry
+            else:
+                all_results[book_id] = {key: value for key, value in book_entry.items()
+                                        if key not in ('scenes', 'goals', 'conflicts')}
             
-            # Save incremental results after each book
-            print(f"   💾 Updating visualization with {len(all_results)} books...")
-            save_corpus_results(all_results, data_dir, is_incremental=True)
+            if compact_every and len(all_results) % compact_every == 0:
+                print(f"   💾 Refreshing visualization with {len(all_results)} books...")
+                sink.compact()
             
         else:
             print(f"   ❌ Failed to process {book_id}")
+        events.emit('corpus_book_finished', book_id=book_id, index=i, total_books=total_books,
+                    ok=book_id in all_results, books_done=len(all_results), **sink.totals)
     
     print(f"\n🎉 Corpus analysis complete!")
     print(f"📚 Final results: {len(all_results)} books processed")
+    if failed_books:
+        print(f"⚠️ {len(failed_books)} books hit permanent LLM failures: {', '.join(failed_books)}")
     
-    # Final save with detailed summary
+    # Single final write of the visualization file
     if all_results:
         print(f"\n📊 Generating final visualization summary...")
-        save_corpus_results(all_results, data_dir, is_incremental=False)
+        try:
+            metadata = sink.compact()['metadata']
+            print_result_totals(metadata, output_file, is_incremental=False)
+        except Exception as e:
+            print(f"❌ Error saving results: {e}")
+            traceback.print_exc()
+    events.emit('corpus_finished', books_done=len(all_results), total_books=total_books, cancelled=cancelled,
+                failed_books=failed_books, output_file=str(output_file))
     
     return all_results
 
-def save_corpus_results(results, data_dir, is_incremental=True):
+def print_result_totals(metadata, filename, is_incremental=True):
+    if is_incremental:
+        # Brief progress update for incremental saves
+        print(f"   📊 Updated: {metadata['total_books']} books, "
+              f"{metadata['total_scenes']} scenes, "
+              f"{metadata['total_goals']} goals, "
+              f"{metadata['total_conflicts']} conflicts")
+    else:
+        # Detailed summary for final save
+        print(f"📊 Results saved to: {filename}")
+        print(f"📈 Total books: {metadata['total_books']}")
+        print(f"🎬 Total scenes: {metadata['total_scenes']}")
+        print(f"🎯 Total goals: {metadata['total_goals']}")
+        print(f"⚔️ Total conflicts: {metadata['total_conflicts']}")
+
+def save_corpus_results(results, data_dir, is_incremental=True, output_file=None):
     """Save corpus analysis results as visualization JSON"""
     try:
         # Create visualization data
         viz_data = prepare_visualization_data(results)
-        
-        # Create filename based on data directory
-        dir_name = Path(data_dir).name
-        filename = f"{dir_name}_gpt-oss:latest_visualization.json"
+        filename = output_file or default_output_file(data_dir)
         
         # Save to file
         with open(filename, 'w') as f:
             json.dump(viz_data, f, indent=2, default=str)
         
-        if is_incremental:
-            # Brief progress update for incremental saves
-            print(f"   📊 Updated: {viz_data['metadata']['total_books']} books, "
-                  f"{viz_data['metadata']['total_scenes']} scenes, "
-                  f"{viz_data['metadata']['total_goals']} goals, "
-                  f"{viz_data['metadata']['total_conflicts']} conflicts")
-        else:
-            # Detailed summary for final save
-            print(f"📊 Results saved to: {filename}")
-            print(f"📈 Total books: {viz_data['metadata']['total_books']}")
-            print(f"🎬 Total scenes: {viz_data['metadata']['total_scenes']}")
-            print(f"🎯 Total goals: {viz_data['metadata']['total_goals']}")
-            print(f"⚔️ Total conflicts: {viz_data['metadata']['total_conflicts']}")
+        print_result_totals(viz_data['metadata'], filename, is_incremental)
         
     except Exception as e:
         print(f"❌ Error saving results: {e}")
-        import traceback
         traceback.print_exc()
+
+def build_processor(provider, model, api_keys=None, ollama_url='http://localhost:11434',
+                    cache_path=None, stream=False, max_attempts=None, request_timeout=None,
+                    requests_per_minute=None, tokens_per_minute=None, hedge_percentile=None, **processor_kwargs):
+    """Construct a SimpleStoryProcessor from plain (picklable) settings, e.g. inside a worker process.
+
+    max_attempts enables retries with backoff (and LLMCallError on permanent failure);
+    requests_per_minute/tokens_per_minute pace calls through the shared per-provider limiter.
+    An ollama_url listing several hosts (comma-separated) balances over them, hedging
+    calls slower than hedge_percentile of recent latencies onto a second host.
+    """
+    cache = ResponseCache(cache_path) if cache_path else None
+    retry_policy = RetryPolicy(max_attempts, timeout=request_timeout) if max_attempts else None
+    rate_limiter = shared_rate_limiter(provider, requests_per_minute, tokens_per_minute)
+    endpoint_pool = None
+    if provider == 'ollama' and len(split_urls(ollama_url)) > 1:
+        endpoint_pool = shared_endpoint_pool(ollama_url, hedge_percentile=hedge_percentile)
+    llm_provider = LLMProvider(provider, model, api_keys or {}, ollama_url, cache=cache, stream=stream,
+                               retry_policy=retry_policy, rate_limiter=rate_limiter, endpoint_pool=endpoint_pool)
+    return SimpleStoryProcessor(llm_provider, **processor_kwargs)
+
+def default_queue_dir(data_dir, model=None):
+    """<corpus>/.work_queue[_<model>]: inside the corpus folder so every machine that mounts it sees the queue"""
+    name = '.work_queue'
+    if model:
+        name = f"{name}_{model.replace(':', '_').replace('/', '_')}"
+    return Path(data_dir) / name
+
+def processor_run_info(processor):
+    """What a queue's results depend on (SimpleStoryProcessor.run_info)"""
+    return processor.run_info()
+
+def run_shard_worker(data_dir, processor, queue_dir=None, worker_id=None, sample_size=None,
+                     lease_seconds=900, checkpoint_dir=None, resume=False):
+    """Claim and analyze books from the shared lease queue until none are left.
+
+    Run one of these per process or per machine; results land in the queue's
+    done/ folder and are combined with merge_shard_results. With a shared
+    checkpoint_dir and resume=True, a worker that reclaims a book resumes its
+    finished phases (only those saved for the same text and run_info).
+    Raises ValueError if the queue holds results of a different provider, model or settings.
+    """
+    worker_id = worker_id or default_worker_id()
+    checkpoint = CheckpointStore(checkpoint_dir, resume=resume) if checkpoint_dir else None
+    queue = LeaseWorkQueue(queue_dir or default_queue_dir(data_dir, processor.llm_provider.model),
+                           lease_seconds=lease_seconds, run_info=processor_run_info(processor))
+    files_by_id = {book_file.stem: book_file for book_file in list_corpus_files(data_dir, sample_size)}
+    book_ids = list(files_by_id)
+    processed = 0
+    
+    print(f"👷 Worker {worker_id} joining queue {queue.queue_dir} ({len(book_ids)} books)")
+    while True:
+        book_id = queue.claim(book_ids, worker_id)
+        if book_id is None:
+            break
+        
+        print(f"\n📖 [{worker_id}] Processing {book_id}")
+        try:
+            with open(files_by_id[book_id], 'r', encoding='utf-8') as f:
+                text = f.read().strip()
+            with queue.heartbeat(book_id, worker_id) as heartbeat:
+                result = processor.analyze_story(text, book_id, checkpoint=checkpoint)
+            # Another worker owns the book now; its result is the one that counts
+            if heartbeat.lost or not queue.complete(book_id, worker_id, analysis_to_dict(result)):
+                print(f"   ⚠️ [{worker_id}] Lost the lease on {book_id}; discarding this result")
+                continue
+            processed += 1
+            print(f"   ✅ [{worker_id}] {book_id}: {len(result.get('scenes', []))} scenes")
+        except Exception as e:
+            print(f"   ❌ [{worker_id}] Failed to process {book_id}: {e}")
+            if not queue.fail(book_id, worker_id, str(e)):
+                print(f"   ⚠️ [{worker_id}] Lost the lease on {book_id}; the failure is not counted")
+    
+    print(f"👷 Worker {worker_id} finished: {processed} books processed")
+    return processed
+
+def _shard_worker_main(data_dir, processor_config, queue_dir, sample_size, lease_seconds, checkpoint_dir, resume):
+    processor = build_processor(**processor_config)
+    run_shard_worker(data_dir, processor, queue_dir, sample_size=sample_size, lease_seconds=lease_seconds,
+                     checkpoint_dir=checkpoint_dir, resume=resume)
+
+def process_corpus_sharded(data_dir, processor_config, num_workers=2, queue_dir=None, sample_size=None,
+                           lease_seconds=900, checkpoint_dir=None, resume=False):
+    """Process the corpus with num_workers local processes sharing a lease queue, then merge.
+
+    processor_config holds build_processor keyword arguments; each worker builds
+    its own provider since SDK clients cannot be shared across processes. Other
+    machines can join the same run with run_shard_worker on the shared queue_dir.
+    """
+    queue_dir = queue_dir or default_queue_dir(data_dir, processor_config['model'])
+    # Refuse a queue of another run here, before the workers start
+    LeaseWorkQueue(queue_dir, run_info=processor_run_info(build_processor(**processor_config)))
+    print(f"🚀 Starting sharded corpus analysis with {num_workers} local workers")
+    print(f"📂 Work queue: {queue_dir}")
+    
+    workers = [
+        multiprocessing.Process(
+            target=_shard_worker_main,
+            args=(data_dir, processor_config, queue_dir, sample_size, lease_seconds, checkpoint_dir, resume),
+            name=f"shard-worker-{n}"
+        )
+        for n in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    return merge_shard_results(data_dir, queue_dir, sample_size)
+
+def merge_shard_results(data_dir, queue_dir=None, sample_size=None, model=None):
+    """Combine per-worker results from the queue into the usual visualization output"""
+    queue = LeaseWorkQueue(queue_dir or default_queue_dir(data_dir, model))
+    book_ids = [book_file.stem for book_file in list_corpus_files(data_dir, sample_size)]
+    
+    all_results = {}
+    for book_id in book_ids:
+        data = queue.load_result(book_id)
+        if data is None:
+            continue
+        result = analysis_from_dict(data)
+        if result.get('scenes'):
+            all_results[book_id] = build_book_entry(book_id, result)
+    
+    status = queue.get_status(book_ids)
+    print(f"\n🧩 Merged {len(all_results)} books from {queue.queue_dir} "
+          f"(pending: {status['pending']}, leased: {status['leased']}, failed: {status['failed']})")
+    if all_results:
+        save_corpus_results(all_results, data_dir, is_incremental=False)
+    return all_results
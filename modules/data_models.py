@@ -1,9 +1,19 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from typing import List, Optional
 from datetime import datetime
 import json
+import os
+import threading
 from pathlib import Path
 
+def write_json_atomic(path, data, **dump_kwargs):
+    """Write JSON via a temp file + rename so a crash never leaves a partial file"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=str, **dump_kwargs)
+    os.replace(tmp_path, path)
+
 @dataclass
 class Scene:
     scene_id: str
@@ -47,10 +57,10 @@ class ProcessingProgress:
     books_goals_analyzed: List[str]
     last_updated: str
     total_books: int
+    books_conflicts_analyzed: List[str] = field(default_factory=list)
 
     def save(self, filepath: Path):
-        with open(filepath, 'w') as f:
-            json.dump(asdict(self), f, indent=2)
+        write_json_atomic(filepath, asdict(self), indent=2)
 
     @classmethod
     def load(cls, filepath: Path):
@@ -59,3 +69,19 @@ class ProcessingProgress:
                 data = json.load(f)
             return cls(**data)
         return cls([], [], [], datetime.now().isoformat(), 0)
+
+def analysis_to_dict(result: dict) -> dict:
+    """Serialize an analyze_story result ({"scenes", "goals", "conflicts"}) to plain JSON data"""
+    data = dict(result)
+    for key in ('scenes', 'goals', 'conflicts'):
+        data[key] = [asdict(item) if hasattr(item, '__dataclass_fields__') else item
+                     for item in result.get(key, [])]
+    return data
+
+def analysis_from_dict(data: dict) -> dict:
+    """Inverse of analysis_to_dict, rebuilding Scene/Goal/Conflict objects"""
+    result = dict(data)
+    result['scenes'] = [Scene(**scene) for scene in data.get('scenes', [])]
+    result['goals'] = [Goal(**goal) for goal in data.get('goals', [])]
+    result['conflicts'] = [Conflict(**conflict) for conflict in data.get('conflicts', [])]
+    return result
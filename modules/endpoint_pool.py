@@ -0,0 +1,322 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from typing import Callable, List, Optional
+
+from .rate_limit import classify_error, error_status
+
+def probe_ollama(url: str, timeout: float = 5) -> dict:
+    """The /api/tags check behind /test_ollama: {'success': True, 'models_count': n} or {'success': False, 'error': ...}"""
+    import requests
+    try:
+        resp = requests.get(f'{url}/api/tags', timeout=timeout)
+        if resp.status_code == 200:
+            try:
+                data = resp.json()
+                return {'success': True, 'models_count': len(data.get('models', []))}
+            except ValueError:
+                return {'success': False, 'error': f'Invalid JSON response. Got HTML instead. Response: {resp.text[:200]}...'}
+        else:
+            return {'success': False, 'error': f'HTTP {resp.status_code}: {resp.text[:200]}'}
+    except requests.exceptions.ConnectTimeout:
+        return {'success': False, 'error': 'Connection timeout. Is Ollama running?'}
+    except requests.exceptions.ConnectionError:
+        return {'success': False, 'error': 'Connection refused. Check if Ollama is running and URL is correct.'}
+    except Exception as e:
+        return {'success': False, 'error': f'Unexpected error: {str(e)}'}
+
+def split_urls(urls) -> List[str]:
+    """A list of URLs, or one string with several separated by commas"""
+    if isinstance(urls, str):
+        urls = urls.split(',')
+    return [url.strip().rstrip('/') for url in urls if url and url.strip()]
+
+def is_endpoint_failure(error: Exception) -> bool:
+    """Whether an error says the endpoint is unhealthy: connection errors, timeouts and 5xx.
+
+    A 4xx (bad request, unknown model, rate limit) is an answer from a working server.
+    """
+    status = error_status(error)
+    if status is not None:
+        return status >= 500
+    return classify_error(error)[1] in ('timeout', 'connection')
+
+class OllamaEndpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.evicted_until = None  # monotonic time of the next readmission probe while evicted
+        self.probing = False
+        self.health = None  # last probe_ollama result
+        self.checked_at = None
+        self.avg_latency = None
+
+    @property
+    def evicted(self) -> bool:
+        return self.evicted_until is not None
+
+    def to_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'evicted': self.evicted,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'avg_latency': round(self.avg_latency, 4) if self.avg_latency is not None else None,
+            'health': self.health
+        }
+
+class OllamaEndpointPool:
+    """Several Ollama hosts serving the same models, used as one.
+
+    Each request goes to the healthy endpoint with the fewest requests in
+    flight. failure_threshold consecutive failures evict an endpoint; every
+    readmit_after seconds it is probed with /api/tags in the background and
+    readmitted once the probe succeeds. Probe results are cached for
+    health_ttl seconds. Only connection errors, timeouts and 5xx count as failures
+    (is_endpoint_failure); a 4xx is a reply from a working server.
+
+    With hedge_percentile set (e.g. 0.95), a call still running after that
+    percentile of recent latencies is duplicated on a second endpoint and the
+    first successful reply wins; async losers are cancelled, which closes their
+    stream and stops generation server-side.
+    """
+
+    def __init__(self, urls, failure_threshold: int = 3, readmit_after: float = 30.0, health_ttl: float = 30.0,
+                 probe_timeout: float = 5.0, hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20,
+                 hedge_workers: int = 32, probe: Callable[[str, float], dict] = probe_ollama):
+        self.endpoints = [OllamaEndpoint(url) for url in split_urls(urls)]
+        if not self.endpoints:
+            raise ValueError("OllamaEndpointPool needs at least one URL")
+        self.failure_threshold = max(1, failure_threshold)
+        self.readmit_after = readmit_after
+        self.health_ttl = health_ttl
+        self.probe_timeout = probe_timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.probe = probe
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=500)
+        self._next = 0
+        self._lock = threading.Lock()
+        self._hedge_workers = hedge_workers
+        self._executor = None
+
+    @property
+    def urls(self) -> List[str]:
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def acquire(self, exclude: Optional[OllamaEndpoint] = None) -> Optional[OllamaEndpoint]:
+        """Least-outstanding endpoint, counted as in flight until release(); None if only exclude is left"""
+        now = time.monotonic()
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.evicted and endpoint.evicted_until <= now and not endpoint.probing:
+                    endpoint.probing = True
+                    threading.Thread(target=self._readmission_probe, args=(endpoint,), daemon=True).start()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint is not exclude]
+            if not candidates:
+                return None
+            healthy = [endpoint for endpoint in candidates if not endpoint.evicted]
+            if healthy:
+                # Rotate the starting point so idle endpoints share sequential traffic
+                count = len(self.endpoints)
+                start = self._next
+                self._next = (self._next + 1) % count
+                positions = {id(endpoint): i for i, endpoint in enumerate(self.endpoints)}
+                endpoint = min(healthy, key=lambda e: (e.outstanding, (positions[id(e)] - start) % count))
+            elif exclude is not None:
+                return None  # Never hedge onto an evicted endpoint
+            else:
+                # Everything is evicted: keep going on the endpoint closest to readmission
+                endpoint = min(candidates, key=lambda e: e.evicted_until)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: OllamaEndpoint, latency: Optional[float] = None, ok: Optional[bool] = None):
+        """ok=None (a cancelled hedge) only frees the slot; ok=True without a latency is not sampled"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok is None:
+                return
+            if ok:
+                endpoint.consecutive_failures = 0
+                if latency is not None:
+                    self._latencies.append(latency)
+                    endpoint.avg_latency = latency if endpoint.avg_latency is None else \
+                        0.3 * latency + 0.7 * endpoint.avg_latency
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if not endpoint.evicted and endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.evicted_until = time.monotonic() + self.readmit_after
+                print(f"🚫 Evicting Ollama endpoint {endpoint.url} after {endpoint.consecutive_failures} failures")
+
+    def check(self, endpoint: OllamaEndpoint, force: bool = False) -> dict:
+        """Cached /api/tags probe of one endpoint"""
+        if not force and endpoint.checked_at is not None and time.monotonic() - endpoint.checked_at < self.health_ttl:
+            return endpoint.health
+        health = self.probe(endpoint.url, self.probe_timeout)
+        with self._lock:
+            endpoint.health = health
+            endpoint.checked_at = time.monotonic()
+        return health
+
+    def _readmission_probe(self, endpoint: OllamaEndpoint):
+        try:
+            healthy = self.check(endpoint, force=True).get('success')
+        except Exception as e:
+            healthy = False
+            print(f"⚠️ Health probe of {endpoint.url} failed: {e}")
+        with self._lock:
+            endpoint.probing = False
+            if healthy:
+                endpoint.evicted_until = None
+                endpoint.consecutive_failures = 0
+                print(f"✅ Readmitted Ollama endpoint {endpoint.url}")
+            else:
+                endpoint.evicted_until = time.monotonic() + self.readmit_after
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call is duplicated, or None (hedging off or too few samples)"""
+        if self.hedge_percentile is None or len(self.endpoints) < 2:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            samples = sorted(self._latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile))]
+
+    def _run(self, endpoint: OllamaEndpoint, send: Callable):
+        start = time.perf_counter()
+        try:
+            result = send(endpoint)
+        except Exception as e:
+            self._release_failed(endpoint, e)
+            raise
+        self.release(endpoint, time.perf_counter() - start, ok=True)
+        return result
+
+    def _release_failed(self, endpoint: OllamaEndpoint, error: Exception):
+        if is_endpoint_failure(error):
+            self.release(endpoint, ok=False)
+        else:
+            # The server answered, just not with a result; healthy, but no latency sample
+            self.release(endpoint, ok=True)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._hedge_workers, thread_name_prefix='ollama-hedge')
+            return self._executor
+
+    def call(self, send: Callable[[OllamaEndpoint], object]):
+        """send(endpoint) on the least busy endpoint, hedged onto a second one if it runs long"""
+        endpoint = self.acquire()
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._run(endpoint, send)
+
+        executor = self._get_executor()
+        primary = executor.submit(self._run, endpoint, send)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        backup_endpoint = self.acquire(exclude=endpoint)
+        if backup_endpoint is None:
+            return primary.result()
+        with self._lock:
+            self.hedges += 1
+        # A sync request cannot be interrupted, so the slower one runs to completion in the background
+        backup = executor.submit(self._run, backup_endpoint, send)
+        for future in as_completed([primary, backup]):
+            if future.exception() is None:
+                if future is backup:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return future.result()
+        return primary.result()
+
+    async def _arun(self, endpoint: OllamaEndpoint, send: Callable):
+        start = time.perf_counter()
+        try:
+            result = await send(endpoint)
+        except asyncio.CancelledError:
+            self.release(endpoint)
+            raise
+        except Exception as e:
+            self._release_failed(endpoint, e)
+            raise
+        self.release(endpoint, time.perf_counter() - start, ok=True)
+        return result
+
+    async def acall(self, send: Callable):
+        """Coroutine version of call(); send(endpoint) returns an awaitable"""
+        endpoint = self.acquire()
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._arun(endpoint, send)
+
+        primary = asyncio.ensure_future(self._arun(endpoint, send))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        backup_endpoint = self.acquire(exclude=endpoint)
+        if backup_endpoint is None:
+            return await primary
+        with self._lock:
+            self.hedges += 1
+        backup = asyncio.ensure_future(self._arun(backup_endpoint, send))
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_status(self, check: bool = False) -> dict:
+        if check:
+            for endpoint in self.endpoints:
+                self.check(endpoint)
+        with self._lock:
+            return {
+                'endpoints': [endpoint.to_dict() for endpoint in self.endpoints],
+                'healthy': sum(1 for endpoint in self.endpoints if not endpoint.evicted),
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins
+            }
+
+# Endpoint list -> (pool, the settings it was created with), so every LLMProvider in a process
+# balances over the same in-flight counts
+_SHARED_POOLS = {}
+_SHARED_POOLS_LOCK = threading.Lock()
+
+def shared_endpoint_pool(urls, **pool_kwargs) -> OllamaEndpointPool:
+    """The process-wide pool for these URLs; raises ValueError if it exists with other pool_kwargs"""
+    key = tuple(split_urls(urls))
+    with _SHARED_POOLS_LOCK:
+        shared = _SHARED_POOLS.get(key)
+        if shared is None:
+            shared = _SHARED_POOLS[key] = (OllamaEndpointPool(list(key), **pool_kwargs), dict(pool_kwargs))
+        pool, settings = shared
+        if settings != pool_kwargs:
+            raise ValueError(f"Endpoint pool for {', '.join(key)} already exists with settings {settings}, "
+                             f"not {pool_kwargs}; pass the same settings or an explicit OllamaEndpointPool")
+        return pool
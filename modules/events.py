@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+# Event types emitted by SimpleStoryProcessor and process_entire_corpus
+EVENT_TYPES = (
+    'corpus_started', 'corpus_book_started', 'corpus_book_finished', 'corpus_finished',
+    'book_started', 'book_finished',
+    'phase_started', 'phase_finished',
+    'chapter_started', 'chapter_finished',
+    'scene_started', 'scene_finished',
+    'llm_call', 'error'
+)
+
+class EventQueue:
+    """Bounded per-subscriber queue; when a slow reader falls behind, its oldest events are dropped"""
+
+    def __init__(self, bus, maxsize: int = 1000):
+        self.bus = bus
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self.put)
+
+class EventBus:
+    """Structured pipeline events fanned out to any number of subscribers.
+
+    emit() never waits on a consumer: callbacks run inline and must be cheap
+    (a failing callback is reported and skipped), and stream consumers such as
+    SSE responses read from their own bounded EventQueue. With no subscribers,
+    emit() returns immediately and callers can skip building expensive fields
+    by checking active.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = ()
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self, callback: Callable[[dict], None]) -> Callable[[dict], None]:
+        with self._lock:
+            self._subscribers = self._subscribers + (callback,)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[dict], None]):
+        with self._lock:
+            self._subscribers = tuple(subscriber for subscriber in self._subscribers if subscriber != callback)
+
+    def subscribe_queue(self, maxsize: int = 1000) -> EventQueue:
+        events = EventQueue(self, maxsize)
+        self.subscribe(events.put)
+        return events
+
+    def emit(self, event_type: str, **fields):
+        subscribers = self._subscribers  # Replaced, never mutated, so no lock is needed to read it
+        if not subscribers:
+            return
+        event = {'type': event_type, 'time': time.time(), **fields}
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️ Event subscriber failed on {event_type}: {e}")
+                traceback.print_exc()
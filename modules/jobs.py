@@ -0,0 +1,252 @@
+import hashlib
+import json
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+from .data_models import write_json_atomic
+
+ACTIVE_STATES = ('queued', 'running')
+FINISHED_STATES = ('completed', 'failed', 'cancelled', 'interrupted')
+# Events that update a job's persisted progress, and those that only track where it currently is
+CORPUS_EVENTS = ('corpus_started', 'corpus_book_started', 'corpus_book_finished', 'corpus_finished')
+POSITION_EVENTS = ('book_started', 'phase_started', 'chapter_finished', 'scene_finished')
+
+class JobContext:
+    """Handed to a job's target: progress reporting and the cooperative cancel flag"""
+
+    def __init__(self, manager, job_id: str, params: dict):
+        self.manager = manager
+        self.job_id = job_id
+        self.params = params
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def report(self, event: dict):
+        self.manager._record_event(self.job_id, event)
+
+class JobManager:
+    """Background jobs (corpus runs) off the request path, with persisted state.
+
+    Jobs run on a bounded thread pool; their state (status, progress, result,
+    error) is written atomically to state_file on every change so /jobs survives
+    restarts. Submitting the same kind and parameters while an equal job is
+    queued or running returns that job instead of starting another. Cancellation
+    is cooperative: the target checks JobContext.cancel_event between units of
+    work. Jobs still active when the process died are marked "interrupted".
+
+    Progress events are kept in memory per job (the last max_events) with a
+    sequence number, so any number of SSE streams can follow a job and a
+    reconnecting browser resumes where it left off.
+
+    Finished jobs are forgotten once there are more than max_finished of them
+    (oldest first) or they finished more than finished_ttl seconds ago. Every
+    job handed out is a deep copy taken under the lock, never a live record.
+    """
+
+    def __init__(self, state_file, max_workers: int = 1, max_events: int = 500, max_finished: int = 200,
+                 finished_ttl: Optional[float] = 30 * 24 * 3600):
+        self.state_file = Path(state_file)
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        self.max_events = max_events
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='corpus-job')
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.jobs = {}  # job_id -> job record (JSON-serializable)
+        self._contexts = {}  # job_id -> JobContext, for active jobs
+        self._futures = {}
+        self._events = {}  # job_id -> [event, ...] with increasing 'seq'
+        self._load()
+
+    @staticmethod
+    def _snapshot(job: Optional[dict]) -> Optional[dict]:
+        # Caller holds self._lock; workers keep updating the live record's progress
+        return json.loads(json.dumps(job, default=str)) if job else None
+
+    @staticmethod
+    def make_dedupe_key(kind: str, params: dict) -> str:
+        payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                jobs = json.load(f).get('jobs', [])
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Ignoring unreadable job state {self.state_file}: {e}")
+            return
+        for job in jobs:
+            if job['status'] in ACTIVE_STATES:
+                job['status'] = 'interrupted'
+                job['error'] = 'The server stopped before this job finished'
+                job['finished_at'] = datetime.now().isoformat()
+            self.jobs[job['job_id']] = job
+        self._prune()
+        self._save()
+
+    def _prune(self):
+        # Caller holds self._lock (or runs before any worker starts)
+        finished = sorted((job for job in self.jobs.values() if job['status'] in FINISHED_STATES),
+                          key=lambda job: job.get('finished_at') or job['created_at'])
+        expired = finished[:max(0, len(finished) - self.max_finished)]
+        if self.finished_ttl is not None:
+            cutoff = (datetime.now() - timedelta(seconds=self.finished_ttl)).isoformat()
+            expired += [job for job in finished[len(expired):] if (job.get('finished_at') or job['created_at']) < cutoff]
+        for job in expired:
+            del self.jobs[job['job_id']]
+            self._events.pop(job['job_id'], None)
+
+    def _save(self):
+        # Callers hold self._lock (or run before any worker starts)
+        write_json_atomic(self.state_file, {'jobs': list(self.jobs.values())}, indent=2)
+
+    def submit(self, kind: str, params: dict, target: Callable[[JobContext], Optional[dict]]):
+        """(job, created): a new queued job, or the active job with the same kind and params"""
+        dedupe_key = self.make_dedupe_key(kind, params)
+        with self._lock:
+            for job in self.jobs.values():
+                if job['dedupe_key'] == dedupe_key and job['status'] in ACTIVE_STATES:
+                    return self._snapshot(job), False
+
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                'job_id': job_id,
+                'kind': kind,
+                'params': params,
+                'dedupe_key': dedupe_key,
+                'status': 'queued',
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'progress': {},
+                'result': None,
+                'error': None
+            }
+            self.jobs[job_id] = job
+            self._contexts[job_id] = JobContext(self, job_id, params)
+            self._events[job_id] = []
+            self._append_event(job_id, {'type': 'job_status', 'status': 'queued'})
+            self._save()
+            self._futures[job_id] = self._executor.submit(self._run, job_id, target)
+            print(f"🗂️ Queued {kind} job {job_id}")
+            return self._snapshot(job), True
+
+    def _run(self, job_id: str, target: Callable[[JobContext], Optional[dict]]):
+        context = self._contexts[job_id]
+        with self._lock:
+            if context.cancelled:
+                self._set_status(job_id, 'cancelled', finished_at=datetime.now().isoformat())
+                self._contexts.pop(job_id, None)
+                self._futures.pop(job_id, None)
+                return
+            self._set_status(job_id, 'running', started_at=datetime.now().isoformat())
+
+        try:
+            result = target(context)
+            status, fields = ('cancelled' if context.cancelled else 'completed'), {'result': result}
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            traceback.print_exc()
+            status, fields = 'failed', {'error': str(e)}
+
+        with self._lock:
+            self._set_status(job_id, status, finished_at=datetime.now().isoformat(), **fields)
+            self._contexts.pop(job_id, None)
+            self._futures.pop(job_id, None)
+
+    def _set_status(self, job_id: str, status: str, **fields):
+        # Caller holds self._lock
+        job = self.jobs[job_id]
+        job['status'] = status
+        job.update(fields)
+        event = {'type': 'job_status', 'status': status}
+        if fields.get('error'):
+            event['error'] = fields['error']
+        self._append_event(job_id, event)
+        if status in FINISHED_STATES:
+            self._prune()
+        self._save()
+
+    def _append_event(self, job_id: str, event: dict):
+        # Caller holds self._lock
+        events = self._events.setdefault(job_id, [])
+        seq = events[-1]['seq'] + 1 if events else 1
+        events.append({**event, 'seq': seq, 'time': time.time()})
+        if len(events) > self.max_events:
+            del events[:len(events) - self.max_events]
+        self._changed.notify_all()
+
+    def _record_event(self, job_id: str, event: dict):
+        kind = event.get('type')
+        fields = {key: value for key, value in event.items() if key not in ('type', 'time')}
+        with self._lock:
+            progress = self.jobs[job_id]['progress']
+            if kind in CORPUS_EVENTS:
+                progress.update(fields)
+            elif kind in POSITION_EVENTS:
+                progress['current'] = {'event': kind, **fields}
+            progress['last_event'] = kind
+            self._append_event(job_id, event)
+            # Per-call and per-scene events are too frequent to rewrite the state file for
+            if kind in CORPUS_EVENTS:
+                self._save()
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job now, or ask a running one to stop at its next checkpoint"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in ACTIVE_STATES:
+                context = self._contexts.get(job_id)
+                if context:
+                    context.cancel_event.set()
+                future = self._futures.get(job_id)
+                if job['status'] == 'queued' and future and future.cancel():
+                    self._set_status(job_id, 'cancelled', finished_at=datetime.now().isoformat())
+                    self._contexts.pop(job_id, None)
+                    self._futures.pop(job_id, None)
+                else:
+                    self._append_event(job_id, {'type': 'cancel_requested'})
+                    job['cancel_requested'] = True
+                    self._save()
+            return self._snapshot(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._snapshot(self.jobs.get(job_id))
+
+    def latest(self, kind: str, params: dict) -> Optional[dict]:
+        """Most recently created job with this kind and params, in any state"""
+        dedupe_key = self.make_dedupe_key(kind, params)
+        with self._lock:
+            matches = [job for job in self.jobs.values() if job['dedupe_key'] == dedupe_key]
+            return self._snapshot(max(matches, key=lambda job: job['created_at'])) if matches else None
+
+    def list_jobs(self, status: Optional[str] = None) -> list:
+        with self._lock:
+            jobs = [self._snapshot(job) for job in self.jobs.values() if status is None or job['status'] == status]
+        return sorted(jobs, key=lambda job: job['created_at'], reverse=True)
+
+    def wait_events(self, job_id: str, after: int = 0, timeout: float = 15.0) -> list:
+        """Events with seq > after, waiting up to timeout for one to arrive"""
+        deadline = time.time() + timeout
+        with self._lock:
+            while True:
+                events = [event for event in self._events.get(job_id, []) if event['seq'] > after]
+                remaining = deadline - time.time()
+                if events or remaining <= 0 or self.jobs.get(job_id, {}).get('status') not in ACTIVE_STATES:
+                    return events
+                self._changed.wait(remaining)
@@ -0,0 +1,111 @@
+import json
+import re
+from typing import Optional
+
+class JsonStreamScanner:
+    """Incremental scanner that notices when the first top-level JSON object in a stream closes.
+
+    Text before the opening brace (preamble, reasoning) is skipped; braces inside
+    strings are ignored, and a balanced span that is not valid JSON (e.g. "{about}"
+    in prose, or the payload with a trailing comma) is passed over as a whole, so
+    an object nested inside it is never taken for the payload. The longest such
+    span is kept in rejected for the caller to repair. feed() returns True once a
+    parseable object is complete, after which payload holds exactly that object's text.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.start = None  # offset of the candidate object's opening brace
+        self.end = None  # offset just past its closing brace, once valid
+        self.rejected = None  # longest balanced span that failed to parse, as (start, end)
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    @property
+    def payload(self) -> Optional[str]:
+        if not self.complete:
+            return None
+        return self.text[self.start:self.end]
+
+    @property
+    def rejected_text(self) -> Optional[str]:
+        if self.rejected is None:
+            return None
+        return self.text[self.rejected[0]:self.rejected[1]]
+
+    def feed(self, chunk: str) -> bool:
+        if self.complete or not chunk:
+            return self.complete
+        self.text += chunk
+        text = self.text
+
+        while self._position < len(text):
+            char = text[self._position]
+            self._position += 1
+            if self.start is None:
+                if char == '{':
+                    self.start = self._position - 1
+                    self._depth = 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        json.loads(text[self.start:self._position])
+                    except json.JSONDecodeError:
+                        # Not the payload; look for the next object after this span, not inside it
+                        if self.rejected is None or \
+                                self._position - self.start > self.rejected[1] - self.rejected[0]:
+                            self.rejected = (self.start, self._position)
+                        self.start = None
+                        self._in_string = False
+                        continue
+                    self.end = self._position
+                    break
+        return self.complete
+
+def extract_json_object(text: str) -> Optional[str]:
+    """First balanced {...} object in text that parses as JSON, or None"""
+    scanner = JsonStreamScanner()
+    scanner.feed(text)
+    return scanner.payload
+
+def extract_json_text(response_text) -> Optional[str]:
+    """JSON object text from an LLM response.
+
+    Prefers the first complete, parseable object, so trailing chatter or a second
+    object after the payload is ignored. Otherwise returns the longest balanced
+    object that failed to parse (for the caller to repair), falling back to the
+    widest {...} span. A nested object is never returned in place of its parent.
+    """
+    if not isinstance(response_text, str):
+        return None
+    stripped = response_text.strip()
+    scanner = JsonStreamScanner()
+    scanner.feed(stripped)
+    if scanner.complete:
+        return scanner.payload
+    if scanner.rejected is not None:
+        return scanner.rejected_text
+    if stripped.startswith('{'):
+        return stripped
+    json_match = re.search(r'\{.*\}', stripped, re.DOTALL)
+    if json_match:
+        return json_match.group()
+    return None
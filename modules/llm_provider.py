@@ -1,34 +1,303 @@
 import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import contextvars
+from collections import deque
+from contextlib import closing, contextmanager
 from typing import Optional
 
+from .endpoint_pool import OllamaEndpointPool, shared_endpoint_pool, split_urls
+from .json_stream import JsonStreamScanner
+from .rate_limit import (LLMCallError, RateLimiter, RetryPolicy, classify_error, retry_after_seconds,
+                         shared_rate_limiter)
+from .telemetry import TELEMETRY, Telemetry
+
+# Token usage reported by the provider for the request in flight (per thread and per asyncio task)
+_CALL_USAGE = contextvars.ContextVar('llm_call_usage', default=None)
+
+def _field(obj, name):
+    # SDK responses are objects, Ollama's may be plain dicts
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+def _note_usage(prompt_tokens, completion_tokens):
+    usage = _CALL_USAGE.get()
+    if usage is not None and prompt_tokens is not None and completion_tokens is not None:
+        usage['prompt_tokens'] = prompt_tokens
+        usage['completion_tokens'] = completion_tokens
+
+# Outcome of the call_llm/acall_llm in flight, for callers inside track_call()
+_CALL_INFO = contextvars.ContextVar('llm_call_info', default=None)
+
+@contextmanager
+def track_call():
+    """Collects how the call made inside the block was served: {'cache_hit': bool, 'attempts': n,
+    'latency': seconds of the last request sent}. Backoff and rate-limit waits are not included."""
+    info = {'cache_hit': False, 'attempts': 0, 'latency': None}
+    token = _CALL_INFO.set(info)
+    try:
+        yield info
+    finally:
+        _CALL_INFO.reset(token)
+
+def _note_attempt(latency=None, cache_hit=False):
+    info = _CALL_INFO.get()
+    if info is None:
+        return
+    if cache_hit:
+        info['cache_hit'] = True
+    else:
+        info['attempts'] += 1
+        info['latency'] = latency
+
+class ResponseCache:
+    """Persistent on-disk cache of LLM responses.
+
+    Entries are keyed by provider, model, generation parameters and a hash of
+    the prompt. The cache lives in a SQLite file so the Flask app and the CLI
+    scripts can share it safely across threads and processes.
+    """
+
+    EVICTION_INTERVAL = 64  # Run size/age eviction every N writes
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, max_age_seconds: Optional[float] = None):
+        self.path = path or os.getenv('LLM_CACHE_PATH', 'llm_response_cache.sqlite3')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        # One connection per thread (and per process, in case of fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                created_at REAL,
+                last_accessed REAL,
+                hit_count INTEGER DEFAULT 0
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_accessed ON responses(last_accessed)')
+        self.evict()
+
+    @staticmethod
+    def make_key(provider: str, model: str, params: dict, prompt: str) -> str:
+        """Build a content-addressed key for a request"""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        payload = json.dumps({
+            'provider': provider,
+            'model': model,
+            'params': params,
+            'prompt': prompt_hash
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                with conn:
+                    conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                row = None
+            if row:
+                with conn:
+                    conn.execute('UPDATE responses SET last_accessed = ?, hit_count = hit_count + 1 WHERE key = ?',
+                                 (now, key))
+        except sqlite3.Error as e:
+            print(f"Response cache read error: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def put(self, key: str, response: str, provider: str = '', model: str = ''):
+        """Store a response; failures are reported but never raised"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute('''INSERT OR REPLACE INTO responses
+                    (key, provider, model, response, size, created_at, last_accessed, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)''',
+                    (key, provider, model, response, len(response.encode('utf-8')), now, now))
+        except sqlite3.Error as e:
+            print(f"Response cache write error: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            run_eviction = self._writes % self.EVICTION_INTERVAL == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones beyond the size limits"""
+        try:
+            conn = self._connect()
+            with conn:
+                if self.max_age_seconds is not None:
+                    conn.execute('DELETE FROM responses WHERE created_at < ?',
+                                 (time.time() - self.max_age_seconds,))
+                if self.max_entries is not None:
+                    conn.execute('''DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)''',
+                        (self.max_entries,))
+                if self.max_bytes is not None:
+                    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+                    if total > self.max_bytes:
+                        excess = total - self.max_bytes
+                        freed = 0
+                        stale_keys = []
+                        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY last_accessed'):
+                            if freed >= excess:
+                                break
+                            stale_keys.append((key,))
+                            freed += size
+                        conn.executemany('DELETE FROM responses WHERE key = ?', stale_keys)
+        except sqlite3.Error as e:
+            print(f"Response cache eviction error: {e}")
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM responses')
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        entries, total_bytes = 0, 0
+        try:
+            row = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            entries, total_bytes = row
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'path': self.path,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'bytes': total_bytes
+        }
+
 class LLMProvider:
-    def __init__(self, provider: str, model: str, api_keys: dict, ollama_url: str = 'http://localhost:11434'):
+    def __init__(self, provider: str, model: str, api_keys: dict, ollama_url: str = 'http://localhost:11434',
+                 cache: Optional[ResponseCache] = None, max_connections: int = 100, stream: bool = False,
+                 telemetry: Optional[Telemetry] = None, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, endpoint_pool: Optional[OllamaEndpointPool] = None):
+        """stream=True reads responses incrementally and stops generation as soon as the
+        first top-level JSON object is complete, recording time-to-first-token.
+        Every call is recorded in telemetry (default: the process-wide modules.telemetry.TELEMETRY).
+
+        Without a retry_policy a failed request is printed and returned as "". With one,
+        transient failures (rate limits, timeouts, overload, dropped connections) are
+        retried with backoff and a call that still fails raises LLMCallError.
+        rate_limiter (default: the shared per-provider limiter from <PROVIDER>_RPM /
+        <PROVIDER>_TPM, if set) paces requests and estimated tokens per minute.
+
+        For Ollama, endpoint_pool (or an ollama_url listing several hosts separated by
+        commas) spreads requests over several servers; see modules.endpoint_pool."""
         self.provider = provider
         self.model = model
         self.api_keys = api_keys
-        self.ollama_url = ollama_url
+        if provider == 'ollama' and endpoint_pool is None and len(split_urls(ollama_url)) > 1:
+            endpoint_pool = shared_endpoint_pool(ollama_url)
+        self.endpoint_pool = endpoint_pool if provider == 'ollama' else None
+        self.ollama_url = self.endpoint_pool.urls[0] if self.endpoint_pool else ollama_url
+        self.cache = cache
         self.client = None
+        self.generation_params = self._default_generation_params()
+        self.max_connections = max_connections
+        self._async_client = None
+        self._async_loop = None
+        self._endpoint_clients = {}
+        self._async_endpoint_clients = {}
+        self._endpoint_clients_lock = threading.Lock()
+        self.stream = stream
+        self._stream_lock = threading.Lock()
+        self.stream_stats = {'calls': 0, 'early_stops': 0, 'no_tokens': 0}
+        self._ttft_samples = deque(maxlen=1000)
+        self.telemetry = telemetry or TELEMETRY
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter or shared_rate_limiter(provider)
         self._init_client()
 
+    def _default_generation_params(self) -> dict:
+        if self.provider == 'openai':
+            return {'max_tokens': 4000, 'temperature': 0.7}
+        elif self.provider == 'anthropic':
+            return {'max_tokens': 4000}
+        return {}
+
+    def _client_options(self) -> dict:
+        # Per-request timeout; the SDKs have their own (long) defaults otherwise
+        if self.retry_policy is not None and self.retry_policy.timeout is not None:
+            return {'timeout': self.retry_policy.timeout}
+        return {}
+
     def _init_client(self):
+        options = self._client_options()
         if self.provider == 'anthropic':
             try:
                 import anthropic
                 api_key = self.api_keys.get('anthropic') or os.getenv('ANTHROPIC_API_KEY')
-                self.client = anthropic.Anthropic(api_key=api_key) if api_key else None
+                self.client = anthropic.Anthropic(api_key=api_key, **options) if api_key else None
             except ImportError:
                 self.client = None
         elif self.provider == 'openai':
             try:
                 import openai
                 api_key = self.api_keys.get('openai') or os.getenv('OPENAI_API_KEY')
-                self.client = openai.OpenAI(api_key=api_key) if api_key else None
+                # Retries happen here, with the shared rate limiter, rather than inside the SDK
+                if self.retry_policy is not None:
+                    options['max_retries'] = 0
+                self.client = openai.OpenAI(api_key=api_key, **options) if api_key else None
             except ImportError:
                 self.client = None
         elif self.provider == 'ollama':
             try:
                 import ollama
-                self.client = ollama.Client(host=self.ollama_url)
+                self.client = ollama.Client(host=self.ollama_url, **options)
             except ImportError:
                 self.client = None
 
@@ -37,45 +306,499 @@ class LLMProvider:
         return self.client is not None
 
     def get_status(self):
-        return {
+        status = {
             'provider': self.provider,
             'model': self.model,
             'client_ready': self.client is not None
         }
+        if self.cache is not None:
+            status['cache'] = self.cache.stats()
+        if self.stream:
+            status['streaming'] = self.get_stream_stats()
+        if self.rate_limiter is not None:
+            status['rate_limit'] = self.rate_limiter.get_status()
+        if self.endpoint_pool is not None:
+            status['endpoint_pool'] = self.endpoint_pool.get_status()
+        return status
+
+    def _record_stream(self, ttft: Optional[float], stopped_early: bool):
+        with self._stream_lock:
+            self.stream_stats['calls'] += 1
+            if stopped_early:
+                self.stream_stats['early_stops'] += 1
+            if ttft is None:
+                self.stream_stats['no_tokens'] += 1
+            else:
+                self._ttft_samples.append(ttft)
+
+    def get_stream_stats(self) -> dict:
+        """Streaming call counts plus time-to-first-token percentiles over recent calls"""
+        with self._stream_lock:
+            stats = dict(self.stream_stats)
+            samples = sorted(self._ttft_samples)
+        if samples:
+            stats['ttft_p50'] = round(samples[len(samples) // 2], 4)
+            stats['ttft_p99'] = round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 4)
+            stats['ttft_mean'] = round(sum(samples) / len(samples), 4)
+        return stats
+
+    def _http_limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def _init_async_client(self):
+        """Create an asyncio client backed by a pooled keep-alive httpx connection pool"""
+        import httpx
+        limits = self._http_limits()
+        options = self._client_options()
+        if self.provider == 'anthropic':
+            import anthropic
+            api_key = self.api_keys.get('anthropic') or os.getenv('ANTHROPIC_API_KEY')
+            return anthropic.AsyncAnthropic(api_key=api_key, http_client=httpx.AsyncClient(limits=limits),
+                                            **options) if api_key else None
+        elif self.provider == 'openai':
+            import openai
+            api_key = self.api_keys.get('openai') or os.getenv('OPENAI_API_KEY')
+            if self.retry_policy is not None:
+                options['max_retries'] = 0
+            return openai.AsyncOpenAI(api_key=api_key, http_client=httpx.AsyncClient(limits=limits),
+                                      **options) if api_key else None
+        elif self.provider == 'ollama':
+            return self._ollama_async_client(self.ollama_url)
+        return None
+
+    def _ollama_async_client(self, url: str):
+        import ollama
+        return ollama.AsyncClient(host=url, limits=self._http_limits(), **self._client_options())
 
-    def call_llm(self, prompt: str) -> str:
-        """Call the LLM with the given prompt and return the response"""
+    def _endpoint_client(self, url: str):
+        with self._endpoint_clients_lock:
+            client = self._endpoint_clients.get(url)
+            if client is None:
+                import ollama
+                client = self._endpoint_clients[url] = ollama.Client(host=url, **self._client_options())
+            return client
+
+    def _aendpoint_client(self, url: str):
+        # Same per-event-loop rule as _get_async_client; _get_async_client has already run for this loop
+        clients = self._async_endpoint_clients.get(self._async_loop)
+        if clients is None:
+            self._async_endpoint_clients = {self._async_loop: {}}
+            clients = self._async_endpoint_clients[self._async_loop]
+        client = clients.get(url)
+        if client is None:
+            client = clients[url] = self._ollama_async_client(url)
+        return client
+
+    def _get_async_client(self):
+        # httpx pools are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            try:
+                self._async_client = self._init_async_client()
+            except ImportError:
+                self._async_client = None
+            self._async_loop = loop
+        return self._async_client
+
+    def _cache_lookup(self, prompt: str, schema: Optional[dict] = None):
+        """Return (cache_key, cached_response); both None when caching is off"""
+        if self.cache is None:
+            return None, None
+        params = {**self.generation_params, 'schema': schema} if schema else self.generation_params
+        cache_key = self.cache.make_key(self.provider, self.model, params, prompt)
+        return cache_key, self.cache.get(cache_key)
+
+    def _cache_store(self, cache_key, response_text: str):
+        # Only successful, non-empty responses are worth replaying
+        if cache_key is not None and response_text:
+            self.cache.put(cache_key, response_text, self.provider, self.model)
+
+    def _record_call(self, phase, prompt, response_text, usage, latency):
+        estimated = 'completion_tokens' not in usage
+        if estimated:
+            # Streams stopped early (and some backends) report no usage; same 4-chars-per-token fallback as TokenEstimator
+            usage = {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(response_text or '') // 4}
+        self.telemetry.record_call(self.provider, self.model, phase, latency, usage['prompt_tokens'],
+                                   usage['completion_tokens'], 'ok' if response_text else 'empty', estimated)
+        return usage['prompt_tokens'] + usage['completion_tokens']
+
+    def _record_failure(self, phase, error, latency):
+        self.telemetry.record_call(self.provider, self.model, phase, latency, 0, 0, 'error')
+        self.telemetry.record_error(self.provider, self.model, phase, type(error).__name__)
+
+    def _reserve(self, prompt: str):
+        """(tokens reserved, seconds to wait) against the rate limiter before sending prompt"""
+        if self.rate_limiter is None:
+            return 0, 0.0
+        # Quotas count the prompt plus the completion budget
+        tokens = len(prompt) // 4 + self.generation_params.get('max_tokens', 0)
+        return tokens, self.rate_limiter.reserve(tokens)
+
+    def _settle(self, reserved: int, used: int):
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(reserved, used)
+
+    def _retry_delay(self, error: Exception, attempt: int, phase: Optional[str]):
+        """Seconds to wait before retrying after error, or raise LLMCallError / return None to give up"""
+        if self.retry_policy is None:
+            print(f"Error calling {self.provider} LLM: {error}")
+            return None
+        retryable, reason = classify_error(error)
+        if not retryable or attempt >= self.retry_policy.max_attempts:
+            print(f"❌ {self.provider} LLM call failed permanently after {attempt} attempt(s): {error}")
+            raise LLMCallError(self.provider, self.model, phase, attempt, reason, error) from error
+        retry_after = retry_after_seconds(error)
+        delay = self.retry_policy.delay(attempt, retry_after)
+        if retry_after is not None and self.rate_limiter is not None:
+            # The quota is shared, so hold back every caller rather than just this one
+            self.rate_limiter.pause(delay)
+        self.telemetry.record_retry(self.provider, self.model, phase, reason)
+        print(f"⏳ {self.provider} {reason} ({type(error).__name__}), retry {attempt}/"
+              f"{self.retry_policy.max_attempts - 1} in {delay:.1f}s")
+        return delay
+
+    def _attempt(self, prompt: str, schema: Optional[dict], phase: Optional[str], reserved: int):
+        """One request: (response_text, None) or (None, exception), recorded in telemetry either way"""
+        usage = {}
+        usage_token = _CALL_USAGE.set(usage)
+        start = time.perf_counter()
+        try:
+            response_text = self._send(prompt, schema)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            _note_attempt(latency)
+            self._record_failure(phase, e, latency)
+            self._settle(reserved, 0)
+            return None, e
+        finally:
+            _CALL_USAGE.reset(usage_token)
+        latency = time.perf_counter() - start
+        _note_attempt(latency)
+        self._settle(reserved, self._record_call(phase, prompt, response_text, usage, latency))
+        return response_text, None
+
+    async def _aattempt(self, client, prompt: str, schema: Optional[dict], phase: Optional[str], reserved: int):
+        usage = {}
+        usage_token = _CALL_USAGE.set(usage)
+        start = time.perf_counter()
+        try:
+            response_text = await self._asend(client, prompt, schema)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            _note_attempt(latency)
+            self._record_failure(phase, e, latency)
+            self._settle(reserved, 0)
+            return None, e
+        finally:
+            _CALL_USAGE.reset(usage_token)
+        latency = time.perf_counter() - start
+        _note_attempt(latency)
+        self._settle(reserved, self._record_call(phase, prompt, response_text, usage, latency))
+        return response_text, None
+
+    def call_llm(self, prompt: str, schema: Optional[dict] = None, phase: Optional[str] = None) -> str:
+        """Call the LLM with the given prompt and return the response
+
+        schema (a JSON schema) constrains the output where the provider supports it:
+        Ollama `format`, OpenAI `json_schema` response format, Anthropic forced tool use.
+        phase only labels the call's telemetry.
+        """
         if not self.client:
             raise ValueError(f"No client available for provider {self.provider}")
-        
+
+        cache_key, cached = self._cache_lookup(prompt, schema)
+        if cached is not None:
+            self.telemetry.record_cache_hit(self.provider, self.model, phase)
+            _note_attempt(cache_hit=True)
+            return cached
+
+        attempt = 0
+        while True:
+            attempt += 1
+            reserved, wait = self._reserve(prompt)
+            if wait:
+                time.sleep(wait)
+            response_text, error = self._attempt(prompt, schema, phase, reserved)
+            if error is None:
+                break
+            delay = self._retry_delay(error, attempt, phase)
+            if delay is None:
+                return ""
+            time.sleep(delay)
+
+        self._cache_store(cache_key, response_text)
+        return response_text
+
+    async def acall_llm(self, prompt: str, schema: Optional[dict] = None, phase: Optional[str] = None) -> str:
+        """Coroutine version of call_llm sharing a pooled connection per event loop"""
+        client = self._get_async_client()
+        if not client:
+            raise ValueError(f"No async client available for provider {self.provider}")
+
+        # SQLite lookups are sub-millisecond, so they run inline on the loop
+        cache_key, cached = self._cache_lookup(prompt, schema)
+        if cached is not None:
+            self.telemetry.record_cache_hit(self.provider, self.model, phase)
+            _note_attempt(cache_hit=True)
+            return cached
+
+        attempt = 0
+        while True:
+            attempt += 1
+            reserved, wait = self._reserve(prompt)
+            if wait:
+                await asyncio.sleep(wait)
+            response_text, error = await self._aattempt(client, prompt, schema, phase, reserved)
+            if error is None:
+                break
+            delay = self._retry_delay(error, attempt, phase)
+            if delay is None:
+                return ""
+            await asyncio.sleep(delay)
+
+        self._cache_store(cache_key, response_text)
+        return response_text
+
+    async def aclose(self):
+        """Close the pooled async connections (call from the loop that used them)"""
+        client, self._async_client, self._async_loop = self._async_client, None, None
+        endpoint_clients = [client for clients in self._async_endpoint_clients.values() for client in clients.values()]
+        self._async_endpoint_clients = {}
+        for client in [client] + endpoint_clients:
+            if client is None:
+                continue
+            # SDK clients expose close(); older ollama clients only wrap a bare httpx client
+            close = getattr(client, 'close', None) or getattr(getattr(client, '_client', None), 'aclose', None)
+            if close is not None:
+                await close()
+
+    def _send(self, prompt: str, schema: Optional[dict]) -> str:
+        """_request, routed through the endpoint pool when there is one"""
+        if self.endpoint_pool is None:
+            return self._request(prompt, schema) if schema else self._request(prompt)
+        usage = _CALL_USAGE.get()
+
+        def send(endpoint):
+            # Hedged duplicates run on pool threads, so each reports usage into its own dict
+            endpoint_usage = {}
+            usage_token = _CALL_USAGE.set(endpoint_usage)
+            try:
+                return self._request(prompt, schema, self._endpoint_client(endpoint.url)), endpoint_usage
+            finally:
+                _CALL_USAGE.reset(usage_token)
+
+        response_text, endpoint_usage = self.endpoint_pool.call(send)
+        if usage is not None:
+            usage.update(endpoint_usage)
+        return response_text
+
+    async def _asend(self, client, prompt: str, schema: Optional[dict]) -> str:
+        if self.endpoint_pool is None:
+            return await (self._arequest(client, prompt, schema) if schema else self._arequest(client, prompt))
+        usage = _CALL_USAGE.get()
+
+        async def send(endpoint):
+            endpoint_usage = {}
+            usage_token = _CALL_USAGE.set(endpoint_usage)
+            try:
+                return await self._arequest(self._aendpoint_client(endpoint.url), prompt, schema), endpoint_usage
+            finally:
+                _CALL_USAGE.reset(usage_token)
+
+        response_text, endpoint_usage = await self.endpoint_pool.acall(send)
+        if usage is not None:
+            usage.update(endpoint_usage)
+        return response_text
+
+    def _schema_params(self, schema: Optional[dict]) -> dict:
+        """Provider-specific request arguments that constrain the response to schema"""
+        if not schema:
+            return {}
+        if self.provider == 'ollama':
+            return {'format': schema}
+        elif self.provider == 'openai':
+            return {'response_format': {'type': 'json_schema',
+                                        'json_schema': {'name': 'analysis', 'schema': schema}}}
+        elif self.provider == 'anthropic':
+            return {'tools': [{'name': 'record_analysis',
+                               'description': 'Record the analysis result as structured data',
+                               'input_schema': schema}],
+                    'tool_choice': {'type': 'tool', 'name': 'record_analysis'}}
+        return {}
+
+    def _anthropic_text(self, response) -> str:
+        # Forced tool use returns the structured result as the tool input
+        for block in response.content:
+            if getattr(block, 'type', None) == 'tool_use':
+                return json.dumps(block.input)
+        return response.content[0].text
+
+    def _request(self, prompt: str, schema: Optional[dict] = None, client=None) -> str:
+        # Anthropic's structured output arrives as a tool call, which is read whole
+        if self.stream and not (schema and self.provider == 'anthropic'):
+            return self._stream_request(prompt, schema, client)
+
+        params = {**self.generation_params, **self._schema_params(schema)}
+        if self.provider == 'ollama':
+            response = (client or self.client).chat(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                **params
+            )
+            _note_usage(_field(response, 'prompt_eval_count'), _field(response, 'eval_count'))
+            return response['message']['content']
+
+        elif self.provider == 'openai':
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                **params
+            )
+            usage = _field(response, 'usage')
+            _note_usage(_field(usage, 'prompt_tokens'), _field(usage, 'completion_tokens'))
+            return response.choices[0].message.content
+
+        elif self.provider == 'anthropic':
+            response = self.client.messages.create(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                **params
+            )
+            usage = _field(response, 'usage')
+            _note_usage(_field(usage, 'input_tokens'), _field(usage, 'output_tokens'))
+            return self._anthropic_text(response)
+
+        else:
+            raise ValueError(f"Unknown provider: {self.provider}")
+
+    async def _arequest(self, client, prompt: str, schema: Optional[dict] = None) -> str:
+        if self.stream and not (schema and self.provider == 'anthropic'):
+            return await self._astream_request(client, prompt, schema)
+
+        params = {**self.generation_params, **self._schema_params(schema)}
+        if self.provider == 'ollama':
+            response = await client.chat(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                **params
+            )
+            _note_usage(_field(response, 'prompt_eval_count'), _field(response, 'eval_count'))
+            return response['message']['content']
+
+        elif self.provider == 'openai':
+            response = await client.chat.completions.create(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                **params
+            )
+            usage = _field(response, 'usage')
+            _note_usage(_field(usage, 'prompt_tokens'), _field(usage, 'completion_tokens'))
+            return response.choices[0].message.content
+
+        elif self.provider == 'anthropic':
+            response = await client.messages.create(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                **params
+            )
+            usage = _field(response, 'usage')
+            _note_usage(_field(usage, 'input_tokens'), _field(usage, 'output_tokens'))
+            return self._anthropic_text(response)
+
+        else:
+            raise ValueError(f"Unknown provider: {self.provider}")
+
+    def _stream_request(self, prompt: str, schema: Optional[dict] = None, client=None) -> str:
+        """Stream a response, returning just the JSON object once it closes (the full text otherwise)"""
+        scanner = JsonStreamScanner()
+        started = time.perf_counter()
+        ttft = None
+        # Closing the generator closes the HTTP stream, which stops generation server-side
+        with closing(self._stream_chunks(prompt, schema, client)) as chunks:
+            for chunk in chunks:
+                if chunk and ttft is None:
+                    ttft = time.perf_counter() - started
+                if scanner.feed(chunk):
+                    break
+        self._record_stream(ttft, scanner.complete)
+        return scanner.payload if scanner.complete else scanner.text
+
+    def _stream_chunks(self, prompt: str, schema: Optional[dict] = None, client=None):
+        messages = [{'role': 'user', 'content': prompt}]
+        params = {**self.generation_params, **self._schema_params(schema)}
+        if self.provider == 'ollama':
+            response = (client or self.client).chat(model=self.model, messages=messages, stream=True, **params)
+            try:
+                for chunk in response:
+                    _note_usage(_field(chunk, 'prompt_eval_count'), _field(chunk, 'eval_count'))
+                    yield chunk['message']['content']
+            finally:
+                close = getattr(response, 'close', None)
+                if close is not None:
+                    close()
+
+        elif self.provider == 'openai':
+            response = self.client.chat.completions.create(model=self.model, messages=messages, stream=True,
+                                                           **params)
+            try:
+                for chunk in response:
+                    if chunk.choices:
+                        yield chunk.choices[0].delta.content or ''
+            finally:
+                response.close()
+
+        elif self.provider == 'anthropic':
+            with self.client.messages.stream(model=self.model, messages=messages, **params) as response:
+                yield from response.text_stream
+
+        else:
+            raise ValueError(f"Unknown provider: {self.provider}")
+
+    async def _astream_request(self, client, prompt: str, schema: Optional[dict] = None) -> str:
+        scanner = JsonStreamScanner()
+        started = time.perf_counter()
+        ttft = None
+        chunks = self._astream_chunks(client, prompt, schema)
         try:
-            if self.provider == 'ollama':
-                response = self.client.chat(
-                    model=self.model,
-                    messages=[{'role': 'user', 'content': prompt}]
-                )
-                return response['message']['content']
-            
-            elif self.provider == 'openai':
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[{'role': 'user', 'content': prompt}],
-                    max_tokens=4000,
-                    temperature=0.7
-                )
-                return response.choices[0].message.content
-            
-            elif self.provider == 'anthropic':
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4000,
-                    messages=[{'role': 'user', 'content': prompt}]
-                )
-                return response.content[0].text
-            
-            else:
-                raise ValueError(f"Unknown provider: {self.provider}")
-                
-        except Exception as e:
-            print(f"Error calling {self.provider} LLM: {e}")
-            return ""
+            async for chunk in chunks:
+                if chunk and ttft is None:
+                    ttft = time.perf_counter() - started
+                if scanner.feed(chunk):
+                    break
+        finally:
+            await chunks.aclose()
+        self._record_stream(ttft, scanner.complete)
+        return scanner.payload if scanner.complete else scanner.text
+
+    async def _astream_chunks(self, client, prompt: str, schema: Optional[dict] = None):
+        messages = [{'role': 'user', 'content': prompt}]
+        params = {**self.generation_params, **self._schema_params(schema)}
+        if self.provider == 'ollama':
+            response = await client.chat(model=self.model, messages=messages, stream=True, **params)
+            try:
+                async for chunk in response:
+                    _note_usage(_field(chunk, 'prompt_eval_count'), _field(chunk, 'eval_count'))
+                    yield chunk['message']['content']
+            finally:
+                aclose = getattr(response, 'aclose', None)
+                if aclose is not None:
+                    await aclose()
+
+        elif self.provider == 'openai':
+            response = await client.chat.completions.create(model=self.model, messages=messages, stream=True,
+                                                            **params)
+            try:
+                async for chunk in response:
+                    if chunk.choices:
+                        yield chunk.choices[0].delta.content or ''
+            finally:
+                await response.close()
+
+        elif self.provider == 'anthropic':
+            async with client.messages.stream(model=self.model, messages=messages, **params) as response:
+                async for text in response.text_stream:
+                    yield text
+
+        else:
+            raise ValueError(f"Unknown provider: {self.provider}")
@@ -0,0 +1,125 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Narrating characters across the series, with the name forms they appear under
+KNOWN_NARRATORS = {
+    'Kristy': ['Kristy', 'Kristin'],
+    'Claudia': ['Claudia', 'Claud'],
+    'Mary Anne': ['Mary Anne'],
+    'Stacey': ['Stacey'],
+    'Dawn': ['Dawn'],
+    'Mallory': ['Mallory', 'Mal'],
+    'Jessi': ['Jessi', 'Jessica'],
+    'Abby': ['Abby'],
+    'Shannon': ['Shannon'],
+    'Logan': ['Logan']
+}
+
+_ALIAS_TO_NARRATOR = {alias: name for name, aliases in KNOWN_NARRATORS.items() for alias in aliases}
+_NAME_PATTERN = '|'.join(sorted((re.escape(alias) for alias in _ALIAS_TO_NARRATOR), key=len, reverse=True))
+
+_QUOTED = re.compile(r'"[^"\n]*"|“[^”]*”')
+_WORD = re.compile(r"[A-Za-z']+")
+_FIRST_PERSON = re.compile(r"\bI\b|\b(?:me|my|mine|myself)\b", re.IGNORECASE)
+_SELF_IDENTIFICATION = [
+    re.compile(r"\b[Mm]y name is (" + _NAME_PATTERN + r")\b"),
+    re.compile(r"\bI'm (" + _NAME_PATTERN + r")\b(?: [A-Z][a-z]+)?[,.]"),
+    re.compile(r"\bI am (" + _NAME_PATTERN + r")\b(?: [A-Z][a-z]+)?[,.]"),
+    re.compile(r"\b(?:I|me), (" + _NAME_PATTERN + r") [A-Z][a-z]+,")
+]
+_NAME_MENTION = re.compile(r"\b(" + _NAME_PATTERN + r")\b")
+
+# First-person pronouns per narration word; BSC first-person chapters run well above this
+FIRST_PERSON_DENSITY = 0.02
+
+@dataclass
+class NarratorGuess:
+    narrator: str
+    confidence: float
+    method: str
+
+def _split_dialogue(text):
+    """(narration, dialogue) with quoted speech separated from the surrounding prose"""
+    dialogue = ' '.join(_QUOTED.findall(text))
+    narration = _QUOTED.sub(' ', text)
+    return narration, dialogue
+
+def first_person_density(narration):
+    words = len(_WORD.findall(narration))
+    if not words:
+        return 0.0
+    return len(_FIRST_PERSON.findall(narration)) / words
+
+def self_identification(narration):
+    """Narrator named by 'My name is ...' / "I'm ..." style statements, or None"""
+    for pattern in _SELF_IDENTIFICATION:
+        match = pattern.search(narration)
+        if match:
+            return _ALIAS_TO_NARRATOR[match.group(1)]
+    return None
+
+def name_scores(narration, dialogue):
+    """Per known narrator: mentions in dialogue (being addressed) minus mentions in narration.
+
+    A first-person narrator is talked to by other characters but almost never
+    named in their own narration, where the other characters are.
+    """
+    scores = Counter()
+    for alias in _NAME_MENTION.findall(dialogue):
+        scores[_ALIAS_TO_NARRATOR[alias]] += 1
+    for alias in _NAME_MENTION.findall(narration):
+        scores[_ALIAS_TO_NARRATOR[alias]] -= 3
+    return scores
+
+def detect_narrator(chapter_text, book_narrator: Optional[str] = None) -> NarratorGuess:
+    """Local narrator guess for one chapter; book_narrator is the narrator already established for the book"""
+    narration, dialogue = _split_dialogue(chapter_text)
+
+    narrator = self_identification(narration)
+    if narrator:
+        return NarratorGuess(narrator, 0.95, 'self-identification')
+
+    if first_person_density(narration) < FIRST_PERSON_DENSITY:
+        # Third-person passage (letters, notebook entries, epilogues); leave it to the LLM
+        return NarratorGuess('Unknown', 0.0, 'third-person')
+
+    scores = name_scores(narration, dialogue)
+    ranked = [name for name, score in scores.most_common() if score > 0]
+    best = ranked[0] if ranked else None
+    margin = scores[best] - (scores[ranked[1]] if len(ranked) > 1 else 0) if best else 0
+
+    if book_narrator:
+        if scores[book_narrator] < 0 and best and margin >= 2:
+            # Named in the narration while someone else is being addressed: the narrator changed
+            return NarratorGuess(best, 0.5, 'name-frequency')
+        if scores[book_narrator] < 0:
+            return NarratorGuess(book_narrator, 0.4, 'book-narrator')
+        if best and best != book_narrator:
+            # Someone else is addressed most, just not clearly enough to call a change; ask the LLM
+            return NarratorGuess(book_narrator, 0.5, 'book-narrator')
+        confidence = 0.9 if best == book_narrator else 0.8
+        return NarratorGuess(book_narrator, confidence, 'book-narrator')
+
+    if best and margin >= 2:
+        return NarratorGuess(best, 0.6, 'name-frequency')
+    return NarratorGuess('Unknown', 0.0, 'no-evidence')
+
+def resolve_book_narrators(chapters: List[dict], min_confidence: float = 0.75) -> Dict[int, Optional[str]]:
+    """Narrator per chapter_num from local evidence, shared across the book's chapters.
+
+    Confident chapters establish the book narrator (the most common one); the
+    rest are then re-judged against it. Chapters left at None still need the LLM.
+    """
+    guesses = {chapter['chapter_num']: detect_narrator(chapter['text']) for chapter in chapters}
+    confident = Counter(guess.narrator for guess in guesses.values() if guess.confidence >= min_confidence)
+    book_narrator = confident.most_common(1)[0][0] if confident else None
+
+    narrators = {}
+    for chapter in chapters:
+        guess = guesses[chapter['chapter_num']]
+        if guess.confidence < min_confidence and book_narrator:
+            guess = detect_narrator(chapter['text'], book_narrator)
+        narrators[chapter['chapter_num']] = guess.narrator if guess.confidence >= min_confidence else None
+    return narrators
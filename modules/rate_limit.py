@@ -0,0 +1,205 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# HTTP statuses worth retrying: rate limits, timeouts, overload and transient server errors
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504, 529})
+
+class LLMCallError(Exception):
+    """A provider call that failed permanently: not retryable, or out of attempts"""
+
+    def __init__(self, provider: str, model: str, phase: Optional[str], attempts: int, reason: str,
+                 cause: Exception):
+        self.provider = provider
+        self.model = model
+        self.phase = phase
+        self.attempts = attempts
+        self.reason = reason
+        self.cause = cause
+        super().__init__(f"{provider}/{model} call{f' ({phase})' if phase else ''} failed after "
+                         f"{attempts} attempt{'s' if attempts != 1 else ''} [{reason}]: {cause}")
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of an SDK error (openai/anthropic APIStatusError, ollama ResponseError, httpx)"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def parse_retry_after(value) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        # OpenAI also sends a millisecond variant
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms is not None:
+            return max(0.0, float(retry_after_ms) / 1000)
+    except (TypeError, ValueError):
+        pass
+    return parse_retry_after(headers.get('retry-after'))
+
+def classify_error(error: Exception):
+    """(retryable, reason) for an exception raised by a provider SDK"""
+    status = error_status(error)
+    if status is not None:
+        if status == 429:
+            return True, 'rate_limited'
+        if status == 408:
+            return True, 'timeout'
+        if status in RETRYABLE_STATUS:
+            return True, 'server_error'
+        return False, f"http_{status}"
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or 'Timeout' in name:
+        return True, 'timeout'
+    if isinstance(error, ConnectionError) or any(marker in name for marker in ('Connect', 'RemoteProtocol', 'ReadError')):
+        return True, 'connection'
+    return False, name
+
+class RetryPolicy:
+    """Exponential backoff with full jitter; a server's Retry-After takes precedence.
+
+    timeout is the per-request timeout handed to the provider clients (None keeps
+    the SDK default).
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 max_retry_after: float = 300.0, timeout: Optional[float] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before attempt + 1"""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute up to capacity (one minute's worth by default).
+
+    reserve() takes the amount immediately and returns how long the caller must
+    wait for the balance to cover it, so sync and async callers can sleep their
+    own way and requests are admitted in arrival order.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float = 1) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """Give back (positive) or take (negative) tokens once the real usage is known"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one provider.
+
+    A rate-limit response with Retry-After pauses every caller sharing the
+    limiter, not only the one that was refused.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Claim one request and tokens; returns the seconds to wait before sending it"""
+        wait = self.paused_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        wait = max(0.0, wait)
+        if wait:
+            with self._lock:
+                self.waits += 1
+                self.wait_seconds += wait
+        return wait
+
+    def settle(self, reserved_tokens: int, used_tokens: int):
+        if self.tokens is not None:
+            self.tokens.adjust(reserved_tokens - used_tokens)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                'requests_per_minute': self.requests_per_minute,
+                'tokens_per_minute': self.tokens_per_minute,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 3),
+                'paused_for': round(max(0.0, self.paused_until - time.monotonic()), 3)
+            }
+
+# (provider, rpm, tpm) -> RateLimiter, so every LLMProvider in a process draws from the same quota
+_SHARED_LIMITERS = {}
+_SHARED_LIMITERS_LOCK = threading.Lock()
+
+def _env_rate(provider: str, suffix: str) -> Optional[float]:
+    value = os.getenv(f"{provider.upper()}_{suffix}")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def shared_rate_limiter(provider: str, requests_per_minute: Optional[float] = None,
+                        tokens_per_minute: Optional[float] = None) -> Optional[RateLimiter]:
+    """The process-wide limiter for a provider, honouring <PROVIDER>_RPM / <PROVIDER>_TPM;
+    None when no limit is configured"""
+    requests_per_minute = requests_per_minute or _env_rate(provider, 'RPM')
+    tokens_per_minute = tokens_per_minute or _env_rate(provider, 'TPM')
+    if not (requests_per_minute or tokens_per_minute):
+        return None
+    key = (provider, requests_per_minute, tokens_per_minute)
+    with _SHARED_LIMITERS_LOCK:
+        limiter = _SHARED_LIMITERS.get(key)
+        if limiter is None:
+            limiter = _SHARED_LIMITERS[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return limiter
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from .data_models import write_json_atomic
+
+# (abspath, size, mtime_ns) -> sha256 of the file, so unchanged books are not re-read on every request
+_FILE_DIGESTS = {}
+_FILE_DIGESTS_LOCK = threading.Lock()
+
+def file_digest(path) -> str:
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _FILE_DIGESTS_LOCK:
+        digest = _FILE_DIGESTS.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        with _FILE_DIGESTS_LOCK:
+            _FILE_DIGESTS[key] = digest
+    return digest
+
+def corpus_fingerprint(data_dir, sample_size=None) -> str:
+    """Content hash of the books a corpus run would read (names and bytes, in processing order)"""
+    from .corpus_manager import list_corpus_files
+
+    hasher = hashlib.sha256()
+    for book_file in list_corpus_files(data_dir, sample_size):
+        hasher.update(book_file.name.encode('utf-8'))
+        hasher.update(b'\0')
+        hasher.update(file_digest(book_file).encode('ascii'))
+        hasher.update(b'\n')
+    return hasher.hexdigest()
+
+class VisualizationResultCache:
+    """Finished visualization data on disk, keyed by corpus fingerprint, provider and model.
+
+    The routes compute misses as corpus jobs and put() their output here, so a
+    later request for the same corpus content is served without re-analysis.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir or os.getenv('VISUALIZATION_CACHE_DIR', 'visualization_cache'))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(fingerprint: str, provider: str, model: str) -> str:
+        payload = json.dumps({'corpus': fingerprint, 'provider': provider, 'model': model}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def run_output_file(self, key: str) -> Path:
+        """Output file for the corpus job computing key; no other run writes to it"""
+        runs_dir = self.cache_dir / 'runs'
+        runs_dir.mkdir(parents=True, exist_ok=True)
+        return runs_dir / f"{key}_visualization.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self.path_for(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Ignoring unreadable cached result {path.name}: {e}")
+            return None
+
+    def put(self, key: str, data: dict):
+        write_json_atomic(self.path_for(key), data)
@@ -0,0 +1,110 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from .data_models import write_json_atomic
+from .visualization import book_to_visualization, VisualizationAggregator
+
+class StreamingResultSink:
+    """Append-only per-book result stream for corpus runs.
+
+    Each finished book is appended as one JSON line to <output>.books.jsonl and
+    the running totals in <output>.meta.json are updated in O(1), instead of
+    re-serializing every book after every book. Character and conflict indexes
+    are folded in incrementally as books arrive, so compact() only streams the
+    records once (last record per book wins) into the final visualization file,
+    holding one book's scenes in memory at a time.
+    """
+
+    def __init__(self, output_file, reset: bool = True):
+        self.output_file = Path(output_file)
+        stem = self.output_file.name[:-len('.json')] if self.output_file.name.endswith('.json') else self.output_file.name
+        self.records_file = self.output_file.with_name(f"{stem}.books.jsonl")
+        self.meta_file = self.output_file.with_name(f"{stem}.meta.json")
+        # Totals and relationship indexes only; a re-analyzed book replaces its earlier contribution
+        self.aggregator = VisualizationAggregator(keep_books=False)
+
+        if reset:
+            for path in (self.records_file, self.meta_file):
+                if path.exists():
+                    path.unlink()
+        elif self.records_file.exists():
+            for _, record in self._iter_records():
+                self.aggregator.add_book_viz(record)
+
+    def _iter_records(self):
+        """(offset, record) for every line in the stream; a torn final line is skipped"""
+        with open(self.records_file, 'rb') as f:
+            offset = f.tell()
+            for line in iter(f.readline, b''):
+                try:
+                    yield offset, json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"   ⚠️ Skipping incomplete record in {self.records_file.name}")
+                offset = f.tell()
+
+    @property
+    def totals(self):
+        return self.aggregator.totals
+
+    def append_book(self, book_id, book_data):
+        """Append one book (a corpus results entry) and refresh the running metadata"""
+        record = book_to_visualization(book_id, book_data)
+        line = json.dumps(record, default=str) + '\n'
+        with open(self.records_file, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.aggregator.add_book_viz(record)
+        write_json_atomic(self.meta_file, self.get_metadata(last_book=book_id), indent=2)
+
+    def get_metadata(self, last_book=None):
+        metadata = self.aggregator.metadata()
+        metadata['updated_at'] = datetime.now().isoformat()
+        if last_book:
+            metadata['last_book'] = last_book
+        return metadata
+
+    def compact(self, output_file=None):
+        """Write the final visualization JSON in one streaming pass over the records"""
+        output_file = Path(output_file or self.output_file)
+        # Last occurrence of each book wins; order is first appearance (processing order)
+        latest_offsets = {}
+        if self.records_file.exists():
+            for offset, record in self._iter_records():
+                latest_offsets[record['book_id']] = offset
+
+        visualization_data = {'metadata': self.aggregator.metadata()}
+
+        tmp_file = output_file.with_name(f".{output_file.name}.tmp")
+        with open(tmp_file, 'w') as out:
+            out.write('{\n')
+            _write_member(out, 'metadata', visualization_data['metadata'])
+            out.write(',\n  "books": [')
+            if latest_offsets:
+                with open(self.records_file, 'rb') as records:
+                    for i, offset in enumerate(latest_offsets.values()):
+                        records.seek(offset)
+                        book_viz = json.loads(records.readline())
+                        out.write(',\n    ' if i else '\n    ')
+                        out.write(_indent(json.dumps(book_viz, indent=2, default=str), '    '))
+                out.write('\n  ]')
+            else:
+                out.write(']')
+
+            visualization_data.update(self.aggregator.relationship_sections())
+            for key in ('characters', 'character_books', 'conflict_network', 'goals', 'goal_network'):
+                out.write(',\n')
+                _write_member(out, key, visualization_data[key])
+            out.write('\n}')
+        os.replace(tmp_file, output_file)
+        return visualization_data
+
+def _indent(text, prefix):
+    return text.replace('\n', '\n' + prefix)
+
+def _write_member(out, key, value):
+    # Matches json.dump(..., indent=2) for a top-level member
+    out.write(f'  {json.dumps(key)}: ')
+    out.write(_indent(json.dumps(value, indent=2, default=str), '  '))
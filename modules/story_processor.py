@@ -1,43 +1,413 @@
-from .llm_provider import LLMProvider
+from .llm_provider import LLMProvider, track_call
+from .rate_limit import LLMCallError
 from .data_models import Scene, Goal, Conflict
+from .concurrency import AdaptiveLimiter, default_max_workers, map_ordered
+from .narrator_detection import resolve_book_narrators
+from .windowing import TextWindower, paragraph_spans
+from .chapter_boundaries import chapter_spans
+from .json_stream import extract_json_text
+from .structured_output import (PHASE_SCHEMAS, REPROMPT_SUFFIX, ParseStats, has_required_fields, parse_json_object,
+                                repair_json)
+from .events import EventBus
+from dataclasses import replace
+from typing import Optional
+import asyncio
 import json
-import re
+import time
+
+# Prompt-token budget per batched goal/conflict request, matched on model name substrings
+BATCH_TOKEN_BUDGETS = {
+    'gpt-oss': 8000,
+    'llama3': 3000,
+    'llama2': 2000,
+    'mistral': 6000,
+    'gpt-4': 12000,
+    'gpt-3.5': 6000,
+    'claude': 12000
+}
+DEFAULT_BATCH_TOKEN_BUDGET = 4000
+
+def default_batch_token_budget(model):
+    model = (model or '').lower()
+    for name, budget in BATCH_TOKEN_BUDGETS.items():
+        if name in model:
+            return budget
+    return DEFAULT_BATCH_TOKEN_BUDGET
+
+def _normalize(text):
+    return ' '.join(str(text or '').lower().split())
+
+def _start_paragraph_identity(scene_data):
+    return str(scene_data.get('start_paragraph'))
+
+def _scene_text_identity(scene_data):
+    return _normalize(scene_data.get('text'))[:200]
+
+# How items repeated in overlapping windows are recognized, per response key
+GOAL_IDENTITY = {
+    'goals': lambda goal: (_normalize(goal.get('character')),
+                           _normalize(goal.get('evidence')) or _normalize(goal.get('goal')))
+}
+CONFLICT_IDENTITY = {
+    'conflicts': lambda conflict: (tuple(sorted(_normalize(c) for c in conflict.get('characters_involved', []))),
+                                   _normalize(conflict.get('evidence')) or _normalize(conflict.get('description')))
+}
 
 class SimpleStoryProcessor:
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self, llm_provider: LLMProvider, max_workers: Optional[int] = 1,
+                 adaptive_concurrency: bool = False, max_in_flight: int = 64,
+                 fused_analysis: bool = False, batch_scenes: bool = False,
+                 batch_token_budget: Optional[int] = None, narrator_heuristics: bool = False,
+                 narrator_confidence: float = 0.75, offset_segmentation: bool = False,
+                 token_windows: bool = False, window_overlap_tokens: int = 200,
+                 context_size: Optional[int] = None, structured_output: bool = False,
+                 json_retries: int = 1, event_bus: Optional[EventBus] = None):
+        """max_workers=None uses the per-provider default from modules.concurrency;
+        adaptive_concurrency lets the in-flight limit float between 1 and max_workers;
+        max_in_flight bounds concurrent requests in the async pipeline (aanalyze_story);
+        fused_analysis extracts goals and conflicts with one request per scene;
+        batch_scenes packs several scenes of a chapter into each goal/conflict request,
+        up to batch_token_budget prompt tokens (default: per model, see BATCH_TOKEN_BUDGETS);
+        narrator_heuristics resolves chapter narrators locally (modules.narrator_detection)
+        and only asks the LLM for chapters below narrator_confidence;
+        offset_segmentation has the model return scene-start paragraph numbers instead
+        of echoing scene text, which is then sliced from the chapter locally;
+        token_windows replaces the fixed 6000/4000-character truncation with overlapping
+        windows sized to the model's context (context_size overrides modules.windowing's table);
+        structured_output sends each phase's JSON schema (modules.structured_output) to the
+        provider. Unparseable responses are repaired locally first and re-prompted at most
+        json_retries times; parse_stats counts the outcomes per phase.
+        event_bus (modules.events) receives book/phase/chapter/scene start and finish,
+        per-call latency and token events, and errors; one is created if not given."""
+        self.events = event_bus or EventBus()
+        self.offset_segmentation = offset_segmentation
+        self.structured_output = structured_output
+        self.json_retries = json_retries
+        self.parse_stats = ParseStats()
         self.llm_provider = llm_provider
+        self.narrator_heuristics = narrator_heuristics
+        self.narrator_confidence = narrator_confidence
+        self.fused_analysis = fused_analysis
+        self.batch_scenes = batch_scenes
+        self.batch_token_budget = batch_token_budget or default_batch_token_budget(llm_provider.model)
+        self.token_estimator = None
+        if batch_scenes or token_windows:
+            from .token_estimator import TokenEstimator
+            self.token_estimator = TokenEstimator()
+        self.windower = None
+        if token_windows:
+            self.windower = TextWindower(llm_provider.provider, llm_provider.model, self._count_tokens,
+                                         overlap_tokens=window_overlap_tokens, max_context=context_size)
+            if llm_provider.provider == 'ollama':
+                # Ollama truncates prompts to num_ctx, which defaults far below most models' context
+                options = llm_provider.generation_params.setdefault('options', {})
+                options.setdefault('num_ctx', self.windower.context['max_context'])
+        self.max_in_flight = max_in_flight
+        if max_workers is None:
+            max_workers = default_max_workers(llm_provider.provider)
+        self.max_workers = max(1, max_workers)
+        self.limiter = AdaptiveLimiter(self.max_workers) if adaptive_concurrency and self.max_workers > 1 else None
+
+    def _phase_schema(self, phase):
+        if phase == 'segmentation' and self.offset_segmentation:
+            return PHASE_SCHEMAS['offset_segmentation']
+        return PHASE_SCHEMAS.get(phase)
+
+    def run_info(self):
+        """What this processor's results depend on: provider, model and the settings that change prompts or output"""
+        return {
+            'provider': self.llm_provider.provider,
+            'model': self.llm_provider.model,
+            'fused_analysis': self.fused_analysis,
+            'batch_scenes': self.batch_scenes,
+            'narrator_heuristics': self.narrator_heuristics,
+            'narrator_confidence': self.narrator_confidence if self.narrator_heuristics else None,
+            'offset_segmentation': self.offset_segmentation,
+            'token_windows': self.windower is not None,
+            'structured_output': self.structured_output
+        }
+
+    def _schema_for(self, phase):
+        """Schema sent to the provider: only with structured_output"""
+        if not (self.structured_output and phase):
+            return None
+        return self._phase_schema(phase)
+
+    def _call_llm(self, prompt, phase=None):
+        """Call the provider for one phase's prompt, making sure the reply is usable JSON.
+
+        Near-valid JSON is repaired locally; only if that fails is the model asked
+        again (json_retries times). Provider errors (empty replies) are not retried here.
+        """
+        schema = self._schema_for(phase)
+        response_text = self._call_provider(prompt, schema, phase)
+        if phase is None:
+            return response_text
+        
+        json_text = self._json_or_repair(phase, response_text)
+        retries = self.json_retries
+        while json_text is None and response_text and retries > 0:
+            retries -= 1
+            self._record_reprompt(phase)
+            response_text = self._call_provider(prompt + REPROMPT_SUFFIX, schema, phase)
+            json_text = self._json_or_repair(phase, response_text, reprompted=True)
+        return self._final_response(phase, json_text, response_text)
+
+    def _record_reprompt(self, phase):
+        self.parse_stats.record(phase, 'reprompted')
+        telemetry = getattr(self.llm_provider, 'telemetry', None)
+        if telemetry is not None:
+            telemetry.record_retry(self.llm_provider.provider, self.llm_provider.model, phase, 'invalid_json')
+
+    @staticmethod
+    def _call_kwargs(schema, phase):
+        # Only pass what is set, so minimal providers with call_llm(prompt) keep working
+        kwargs = {}
+        if schema:
+            kwargs['schema'] = schema
+        if phase:
+            kwargs['phase'] = phase
+        return kwargs
+
+    def _json_or_repair(self, phase, response_text, reprompted=False):
+        """Response text if it parses into the phase's payload, a repaired JSON string if it can be
+        fixed, else None. Parsed objects without the phase's top-level keys (e.g. one goal instead
+        of {"goals": [...]}) count as unparsed."""
+        if not reprompted:
+            self.parse_stats.record(phase, 'responses')
+        if not response_text:
+            return None
+        if self._is_payload(phase, parse_json_object(response_text)):
+            outcome = 'valid'
+            json_text = response_text
+        else:
+            repaired = repair_json(response_text)
+            if not self._is_payload(phase, repaired):
+                return None
+            outcome = 'repaired'
+            json_text = json.dumps(repaired)
+        self.parse_stats.record(phase, 'recovered_by_reprompt' if reprompted else outcome)
+        return json_text
+
+    def _is_payload(self, phase, data):
+        schema = self._phase_schema(phase)
+        return data is not None and (schema is None or has_required_fields(data, schema))
+
+    def _final_response(self, phase, json_text, response_text):
+        if json_text is not None:
+            return json_text
+        self.parse_stats.record(phase, 'failed' if response_text else 'empty')
+        if response_text:
+            self.events.emit('error', phase=phase, message='Response could not be parsed as JSON')
+        return response_text
+
+    def _call_provider(self, prompt, schema=None, phase=None):
+        """Call the provider, feeding latency and failures to the adaptive limiter if enabled.
 
-    def analyze_story(self, story_text, story_id="story"):
-        """Three-phase analysis: Scene segmentation, goal extraction, conflict analysis"""
+        The limiter sees the latency of the request that produced the reply, not backoff or
+        rate-limit waits; cache hits say nothing about server load and are not sampled.
+        """
+        if self.limiter is None:
+            return self._provider_call(prompt, schema, phase)
+        self.limiter.acquire()
+        start = time.time()
+        response_text = ""
+        with track_call() as call:
+            try:
+                response_text = self._provider_call(prompt, schema, phase)
+                return response_text
+            finally:
+                if call['cache_hit']:
+                    self.limiter.release(None)
+                else:
+                    # Providers without track_call support are timed from the outside
+                    latency = call['latency'] if call['latency'] is not None else time.time() - start
+                    # call_llm reports provider errors as an empty response
+                    self.limiter.release(latency, ok=bool(response_text))
+
+    def _provider_call(self, prompt, schema, phase=None):
+        start = time.time()
+        response_text = self.llm_provider.call_llm(prompt, **self._call_kwargs(schema, phase))
+        self._emit_call(phase, prompt, response_text, time.time() - start)
+        return response_text
+
+    def _emit_call(self, phase, prompt, response_text, latency):
+        if not self.events.active:
+            return
+        self.events.emit('llm_call', phase=phase, latency_s=round(latency, 4),
+                         prompt_tokens=self._estimate_tokens(prompt),
+                         completion_tokens=self._estimate_tokens(response_text or ''), ok=bool(response_text))
+        if not response_text:
+            # call_llm reports provider errors as an empty response
+            self.events.emit('error', phase=phase, message='Empty response from provider')
+
+    def _estimate_tokens(self, text):
+        if self.token_estimator is not None:
+            return self._count_tokens(text)
+        return len(text) // 4
+
+    def _map_scenes(self, fn, scenes, label, phase):
+        """Run fn over scenes (sequentially or on the worker pool) keeping scene order"""
+        total = len(scenes)
+
+        def run(indexed_scene):
+            i, scene = indexed_scene
+            print(f"   Analyzing {label} in scene {i}/{total}...")
+            self.events.emit('scene_started', book_id=scene.book_id, scene_id=scene.scene_id, phase=phase,
+                             index=i, total_scenes=total)
+            result = fn(scene)
+            self._emit_scene_finished(phase, scene, i, total, result)
+            return result
+
+        return map_ordered(run, list(enumerate(scenes, 1)), self.max_workers)
+
+    def _emit_scene_finished(self, phase, scene, index, total, result):
+        if phase == 'fused':
+            counts = {'goals': len(result[0]), 'conflicts': len(result[1])}
+        else:
+            counts = {phase: len(result)}
+        self.events.emit('scene_finished', book_id=scene.book_id, scene_id=scene.scene_id, phase=phase,
+                         index=index, total_scenes=total, **counts)
+
+    def _emit_book_finished(self, story_id, result, start):
+        self.events.emit('book_finished', book_id=story_id, scenes=len(result['scenes']),
+                         goals=len(result['goals']), conflicts=len(result['conflicts']),
+                         seconds=round(time.time() - start, 3))
+
+    def _checkpointed(self, checkpoint, story_id, phase, compute):
+        """Load a phase from the checkpoint store if present, otherwise compute and persist it"""
+        if checkpoint is not None:
+            saved = checkpoint.load_phase(story_id, phase)
+            if saved is not None:
+                print(f"   ⏩ Resuming {story_id}: loaded {phase} checkpoint")
+                return saved
+        value = compute()
+        if checkpoint is not None:
+            checkpoint.save_phase(story_id, phase, value)
+        return value
+
+    def analyze_story(self, story_text, story_id="story", checkpoint=None):
+        """Three-phase analysis: Scene segmentation, goal extraction, conflict analysis
+
+        With a CheckpointStore (modules.checkpoint), narrators, scenes, goals and
+        conflicts are persisted as each phase completes and reloaded on resume, as
+        long as the book's text and this processor's run_info() are unchanged.
+        """
+        start = time.time()
+        self.events.emit('book_started', book_id=story_id)
+        try:
+            result = self._analyze_story(story_text, story_id, checkpoint)
+        except Exception as e:
+            self.events.emit('error', book_id=story_id, message=str(e))
+            raise
+        self._emit_book_finished(story_id, result, start)
+        return result
+
+    def _analyze_story(self, story_text, story_id, checkpoint):
+        if checkpoint is not None:
+            checkpoint.begin_book(story_id, story_text, self.run_info())
         print(f"🎬 Phase 1: Segmenting scenes for {story_id}")
+        self.events.emit('phase_started', book_id=story_id, phase='segmentation')
         
-        # Phase 1: Scene segmentation
-        scenes = self.segment_scenes(story_text, story_id)
+        # Phase 1: Narrator identification and scene segmentation
+        narrators = self._checkpointed(
+            checkpoint, story_id, 'narrators',
+            lambda: self.identify_chapter_narrators(self.segment_chapters(story_text, story_id)))
+        scenes = self._checkpointed(
+            checkpoint, story_id, 'segmentation',
+            lambda: self.segment_scenes(story_text, story_id, narrators))
+        self.events.emit('phase_finished', book_id=story_id, phase='segmentation', scenes=len(scenes))
         if not scenes:
             print(f"❌ No scenes found for {story_id}")
             return {"scenes": [], "goals": [], "conflicts": []}
         
         print(f"✅ Found {len(scenes)} scenes")
+        
+        if self.fused_analysis:
+            return self._analyze_story_fused(story_id, scenes, checkpoint)
+        
         print(f"🎯 Phase 2: Analyzing goals across {len(scenes)} scenes")
+        self.events.emit('phase_started', book_id=story_id, phase='goals', total_scenes=len(scenes))
         
-        # Phase 2: Goal analysis
-        all_goals = []
-        for i, scene in enumerate(scenes, 1):
-            print(f"   Analyzing goals in scene {i}/{len(scenes)}...")
-            scene_goals = self.analyze_goals(scene)
-            all_goals.extend(scene_goals)
+        # Phase 2: Goal analysis (results come back in scene order, so IDs stay deterministic)
+        all_goals = self._checkpointed(
+            checkpoint, story_id, 'goals',
+            lambda: [goal for scene_goals in self._analyze_goals_per_scene(scenes) for goal in scene_goals])
         
         print(f"✅ Found {len(all_goals)} total goals")
+        self.events.emit('phase_finished', book_id=story_id, phase='goals', goals=len(all_goals))
         print(f"⚡ Phase 3: Analyzing conflicts across {len(scenes)} scenes")
+        self.events.emit('phase_started', book_id=story_id, phase='conflicts', total_scenes=len(scenes))
         
         # Phase 3: Conflict analysis
-        all_conflicts = []
-        for i, scene in enumerate(scenes, 1):
-            print(f"   Analyzing conflicts in scene {i}/{len(scenes)}...")
-            scene_conflicts = self.analyze_conflicts(scene, all_goals)
-            all_conflicts.extend(scene_conflicts)
+        all_conflicts = self._checkpointed(
+            checkpoint, story_id, 'conflicts',
+            lambda: [conflict for scene_conflicts in self._analyze_conflicts_per_scene(scenes, all_goals)
+                     for conflict in scene_conflicts])
         
         print(f"✅ Found {len(all_conflicts)} total conflicts")
+        self.events.emit('phase_finished', book_id=story_id, phase='conflicts', conflicts=len(all_conflicts))
+        
+        return {
+            "scenes": scenes,
+            "goals": all_goals,
+            "conflicts": all_conflicts
+        }
+
+    def _analyze_goals_per_scene(self, scenes):
+        """Goals for every scene, as one list per scene in scene order"""
+        if self.batch_scenes:
+            batches = self.build_scene_batches(scenes)
+            print(f"   📦 Packed {len(scenes)} scenes into {len(batches)} goal requests")
+            per_batch = map_ordered(self._tracked_batch(self.analyze_goals_batch, scenes, 'goals'), batches,
+                                    self.max_workers)
+            return [scene_goals for batch_goals in per_batch for scene_goals in batch_goals]
+        return self._map_scenes(self.analyze_goals, scenes, "goals", 'goals')
+
+    def _analyze_conflicts_per_scene(self, scenes, all_goals):
+        """Conflicts for every scene, as one list per scene in scene order"""
+        if self.batch_scenes:
+            batches = self.build_scene_batches(scenes)
+            print(f"   📦 Packed {len(scenes)} scenes into {len(batches)} conflict requests")
+            analyze_batch = lambda batch: self.analyze_conflicts_batch(batch, all_goals)
+            per_batch = map_ordered(self._tracked_batch(analyze_batch, scenes, 'conflicts'), batches,
+                                    self.max_workers)
+            return [scene_conflicts for batch_conflicts in per_batch for scene_conflicts in batch_conflicts]
+        
+        def analyze_scene_conflicts(scene):
+            return self.analyze_conflicts(scene, all_goals)
+
+        return self._map_scenes(analyze_scene_conflicts, scenes, "conflicts", 'conflicts')
+
+    def _tracked_batch(self, analyze_batch, scenes, phase):
+        """analyze_batch, emitting scene_finished for each scene of a batch once its request returns"""
+        positions = {scene.scene_id: i for i, scene in enumerate(scenes, 1)}
+
+        def run(batch):
+            per_scene = analyze_batch(batch)
+            for scene, result in zip(batch, per_scene):
+                self._emit_scene_finished(phase, scene, positions[scene.scene_id], len(scenes), result)
+            return per_scene
+        return run
+
+    def _analyze_story_fused(self, story_id, scenes, checkpoint):
+        """Phases 2+3 as one request per scene; checkpoints are written as the usual goals/conflicts phases"""
+        print(f"🎯⚡ Phase 2+3: Analyzing goals and conflicts across {len(scenes)} scenes (fused)")
+        self.events.emit('phase_started', book_id=story_id, phase='fused', total_scenes=len(scenes))
+        
+        all_goals = checkpoint.load_phase(story_id, 'goals') if checkpoint else None
+        all_conflicts = checkpoint.load_phase(story_id, 'conflicts') if checkpoint else None
+        if all_goals is None or all_conflicts is None:
+            all_goals, all_conflicts = self._analyze_scenes_fused(scenes)
+            if checkpoint:
+                checkpoint.save_phase(story_id, 'goals', all_goals)
+                checkpoint.save_phase(story_id, 'conflicts', all_conflicts)
+        else:
+            print(f"   ⏩ Resuming {story_id}: loaded goals and conflicts checkpoints")
+        
+        print(f"✅ Found {len(all_goals)} total goals and {len(all_conflicts)} total conflicts")
+        self.events.emit('phase_finished', book_id=story_id, phase='fused', goals=len(all_goals),
+                         conflicts=len(all_conflicts))
         
         return {
             "scenes": scenes,
@@ -47,70 +417,33 @@ class SimpleStoryProcessor:
 
     def segment_chapters(self, story_text, story_id="story"):
         """Phase 1a: Segment story into chapters first"""
-        
-        # Look for common chapter markers in Baby-Sitters Club books
-        import re
-        
-        # Common chapter patterns
-        chapter_patterns = [
-            r'Chapter \d+',
-            r'CHAPTER \d+', 
-            r'Chapter [IVX]+',
-            r'CHAPTER [IVX]+',
-            r'\n\d+\n',  # Standalone numbers
-            r'\n[IVX]+\n'  # Roman numerals
-        ]
-        
-        chapters = []
-        current_pos = 0
-        
-        # Find all chapter breaks
-        for pattern in chapter_patterns:
-            matches = list(re.finditer(pattern, story_text, re.IGNORECASE))
-            if matches:
-                # Use the first pattern that finds chapters
-                for i, match in enumerate(matches):
-                    chapter_start = current_pos if i == 0 else matches[i-1].end()
-                    chapter_end = match.start() if i > 0 else len(story_text)
-                    
-                    if i > 0:  # Skip first iteration
-                        chapter_text = story_text[chapter_start:chapter_end].strip()
-                        if len(chapter_text) > 100:  # Only include substantial chapters
-                            chapters.append({
-                                'chapter_id': f"{story_id}_chapter_{i}",
-                                'chapter_num': i,
-                                'text': chapter_text
-                            })
-                    
-                    current_pos = match.end()
-                
-                # Add final chapter
-                final_text = story_text[current_pos:].strip()
-                if len(final_text) > 100:
-                    chapters.append({
-                        'chapter_id': f"{story_id}_chapter_{len(matches)+1}",
-                        'chapter_num': len(matches) + 1,
-                        'text': final_text
-                    })
-                break
-        
-        # If no chapters found, treat whole story as one chapter
-        if not chapters:
-            chapters = [{
-                'chapter_id': f"{story_id}_chapter_1",
-                'chapter_num': 1,
-                'text': story_text
-            }]
-        
-        return chapters
+        # Chapter markers in Baby-Sitters Club books ("Chapter 3", "CHAPTER IV", bare numbers
+        # on their own line), found in one scan; see chapter_boundaries.MARKER_STYLES
+        return [{
+            'chapter_id': f"{story_id}_chapter_{span.chapter_num}",
+            'chapter_num': span.chapter_num,
+            'text': story_text[span.start:span.end],
+            'start': span.start,
+            'end': span.end,
+            'marker': span.marker
+        } for span in chapter_spans(story_text)]
 
     def identify_narrator(self, chapter_text):
         """Identify the narrator/POV character for this chapter"""
-        
+        prompt = self._build_narrator_prompt(chapter_text)
+        try:
+            response_text = self._call_llm(prompt, 'narrator')
+            return self._parse_narrator(response_text)
+        except LLMCallError:
+            raise
+        except:
+            return 'Unknown'
+
+    def _build_narrator_prompt(self, chapter_text):
         # Limit text for narrator identification
         sample_text = chapter_text[:2000]
         
-        prompt = f'''Identify the narrator/point-of-view character in this Baby-sitters Club chapter excerpt.
+        return f'''Identify the narrator/point-of-view character in this Baby-sitters Club chapter excerpt.
 
 Look for:
 - First person pronouns ("I", "my", "me") 
@@ -128,8 +461,8 @@ Return JSON:
   "evidence": "Brief quote showing narrator identity"
 }}'''
 
+    def _parse_narrator(self, response_text):
         try:
-            response_text = self.llm_provider.call_llm(prompt)
             json_text = self._extract_json(response_text)
             if json_text:
                 data = json.loads(json_text)
@@ -141,40 +474,123 @@ Return JSON:
 
     def _extract_json(self, response_text):
         """Helper method to extract JSON from LLM response"""
-        import re
-        import json
+        # Balanced scan: the first complete object wins, not the widest {...} span
+        return extract_json_text(response_text)
+
+    def identify_chapter_narrators(self, chapters):
+        """Narrator for every chapter, keyed by chapter number"""
+        if not self.narrator_heuristics:
+            return {chapter['chapter_num']: self.identify_narrator(chapter['text']) for chapter in chapters}
         
-        if isinstance(response_text, str):
-            # Try to find JSON in the response
-            if response_text.strip().startswith('{'):
-                return response_text.strip()
-            else:
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    return json_match.group()
-        return None
+        narrators = self._resolve_narrators_locally(chapters)
+        for chapter in chapters:
+            if narrators[chapter['chapter_num']] is None:
+                narrators[chapter['chapter_num']] = self.identify_narrator(chapter['text'])
+        return narrators
+
+    def _resolve_narrators_locally(self, chapters):
+        """chapter_num -> narrator from the local heuristics, None where the LLM is still needed"""
+        narrators = resolve_book_narrators(chapters, self.narrator_confidence)
+        resolved = sum(1 for narrator in narrators.values() if narrator is not None)
+        print(f"🗣️ Narrators resolved locally for {resolved}/{len(chapters)} chapters")
+        return narrators
 
-    def segment_scenes(self, story_text, story_id="story"):
-        """Phase 1: Segment story into chapters, then scenes"""
+    def segment_scenes(self, story_text, story_id="story", narrators=None):
+        """Phase 1: Segment story into chapters, then scenes
+
+        narrators optionally maps chapter_num to an already identified narrator.
+        """
         
         # First segment into chapters
         chapters = self.segment_chapters(story_text, story_id)
+        if narrators is None and self.narrator_heuristics:
+            narrators = self.identify_chapter_narrators(chapters)
         
         all_scenes = []
         
         for chapter in chapters:
-            chapter_text = chapter['text']
-            chapter_id = chapter['chapter_id']
-            chapter_num = chapter['chapter_num']
-            
+            self.events.emit('chapter_started', book_id=story_id, chapter_num=chapter['chapter_num'],
+                             total_chapters=len(chapters))
             # Identify narrator for this chapter
-            narrator = self.identify_narrator(chapter_text)
+            if narrators and chapter['chapter_num'] in narrators:
+                narrator = narrators[chapter['chapter_num']]
+            else:
+                narrator = self.identify_narrator(chapter['text'])
             
-            # Segment chapter into scenes (with size limit)
-            if len(chapter_text) > 6000:
-                chapter_text = chapter_text[:6000]
+            prompts, finish = self._segmentation_requests(chapter, story_id, narrator)
+            responses = map_ordered(lambda prompt: self._call_llm(prompt, 'segmentation'), prompts, self.max_workers)
+            chapter_scenes = finish(responses)
+            all_scenes.extend(chapter_scenes)
+            self.events.emit('chapter_finished', book_id=story_id, chapter_num=chapter['chapter_num'],
+                             total_chapters=len(chapters), narrator=narrator, scenes=len(chapter_scenes))
+        
+        return all_scenes
+
+    def _segmentation_requests(self, chapter, story_id, narrator):
+        """Prompts covering one chapter, and a function turning their responses into its scenes"""
+        if self.windower is None:
+            prompt, chapter_text = self._build_segmentation_prompt(chapter, narrator)
+            return [prompt], lambda responses: self._parse_scenes(
+                responses[0], chapter, story_id, narrator, chapter_text)
+        
+        chapter_text = chapter['text']
+        chapter_num = chapter['chapter_num']
+        if self.offset_segmentation:
+            spans = paragraph_spans(chapter_text)
+            overhead = self._count_tokens(self._build_offset_segmentation_prompt(chapter_num, narrator, [],
+                                                                                 continues=True))
+            windows = self.windower.paragraph_windows(chapter_text, spans, overhead)
+            prompts = [
+                self._build_offset_segmentation_prompt(
+                    chapter_num, narrator, [chapter_text[start:end] for start, end in spans[first:last + 1]],
+                    first_paragraph=first + 1, continues=index > 0)
+                for index, (first, last) in enumerate(windows)
+            ]
             
-            prompt = f'''Analyze this Baby-sitters Club chapter and identify scene breaks within it.
+            def reported_by(index, key, scene_data):
+                """Whether a start belongs to this window: inside it, and past the previous window.
+                A later window opens mid-scene, so its first paragraph and the overlap are not breaks."""
+                try:
+                    paragraph = int(scene_data.get('start_paragraph')) - 1
+                except (AttributeError, TypeError, ValueError):
+                    return False
+                first, last = windows[index]
+                if index == 0:
+                    return first <= paragraph <= last
+                return max(first, windows[index - 1][1]) < paragraph <= last
+            
+            def finish(responses):
+                data = self._merge_window_data(responses, {'scenes': _start_paragraph_identity}, keep=reported_by)
+                scenes = self._scenes_from_offsets(data, chapter, story_id, narrator, chapter_text)
+                return scenes or self._parse_scenes(None, chapter, story_id, narrator, chapter_text)
+            return prompts or [self._build_segmentation_prompt(chapter, narrator)[0]], finish
+        
+        # The reply repeats each scene's text, so a window can be no longer than the model may write back
+        overhead = self._count_tokens(self._build_text_segmentation_prompt(chapter_num, narrator, ''))
+        prompts = [self._build_text_segmentation_prompt(chapter_num, narrator, window)
+                   for window in self.windower.windows(chapter_text, overhead, self.windower.echo_budget())]
+        
+        def finish(responses):
+            data = self._merge_window_data(responses, {'scenes': _scene_text_identity})
+            return self._scenes_from_data(data, chapter, story_id, narrator)
+        return prompts, finish
+
+    def _build_segmentation_prompt(self, chapter, narrator):
+        """Return the scene segmentation prompt and the (size-limited) chapter text it covers"""
+        chapter_text = chapter['text']
+        chapter_num = chapter['chapter_num']
+        
+        # Segment chapter into scenes (with size limit)
+        if self.windower is None and len(chapter_text) > 6000:
+            chapter_text = chapter_text[:6000]
+        
+        if self.offset_segmentation:
+            paragraphs = [chapter_text[start:end] for start, end in paragraph_spans(chapter_text)]
+            return self._build_offset_segmentation_prompt(chapter_num, narrator, paragraphs), chapter_text
+        return self._build_text_segmentation_prompt(chapter_num, narrator, chapter_text), chapter_text
+
+    def _build_text_segmentation_prompt(self, chapter_num, narrator, chapter_text):
+        return f'''Analyze this Baby-sitters Club chapter and identify scene breaks within it.
 
 Chapter {chapter_num} (Narrator: {narrator})
 
@@ -198,57 +614,151 @@ Return JSON with this structure:
   ]
 }}'''
 
-            response_text = self.llm_provider.call_llm(prompt)
-            
-            # Process scenes from this chapter
-            json_text = self._extract_json(response_text)
-            if json_text:
-                try:
-                    data = json.loads(json_text)
-                    for i, scene_data in enumerate(data.get('scenes', []), 1):
-                        scene = Scene(
-                            scene_id=f"{chapter_id}_scene_{i}",
-                            book_id=story_id,
-                            chapter_num=chapter_num,
-                            scene_num=i,
-                            text=scene_data.get('text', ''),
-                            narrator=narrator  # Add narrator info
-                        )
-                        all_scenes.append(scene)
-                except json.JSONDecodeError as e:
-                    print(f"JSON parsing error for {chapter_id}: {e}")
-                    # Fallback: treat whole chapter as one scene
-                    scene = Scene(
-                        scene_id=f"{chapter_id}_scene_1",
-                        book_id=story_id,
-                        chapter_num=chapter_num,
-                        scene_num=1,
-                        text=chapter_text,
-                        narrator=narrator
-                    )
-                    all_scenes.append(scene)
-            else:
-                # Fallback: treat whole chapter as one scene
-                scene = Scene(
-                    scene_id=f"{chapter_id}_scene_1",
-                    book_id=story_id,
-                    chapter_num=chapter_num,
-                    scene_num=1,
-                    text=chapter_text,
-                    narrator=narrator
-                )
-                all_scenes.append(scene)
+    def _build_offset_segmentation_prompt(self, chapter_num, narrator, paragraphs, first_paragraph=1,
+                                          continues=False):
+        """continues marks a later window of a long chapter: its first paragraph is mid-scene"""
+        numbered = "\n\n".join(f"[{i}] {paragraph}" for i, paragraph in enumerate(paragraphs, first_paragraph))
+        if continues:
+            return f'''Analyze this part of a Baby-sitters Club chapter and identify scene breaks within it.
+
+Chapter {chapter_num} (Narrator: {narrator})
+
+A scene is a continuous sequence in the same location/time. Look for:
+- Location changes
+- Time jumps  
+- Major topic shifts
+- Character group changes
+
+The paragraphs are numbered in [brackets]. This part continues from the previous one: paragraph {first_paragraph} is in the middle of a scene that started earlier.
+
+Text:
+{numbered}
+
+Return JSON with the paragraph number where each new scene starts. Do not list paragraph {first_paragraph} for the scene already in progress, and return an empty list if no new scene starts. Do not repeat the text:
+{{
+  "scenes": [
+    {{
+      "scene_id": "scene_1",
+      "description": "Brief description of what happens",
+      "start_paragraph": <paragraph number>
+    }}
+  ]
+}}'''
         
-        return all_scenes
+        return f'''Analyze this Baby-sitters Club chapter and identify scene breaks within it.
+
+Chapter {chapter_num} (Narrator: {narrator})
+
+A scene is a continuous sequence in the same location/time. Look for:
+- Location changes
+- Time jumps  
+- Major topic shifts
+- Character group changes
+
+The paragraphs are numbered in [brackets].
+
+Text:
+{numbered}
+
+Return JSON with the paragraph number where each scene starts (the first scene starts at {first_paragraph}). Do not repeat the text:
+{{
+  "scenes": [
+    {{
+      "scene_id": "scene_1",
+      "description": "Brief description of what happens",
+      "start_paragraph": {first_paragraph}
+    }}
+  ]
+}}'''
+
+    def _parse_scenes(self, response_text, chapter, story_id, narrator, chapter_text):
+        chapter_id = chapter['chapter_id']
+        chapter_num = chapter['chapter_num']
+        
+        # Fallback: treat whole chapter as one scene
+        fallback = [Scene(
+            scene_id=f"{chapter_id}_scene_1",
+            book_id=story_id,
+            chapter_num=chapter_num,
+            scene_num=1,
+            text=chapter_text,
+            narrator=narrator
+        )]
+        
+        json_text = self._extract_json(response_text)
+        if not json_text:
+            return fallback
+        
+        try:
+            data = json.loads(json_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error for {chapter_id}: {e}")
+            return fallback
+        
+        if self.offset_segmentation:
+            return self._scenes_from_offsets(data, chapter, story_id, narrator, chapter_text) or fallback
+        return self._scenes_from_data(data, chapter, story_id, narrator)
+
+    def _scenes_from_data(self, data, chapter, story_id, narrator):
+        chapter_id = chapter['chapter_id']
+        chapter_num = chapter['chapter_num']
+        scenes = []
+        for i, scene_data in enumerate(data.get('scenes', []), 1):
+            scenes.append(Scene(
+                scene_id=f"{chapter_id}_scene_{i}",
+                book_id=story_id,
+                chapter_num=chapter_num,
+                scene_num=i,
+                text=scene_data.get('text', ''),
+                narrator=narrator  # Add narrator info
+            ))
+        return scenes
+
+    def _scenes_from_offsets(self, data, chapter, story_id, narrator, chapter_text):
+        """Slice scenes out of chapter_text at the returned start paragraphs (1-based, inclusive ranges)"""
+        spans = paragraph_spans(chapter_text)
+        starts = set()
+        for scene_data in data.get('scenes', []):
+            try:
+                start = int(scene_data.get('start_paragraph'))
+            except (AttributeError, TypeError, ValueError):
+                continue
+            if 1 <= start <= len(spans):
+                starts.add(start)
+        if not starts:
+            return []
+        # Whatever precedes the first reported break still belongs to a scene
+        starts = sorted(starts | {1})
+        
+        scenes = []
+        for i, start in enumerate(starts, 1):
+            end = starts[i] - 1 if i < len(starts) else len(spans)
+            scenes.append(Scene(
+                scene_id=f"{chapter['chapter_id']}_scene_{i}",
+                book_id=story_id,
+                chapter_num=chapter['chapter_num'],
+                scene_num=i,
+                text=chapter_text[spans[start - 1][0]:spans[end - 1][1]],
+                narrator=narrator,
+                start_paragraph=start,
+                end_paragraph=end
+            ))
+        return scenes
 
     def analyze_goals(self, scene):
         """Phase 2: Analyze character goals within a scene"""
-        
+        if self.windower:
+            return self._goals_from_data(scene, self._analyze_windows(
+                scene, self._build_goals_prompt, GOAL_IDENTITY, 'goals'))
+        response_text = self._call_llm(self._build_goals_prompt(scene), 'goals')
+        return self._parse_goals(scene, response_text)
+
+    def _build_goals_prompt(self, scene):
         text = scene.text
-        if len(text) > 4000:  # Limit text size for goal analysis
+        if self.windower is None and len(text) > 4000:  # Limit text size for goal analysis
             text = text[:4000]
         
-        prompt = f'''Analyze character goals in this Baby-sitters Club scene:
+        return f'''Analyze character goals in this Baby-sitters Club scene:
 
 Scene: {scene.scene_id} (Chapter {scene.chapter_num})
 Narrator/POV: {scene.narrator or 'Unknown'}
@@ -279,56 +789,57 @@ IMPORTANT:
 - Mark if the goal belongs to the narrator character
 - Focus especially on the narrator's internal motivations
 - Each goal needs a direct quote showing the character's intention'''
+
+    def _parse_goals(self, scene, response_text):
+        json_text = self._extract_json(response_text)
+        if not json_text:
+            return []
         
-        response_text = self.llm_provider.call_llm(prompt)
-        
-        # Parse JSON response
-        json_text = None
-        if isinstance(response_text, str):
-            if response_text.strip().startswith('{'):
-                json_text = response_text.strip()
-            else:
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    json_text = json_match.group()
-        
-        if json_text:
-            try:
-                data = json.loads(json_text)
-                goals = []
-                for goal_data in data.get('goals', []):
-                    goal = Goal(
-                        goal_id=f"{scene.scene_id}_goal_{len(goals)+1}",
-                        scene_id=scene.scene_id,
-                        character=goal_data.get('character', 'Unknown'),
-                        goal_text=goal_data.get('goal', ''),
-                        motivation_type=goal_data.get('category', 'other'),
-                        category=goal_data.get('category', 'other'),
-                        evidence=goal_data.get('evidence', ''),
-                        confidence=0.8,
-                        book_id=scene.book_id
-                    )
-                    goals.append(goal)
-                return goals
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error in goal analysis: {e}")
-                return []
-        return []
+        try:
+            data = json.loads(json_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in goal analysis: {e}")
+            return []
+        return self._goals_from_data(scene, data)
+
+    def _goals_from_data(self, scene, data):
+        goals = []
+        for goal_data in data.get('goals', []):
+            goal = Goal(
+                goal_id=f"{scene.scene_id}_goal_{len(goals)+1}",
+                scene_id=scene.scene_id,
+                character=goal_data.get('character', 'Unknown'),
+                goal_text=goal_data.get('goal', ''),
+                motivation_type=goal_data.get('category', 'other'),
+                category=goal_data.get('category', 'other'),
+                evidence=goal_data.get('evidence', ''),
+                confidence=0.8,
+                book_id=scene.book_id
+            )
+            goals.append(goal)
+        return goals
 
     def analyze_conflicts(self, scene, all_goals):
         """Phase 3: Analyze conflicts within a scene"""
-        
+        # Find goals from this scene for context
+        scene_goals = [g for g in all_goals if g.scene_id == scene.scene_id]
+        if self.windower:
+            data = self._analyze_windows(scene, lambda window: self._build_conflicts_prompt(window, scene_goals),
+                                         CONFLICT_IDENTITY, 'conflicts')
+            return self._conflicts_from_data(scene, scene_goals, data)
+        response_text = self._call_llm(self._build_conflicts_prompt(scene, scene_goals), 'conflicts')
+        return self._parse_conflicts(scene, scene_goals, response_text)
+
+    def _build_conflicts_prompt(self, scene, scene_goals):
         text = scene.text
-        if len(text) > 4000:  # Limit text size for conflict analysis
+        if self.windower is None and len(text) > 4000:  # Limit text size for conflict analysis
             text = text[:4000]
         
-        # Find goals from this scene for context
-        scene_goals = [g for g in all_goals if g.scene_id == scene.scene_id]
         goals_context = ""
         if scene_goals:
             goals_context = "\n".join([f"- {g.character}: {g.goal_text}" for g in scene_goals])
         
-        prompt = f'''Analyze conflicts in this Baby-sitters Club scene:
+        return f'''Analyze conflicts in this Baby-sitters Club scene:
 
 Scene: {scene.scene_id} (Chapter {scene.chapter_num})
 Narrator/POV: {scene.narrator or 'Unknown'}
@@ -361,46 +872,618 @@ IMPORTANT:
 - Mark if the narrator is involved in the conflict
 - Focus on interpersonal tensions and disagreements
 - Each conflict needs a direct quote as evidence'''
+
+    def _parse_conflicts(self, scene, scene_goals, response_text):
+        json_text = self._extract_json(response_text)
+        if not json_text:
+            return []
+        
+        try:
+            data = json.loads(json_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in conflict analysis: {e}")
+            return []
+        return self._conflicts_from_data(scene, scene_goals, data)
+
+    def _conflicts_from_data(self, scene, scene_goals, data):
+        conflicts = []
+        for conflict_data in data.get('conflicts', []):
+            # Find affected goal IDs based on characters involved
+            affected_goals = []
+            involved_chars = conflict_data.get('characters_involved', [])
+            for goal in scene_goals:
+                if goal.character in involved_chars:
+                    affected_goals.append(goal.goal_id)
+            
+            conflict = Conflict(
+                conflict_id=f"{scene.scene_id}_conflict_{len(conflicts)+1}",
+                scene_id=scene.scene_id,
+                conflict_type=conflict_data.get('type', 'external_obstacle'),
+                description=conflict_data.get('description', ''),
+                characters_involved=involved_chars,
+                goals_affected=affected_goals,
+                evidence=conflict_data.get('evidence', ''),
+                rationale=conflict_data.get('rationale', ''),
+                severity=conflict_data.get('severity', 'medium'),
+                book_id=scene.book_id
+            )
+            conflicts.append(conflict)
+        return conflicts
+
+    def analyze_scene_fused(self, scene):
+        """Phases 2+3 in one request: goals and conflicts from a single structured response"""
+        if self.windower:
+            data = self._analyze_windows(scene, self._build_fused_prompt, {**GOAL_IDENTITY, **CONFLICT_IDENTITY},
+                                         'fused')
+            goals = self._goals_from_data(scene, data)
+            return goals, self._conflicts_from_data(scene, goals, data)
+        response_text = self._call_llm(self._build_fused_prompt(scene), 'fused')
+        return self._parse_fused(scene, response_text)
+
+    def _build_fused_prompt(self, scene):
+        text = scene.text
+        if self.windower is None and len(text) > 4000:  # Limit text size for scene analysis
+            text = text[:4000]
         
-        response_text = self.llm_provider.call_llm(prompt)
+        return f'''Analyze character goals and conflicts in this Baby-sitters Club scene:
+
+Scene: {scene.scene_id} (Chapter {scene.chapter_num})
+Narrator/POV: {scene.narrator or 'Unknown'}
+
+Text:
+{text}
+
+1. GOALS: Find what characters want or try to achieve. Pay special attention to the narrator's goals and motivations since this is their perspective.
+2. CONFLICTS: Find disagreements, tensions, or conflicts between characters, including conflicts over the goals you found.
+
+Respond in JSON:
+{{
+  "goals": [
+    {{
+      "character": "Character Name",
+      "goal": "What they want to achieve", 
+      "evidence": "EXACT quote from text that shows this goal",
+      "category": "social/family/personal/academic/babysitting/other",
+      "is_narrator": true/false
+    }}
+  ],
+  "conflicts": [
+    {{
+      "character1": "First Character Name",
+      "character2": "Second Character Name", 
+      "conflict_type": "disagreement/rivalry/misunderstanding/competition/other",
+      "description": "Brief description of the conflict",
+      "evidence": "EXACT quote showing the conflict",
+      "involves_narrator": true/false
+    }}
+  ]
+}}
+
+IMPORTANT:
+- Evidence must be exact quotes from the text (phrases or sentences)
+- Only include goals and conflicts with clear textual evidence
+- Mark if the goal belongs to, or the conflict involves, the narrator character
+- Focus especially on the narrator's internal motivations and interpersonal tensions'''
+
+    def _parse_fused(self, scene, response_text):
+        """Map a fused response onto the same Goal/Conflict objects as the two-phase path"""
+        json_text = self._extract_json(response_text)
+        if not json_text:
+            return [], []
         
-        # Parse JSON response
-        json_text = None
-        if isinstance(response_text, str):
-            if response_text.strip().startswith('{'):
-                json_text = response_text.strip()
-            else:
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    json_text = json_match.group()
+        try:
+            data = json.loads(json_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in fused scene analysis: {e}")
+            return [], []
         
-        if json_text:
+        goals = self._goals_from_data(scene, data)
+        return goals, self._conflicts_from_data(scene, goals, data)
+
+    def _analyze_scenes_fused(self, scenes):
+        """All scenes through the fused call; returns (all_goals, all_conflicts) in scene order"""
+        all_goals, all_conflicts = [], []
+        per_scene = self._map_scenes(self.analyze_scene_fused, scenes, "goals and conflicts", 'fused')
+        for scene_goals, scene_conflicts in per_scene:
+            all_goals.extend(scene_goals)
+            all_conflicts.extend(scene_conflicts)
+        return all_goals, all_conflicts
+
+    # ------------------------------------------------------------------
+    # Token-aware windowing
+    # ------------------------------------------------------------------
+
+    def _window_prompts(self, scene, build_prompt):
+        """One prompt per token window of the scene; a scene that fits gives the usual single prompt"""
+        overhead = self._count_tokens(build_prompt(replace(scene, text='')))
+        return [build_prompt(replace(scene, text=window)) for window in self.windower.windows(scene.text, overhead)]
+
+    def _analyze_windows(self, scene, build_prompt, identities, phase):
+        prompts = self._window_prompts(scene, build_prompt)
+        responses = map_ordered(lambda prompt: self._call_llm(prompt, phase), prompts, self.max_workers)
+        return self._merge_window_data(responses, identities)
+
+    def _merge_window_data(self, responses, identities, keep=None):
+        """Concatenate each key's items across window responses, dropping repeats from the overlaps.
+
+        identities maps a response key to a function giving an item's identity. Items
+        are only deduplicated against earlier windows, so a single response is unchanged.
+        keep(window_index, key, item), if given, drops items a window should not report.
+        """
+        merged = {key: [] for key in identities}
+        seen = {key: set() for key in identities}
+        for index, response_text in enumerate(responses):
+            json_text = self._extract_json(response_text)
+            if not json_text:
+                continue
             try:
                 data = json.loads(json_text)
-                conflicts = []
-                for conflict_data in data.get('conflicts', []):
-                    # Find affected goal IDs based on characters involved
-                    affected_goals = []
-                    involved_chars = conflict_data.get('characters_involved', [])
-                    for goal in scene_goals:
-                        if goal.character in involved_chars:
-                            affected_goals.append(goal.goal_id)
-                    
-                    conflict = Conflict(
-                        conflict_id=f"{scene.scene_id}_conflict_{len(conflicts)+1}",
-                        scene_id=scene.scene_id,
-                        conflict_type=conflict_data.get('type', 'external_obstacle'),
-                        description=conflict_data.get('description', ''),
-                        characters_involved=involved_chars,
-                        goals_affected=affected_goals,
-                        evidence=conflict_data.get('evidence', ''),
-                        rationale=conflict_data.get('rationale', ''),
-                        severity=conflict_data.get('severity', 'medium'),
-                        book_id=scene.book_id
-                    )
-                    conflicts.append(conflict)
-                return conflicts
             except json.JSONDecodeError as e:
-                print(f"JSON parsing error in conflict analysis: {e}")
-                return []
-        return []
+                print(f"JSON parsing error in windowed analysis: {e}")
+                continue
+            
+            for key, identity in identities.items():
+                window_seen = set()
+                for item in data.get(key, []):
+                    if keep is not None and not keep(index, key, item):
+                        continue
+                    item_id = identity(item) if isinstance(item, dict) else repr(item)
+                    if item_id in seen[key]:
+                        continue
+                    window_seen.add(item_id)
+                    merged[key].append(item)
+                seen[key] |= window_seen
+        return merged
+
+    # ------------------------------------------------------------------
+    # Token-budgeted multi-scene batching
+    # ------------------------------------------------------------------
+
+    def _count_tokens(self, text):
+        return self.token_estimator.count_tokens(text, self.llm_provider.model)
+
+    def _scene_excerpt(self, scene):
+        # Same per-scene size limit as the single-scene prompts; oversized scenes end up
+        # in a batch of their own, which goes through the windowed single-scene path
+        return scene.text if self.windower else scene.text[:4000]
+
+    def build_scene_batches(self, scenes):
+        """Pack consecutive scenes of the same chapter into batches whose prompt fits the token budget"""
+        # Fixed instruction overhead is paid once per batch, so measure it with no scenes in it
+        overhead = self._count_tokens(self._build_goals_batch_prompt([]))
+        available = max(1, self.batch_token_budget - overhead)
+        
+        batches, current, current_tokens = [], [], 0
+        for scene in scenes:
+            scene_tokens = self._count_tokens(self._scene_excerpt(scene)) + 20  # + scene header
+            same_chapter = (current and current[-1].book_id == scene.book_id
+                            and current[-1].chapter_num == scene.chapter_num)
+            if current and (not same_chapter or current_tokens + scene_tokens > available):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(scene)
+            current_tokens += scene_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _format_scene_block(self, scenes, goals_by_scene=None):
+        blocks = []
+        for scene in scenes:
+            block = f"=== Scene: {scene.scene_id} ===\n{self._scene_excerpt(scene)}"
+            if goals_by_scene is not None:
+                goals_context = "\n".join([f"- {g.character}: {g.goal_text}" for g in goals_by_scene.get(scene.scene_id, [])])
+                block += f"\n\nIdentified Goals in this scene:\n{goals_context}"
+            blocks.append(block)
+        return "\n\n".join(blocks)
+
+    def _build_goals_batch_prompt(self, scenes):
+        chapter_num = scenes[0].chapter_num if scenes else ''
+        narrator = (scenes[0].narrator if scenes else None) or 'Unknown'
+        return f'''Analyze character goals in each of these Baby-sitters Club scenes:
+
+Chapter {chapter_num}
+Narrator/POV: {narrator}
+
+{self._format_scene_block(scenes)}
+
+For each scene separately, find what characters want or try to achieve. Pay special attention to the narrator's goals and motivations since this is their perspective.
+
+For each goal, provide a DIRECT QUOTE from that scene's text as evidence.
+
+Respond in JSON with one entry per scene, using the scene IDs above (an empty list if a scene has no goals):
+{{
+  "scenes": [
+    {{
+      "scene_id": "Scene ID from above",
+      "goals": [
+        {{
+          "character": "Character Name",
+          "goal": "What they want to achieve", 
+          "evidence": "EXACT quote from text that shows this goal",
+          "category": "social/family/personal/academic/babysitting/other",
+          "is_narrator": true/false
+        }}
+      ]
+    }}
+  ]
+}}
+
+IMPORTANT: 
+- Include every scene ID listed above exactly once
+- Evidence must be exact quotes from that scene (phrases or sentences)
+- Only include goals with clear textual evidence
+- Mark if the goal belongs to the narrator character
+- Each goal needs a direct quote showing the character's intention'''
+
+    def _build_conflicts_batch_prompt(self, scenes, goals_by_scene):
+        chapter_num = scenes[0].chapter_num if scenes else ''
+        narrator = (scenes[0].narrator if scenes else None) or 'Unknown'
+        return f'''Analyze conflicts in each of these Baby-sitters Club scenes:
+
+Chapter {chapter_num}
+Narrator/POV: {narrator}
+
+{self._format_scene_block(scenes, goals_by_scene)}
+
+For each scene separately, find disagreements, tensions, or conflicts between characters. Consider the narrator's perspective since this is their viewpoint.
+
+Respond in JSON with one entry per scene, using the scene IDs above (an empty list if a scene has no conflicts):
+{{
+  "scenes": [
+    {{
+      "scene_id": "Scene ID from above",
+      "conflicts": [
+        {{
+          "character1": "First Character Name",
+          "character2": "Second Character Name", 
+          "conflict_type": "disagreement/rivalry/misunderstanding/competition/other",
+          "description": "Brief description of the conflict",
+          "evidence": "EXACT quote showing the conflict",
+          "involves_narrator": true/false
+        }}
+      ]
+    }}
+  ]
+}}
+
+IMPORTANT:
+- Include every scene ID listed above exactly once
+- Evidence must be exact quotes from that scene
+- Only include conflicts with clear textual evidence  
+- Mark if the narrator is involved in the conflict
+- Each conflict needs a direct quote as evidence'''
+
+    def _split_batch_response(self, response_text, key):
+        """Map scene_id -> that scene's list under key; empty if the response is unusable"""
+        json_text = self._extract_json(response_text)
+        if not json_text:
+            return {}
+        try:
+            data = json.loads(json_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in batched {key} analysis: {e}")
+            return {}
+        
+        per_scene = {}
+        for entry in data.get('scenes', []):
+            if isinstance(entry, dict) and entry.get('scene_id'):
+                per_scene[str(entry['scene_id']).strip()] = entry.get(key, [])
+        return per_scene
+
+    def analyze_goals_batch(self, batch):
+        """Goals for a batch of scenes from one request; one list per scene in batch order"""
+        if len(batch) == 1:
+            return [self.analyze_goals(batch[0])]
+        
+        response_text = self._call_llm(self._build_goals_batch_prompt(batch), 'goals_batch')
+        per_scene = self._split_batch_response(response_text, 'goals')
+        results = []
+        for scene in batch:
+            if scene.scene_id in per_scene:
+                results.append(self._goals_from_data(scene, {'goals': per_scene[scene.scene_id]}))
+            else:
+                # The model dropped this scene (or the whole response); ask for it on its own
+                results.append(self.analyze_goals(scene))
+        return results
+
+    def analyze_conflicts_batch(self, batch, all_goals):
+        """Conflicts for a batch of scenes from one request; one list per scene in batch order"""
+        if len(batch) == 1:
+            return [self.analyze_conflicts(batch[0], all_goals)]
+        
+        batch_ids = {scene.scene_id for scene in batch}
+        goals_by_scene = {}
+        for goal in all_goals:
+            if goal.scene_id in batch_ids:
+                goals_by_scene.setdefault(goal.scene_id, []).append(goal)
+        
+        response_text = self._call_llm(self._build_conflicts_batch_prompt(batch, goals_by_scene), 'conflicts_batch')
+        per_scene = self._split_batch_response(response_text, 'conflicts')
+        results = []
+        for scene in batch:
+            if scene.scene_id in per_scene:
+                results.append(self._conflicts_from_data(
+                    scene, goals_by_scene.get(scene.scene_id, []), {'conflicts': per_scene[scene.scene_id]}))
+            else:
+                results.append(self.analyze_conflicts(scene, all_goals))
+        return results
+
+    # ------------------------------------------------------------------
+    # Asyncio pipeline: same prompts and parsing, bounded by a semaphore
+    # ------------------------------------------------------------------
+
+    async def _acall_llm(self, prompt, semaphore, phase=None):
+        """Async _call_llm: same schema, repair and re-prompt handling"""
+        schema = self._schema_for(phase)
+        response_text = await self._acall_provider(prompt, semaphore, schema, phase)
+        if phase is None:
+            return response_text
+        
+        json_text = self._json_or_repair(phase, response_text)
+        retries = self.json_retries
+        while json_text is None and response_text and retries > 0:
+            retries -= 1
+            self._record_reprompt(phase)
+            response_text = await self._acall_provider(prompt + REPROMPT_SUFFIX, semaphore, schema, phase)
+            json_text = self._json_or_repair(phase, response_text, reprompted=True)
+        return self._final_response(phase, json_text, response_text)
+
+    async def _acall_provider(self, prompt, semaphore, schema=None, phase=None):
+        async with semaphore:
+            start = time.time()
+            response_text = await self.llm_provider.acall_llm(prompt, **self._call_kwargs(schema, phase))
+            self._emit_call(phase, prompt, response_text, time.time() - start)
+            return response_text
+
+    async def aanalyze_story(self, story_text, story_id="story", semaphore=None, checkpoint=None):
+        """Async three-phase analysis; chapters and scenes run concurrently up to max_in_flight.
+
+        Pass a shared asyncio.Semaphore to bound in-flight requests across several books.
+        checkpoint and batch_scenes work as in analyze_story.
+        """
+        start = time.time()
+        self.events.emit('book_started', book_id=story_id)
+        try:
+            result = await self._aanalyze_story(story_text, story_id, semaphore, checkpoint)
+        except Exception as e:
+            self.events.emit('error', book_id=story_id, message=str(e))
+            raise
+        self._emit_book_finished(story_id, result, start)
+        return result
+
+    async def _acheckpointed(self, checkpoint, story_id, phase, compute):
+        """Async _checkpointed: compute is a coroutine function, only awaited on a miss"""
+        if checkpoint is not None:
+            saved = checkpoint.load_phase(story_id, phase)
+            if saved is not None:
+                print(f"   ⏩ Resuming {story_id}: loaded {phase} checkpoint")
+                return saved
+        value = await compute()
+        if checkpoint is not None:
+            checkpoint.save_phase(story_id, phase, value)
+        return value
+
+    async def _aanalyze_story(self, story_text, story_id, semaphore, checkpoint):
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+        if checkpoint is not None:
+            checkpoint.begin_book(story_id, story_text, self.run_info())
+        
+        print(f"🎬 Phase 1: Segmenting scenes for {story_id}")
+        self.events.emit('phase_started', book_id=story_id, phase='segmentation')
+        chapters = self.segment_chapters(story_text, story_id)
+        narrators = await self._acheckpointed(checkpoint, story_id, 'narrators',
+                                              lambda: self._aidentify_chapter_narrators(chapters, semaphore))
+        
+        async def segment():
+            chapter_scenes = await asyncio.gather(*[
+                self._asegment_chapter(chapter, story_id, semaphore, narrators.get(chapter['chapter_num']),
+                                       total_chapters=len(chapters))
+                for chapter in chapters
+            ])
+            return [scene for scenes_in_chapter in chapter_scenes for scene in scenes_in_chapter]
+        
+        scenes = await self._acheckpointed(checkpoint, story_id, 'segmentation', segment)
+        self.events.emit('phase_finished', book_id=story_id, phase='segmentation', scenes=len(scenes))
+        if not scenes:
+            print(f"❌ No scenes found for {story_id}")
+            return {"scenes": [], "goals": [], "conflicts": []}
+        
+        print(f"✅ Found {len(scenes)} scenes")
+        
+        if self.fused_analysis:
+            return await self._aanalyze_story_fused(story_id, scenes, semaphore, checkpoint)
+        
+        print(f"🎯 Phase 2: Analyzing goals across {len(scenes)} scenes")
+        self.events.emit('phase_started', book_id=story_id, phase='goals', total_scenes=len(scenes))
+        
+        async def analyze_goals():
+            goals_per_scene = await self._aanalyze_goals_per_scene(scenes, semaphore)
+            return [goal for scene_goals in goals_per_scene for goal in scene_goals]
+        
+        all_goals = await self._acheckpointed(checkpoint, story_id, 'goals', analyze_goals)
+        
+        print(f"✅ Found {len(all_goals)} total goals")
+        self.events.emit('phase_finished', book_id=story_id, phase='goals', goals=len(all_goals))
+        print(f"⚡ Phase 3: Analyzing conflicts across {len(scenes)} scenes")
+        self.events.emit('phase_started', book_id=story_id, phase='conflicts', total_scenes=len(scenes))
+        
+        async def analyze_conflicts():
+            conflicts_per_scene = await self._aanalyze_conflicts_per_scene(scenes, all_goals, semaphore)
+            return [conflict for scene_conflicts in conflicts_per_scene for conflict in scene_conflicts]
+        
+        all_conflicts = await self._acheckpointed(checkpoint, story_id, 'conflicts', analyze_conflicts)
+        
+        print(f"✅ Found {len(all_conflicts)} total conflicts")
+        self.events.emit('phase_finished', book_id=story_id, phase='conflicts', conflicts=len(all_conflicts))
+        
+        return {
+            "scenes": scenes,
+            "goals": all_goals,
+            "conflicts": all_conflicts
+        }
+
+    async def _aanalyze_story_fused(self, story_id, scenes, semaphore, checkpoint):
+        """Async _analyze_story_fused"""
+        print(f"🎯⚡ Phase 2+3: Analyzing goals and conflicts across {len(scenes)} scenes (fused)")
+        self.events.emit('phase_started', book_id=story_id, phase='fused', total_scenes=len(scenes))
+        
+        all_goals = checkpoint.load_phase(story_id, 'goals') if checkpoint else None
+        all_conflicts = checkpoint.load_phase(story_id, 'conflicts') if checkpoint else None
+        if all_goals is None or all_conflicts is None:
+            fused_per_scene = await asyncio.gather(*[
+                self._atracked_scene('fused', scene, i, len(scenes), self._aanalyze_scene_fused(scene, semaphore))
+                for i, scene in enumerate(scenes, 1)
+            ])
+            all_goals = [goal for scene_goals, _ in fused_per_scene for goal in scene_goals]
+            all_conflicts = [conflict for _, scene_conflicts in fused_per_scene for conflict in scene_conflicts]
+            if checkpoint:
+                checkpoint.save_phase(story_id, 'goals', all_goals)
+                checkpoint.save_phase(story_id, 'conflicts', all_conflicts)
+        else:
+            print(f"   ⏩ Resuming {story_id}: loaded goals and conflicts checkpoints")
+        
+        print(f"✅ Found {len(all_goals)} total goals and {len(all_conflicts)} total conflicts")
+        self.events.emit('phase_finished', book_id=story_id, phase='fused', goals=len(all_goals),
+                         conflicts=len(all_conflicts))
+        return {"scenes": scenes, "goals": all_goals, "conflicts": all_conflicts}
+
+    async def _aidentify_chapter_narrators(self, chapters, semaphore):
+        """Async identify_chapter_narrators: the chapters left to the LLM are asked concurrently"""
+        narrators = self._resolve_narrators_locally(chapters) if self.narrator_heuristics else {}
+        pending = [chapter for chapter in chapters if narrators.get(chapter['chapter_num']) is None]
+        found = await asyncio.gather(*[self._aidentify_narrator(chapter['text'], semaphore) for chapter in pending])
+        for chapter, narrator in zip(pending, found):
+            narrators[chapter['chapter_num']] = narrator
+        return narrators
+
+    async def _aidentify_narrator(self, chapter_text, semaphore):
+        try:
+            return self._parse_narrator(
+                await self._acall_llm(self._build_narrator_prompt(chapter_text), semaphore, 'narrator'))
+        except LLMCallError:
+            raise
+        except:
+            return 'Unknown'
+
+    async def _aanalyze_goals_per_scene(self, scenes, semaphore):
+        """Async _analyze_goals_per_scene: one list per scene in scene order"""
+        if self.batch_scenes:
+            batches = self.build_scene_batches(scenes)
+            print(f"   📦 Packed {len(scenes)} scenes into {len(batches)} goal requests")
+            per_batch = await asyncio.gather(*[
+                self._atracked_batch('goals', batch, scenes, self._aanalyze_goals_batch(batch, semaphore))
+                for batch in batches
+            ])
+            return [scene_goals for batch_goals in per_batch for scene_goals in batch_goals]
+        # gather() preserves input order, so IDs match the synchronous pipeline
+        return await asyncio.gather(*[
+            self._atracked_scene('goals', scene, i, len(scenes), self._aanalyze_goals(scene, semaphore))
+            for i, scene in enumerate(scenes, 1)
+        ])
+
+    async def _aanalyze_conflicts_per_scene(self, scenes, all_goals, semaphore):
+        """Async _analyze_conflicts_per_scene: one list per scene in scene order"""
+        goals_by_scene = {}
+        for goal in all_goals:
+            goals_by_scene.setdefault(goal.scene_id, []).append(goal)
+        if self.batch_scenes:
+            batches = self.build_scene_batches(scenes)
+            print(f"   📦 Packed {len(scenes)} scenes into {len(batches)} conflict requests")
+            per_batch = await asyncio.gather(*[
+                self._atracked_batch('conflicts', batch, scenes,
+                                     self._aanalyze_conflicts_batch(batch, goals_by_scene, semaphore))
+                for batch in batches
+            ])
+            return [scene_conflicts for batch_conflicts in per_batch for scene_conflicts in batch_conflicts]
+        return await asyncio.gather(*[
+            self._atracked_scene('conflicts', scene, i, len(scenes),
+                                 self._aanalyze_conflicts(scene, goals_by_scene.get(scene.scene_id, []), semaphore))
+            for i, scene in enumerate(scenes, 1)
+        ])
+
+    async def _aanalyze_goals_batch(self, batch, semaphore):
+        """Async analyze_goals_batch"""
+        if len(batch) == 1:
+            return [await self._aanalyze_goals(batch[0], semaphore)]
+        
+        response_text = await self._acall_llm(self._build_goals_batch_prompt(batch), semaphore, 'goals_batch')
+        per_scene = self._split_batch_response(response_text, 'goals')
+        # Scenes the model dropped are asked for on their own
+        retried = await asyncio.gather(*[self._aanalyze_goals(scene, semaphore)
+                                         for scene in batch if scene.scene_id not in per_scene])
+        retried = iter(retried)
+        return [self._goals_from_data(scene, {'goals': per_scene[scene.scene_id]})
+                if scene.scene_id in per_scene else next(retried) for scene in batch]
+
+    async def _aanalyze_conflicts_batch(self, batch, goals_by_scene, semaphore):
+        """Async analyze_conflicts_batch"""
+        if len(batch) == 1:
+            return [await self._aanalyze_conflicts(batch[0], goals_by_scene.get(batch[0].scene_id, []), semaphore)]
+        
+        batch_goals = {scene.scene_id: goals_by_scene[scene.scene_id] for scene in batch
+                       if scene.scene_id in goals_by_scene}
+        response_text = await self._acall_llm(self._build_conflicts_batch_prompt(batch, batch_goals), semaphore,
+                                              'conflicts_batch')
+        per_scene = self._split_batch_response(response_text, 'conflicts')
+        retried = await asyncio.gather(*[self._aanalyze_conflicts(scene, batch_goals.get(scene.scene_id, []), semaphore)
+                                         for scene in batch if scene.scene_id not in per_scene])
+        retried = iter(retried)
+        return [self._conflicts_from_data(scene, batch_goals.get(scene.scene_id, []),
+                                          {'conflicts': per_scene[scene.scene_id]})
+                if scene.scene_id in per_scene else next(retried) for scene in batch]
+
+    async def _atracked_batch(self, phase, batch, scenes, coroutine):
+        """Async _tracked_batch: scene_finished for each scene of a batch once its request returns"""
+        per_scene = await coroutine
+        positions = {scene.scene_id: i for i, scene in enumerate(scenes, 1)}
+        for scene, result in zip(batch, per_scene):
+            self._emit_scene_finished(phase, scene, positions[scene.scene_id], len(scenes), result)
+        return per_scene
+
+    async def _acall_all(self, prompts, semaphore, phase=None):
+        return await asyncio.gather(*[self._acall_llm(prompt, semaphore, phase) for prompt in prompts])
+
+    async def _atracked_scene(self, phase, scene, index, total, coroutine):
+        """Await one scene's analysis between scene_started and scene_finished events"""
+        self.events.emit('scene_started', book_id=scene.book_id, scene_id=scene.scene_id, phase=phase,
+                         index=index, total_scenes=total)
+        result = await coroutine
+        self._emit_scene_finished(phase, scene, index, total, result)
+        return result
+
+    async def _asegment_chapter(self, chapter, story_id, semaphore, narrator=None, total_chapters=None):
+        self.events.emit('chapter_started', book_id=story_id, chapter_num=chapter['chapter_num'],
+                         total_chapters=total_chapters)
+        if narrator is None:
+            narrator = await self._aidentify_narrator(chapter['text'], semaphore)
+        prompts, finish = self._segmentation_requests(chapter, story_id, narrator)
+        scenes = finish(await self._acall_all(prompts, semaphore, 'segmentation'))
+        self.events.emit('chapter_finished', book_id=story_id, chapter_num=chapter['chapter_num'],
+                         total_chapters=total_chapters, narrator=narrator, scenes=len(scenes))
+        return scenes
+
+    async def _aanalyze_goals(self, scene, semaphore):
+        if self.windower:
+            responses = await self._acall_all(self._window_prompts(scene, self._build_goals_prompt), semaphore, 'goals')
+            return self._goals_from_data(scene, self._merge_window_data(responses, GOAL_IDENTITY))
+        response_text = await self._acall_llm(self._build_goals_prompt(scene), semaphore, 'goals')
+        return self._parse_goals(scene, response_text)
+
+    async def _aanalyze_conflicts(self, scene, scene_goals, semaphore):
+        if self.windower:
+            prompts = self._window_prompts(scene, lambda window: self._build_conflicts_prompt(window, scene_goals))
+            responses = await self._acall_all(prompts, semaphore, 'conflicts')
+            return self._conflicts_from_data(scene, scene_goals, self._merge_window_data(responses, CONFLICT_IDENTITY))
+        response_text = await self._acall_llm(self._build_conflicts_prompt(scene, scene_goals), semaphore, 'conflicts')
+        return self._parse_conflicts(scene, scene_goals, response_text)
+
+    async def _aanalyze_scene_fused(self, scene, semaphore):
+        if self.windower:
+            responses = await self._acall_all(self._window_prompts(scene, self._build_fused_prompt), semaphore, 'fused')
+            data = self._merge_window_data(responses, {**GOAL_IDENTITY, **CONFLICT_IDENTITY})
+            goals = self._goals_from_data(scene, data)
+            return goals, self._conflicts_from_data(scene, goals, data)
+        response_text = await self._acall_llm(self._build_fused_prompt(scene), semaphore, 'fused')
+        return self._parse_fused(scene, response_text)
@@ -0,0 +1,263 @@
+import json
+import re
+import threading
+from typing import Optional
+
+from .json_stream import extract_json_text
+
+# JSON schemas for each analysis phase's response, mirroring the prompt formats
+_GOAL = {
+    'type': 'object',
+    'properties': {
+        'character': {'type': 'string'},
+        'goal': {'type': 'string'},
+        'evidence': {'type': 'string'},
+        'category': {'type': 'string'},
+        'is_narrator': {'type': 'boolean'}
+    },
+    'required': ['character', 'goal', 'evidence']
+}
+
+_CONFLICT = {
+    'type': 'object',
+    'properties': {
+        'character1': {'type': 'string'},
+        'character2': {'type': 'string'},
+        'conflict_type': {'type': 'string'},
+        'description': {'type': 'string'},
+        'evidence': {'type': 'string'},
+        'involves_narrator': {'type': 'boolean'}
+    },
+    'required': ['description', 'evidence']
+}
+
+_GOALS = {'type': 'array', 'items': _GOAL}
+_CONFLICTS = {'type': 'array', 'items': _CONFLICT}
+
+PHASE_SCHEMAS = {
+    'narrator': {
+        'type': 'object',
+        'properties': {
+            'narrator': {'type': 'string'},
+            'confidence': {'type': 'string', 'enum': ['high', 'medium', 'low']},
+            'evidence': {'type': 'string'}
+        },
+        'required': ['narrator']
+    },
+    'segmentation': {
+        'type': 'object',
+        'properties': {
+            'scenes': {'type': 'array', 'items': {
+                'type': 'object',
+                'properties': {
+                    'scene_id': {'type': 'string'},
+                    'description': {'type': 'string'},
+                    'text': {'type': 'string'}
+                },
+                'required': ['text']
+            }}
+        },
+        'required': ['scenes']
+    },
+    'offset_segmentation': {
+        'type': 'object',
+        'properties': {
+            'scenes': {'type': 'array', 'items': {
+                'type': 'object',
+                'properties': {
+                    'scene_id': {'type': 'string'},
+                    'description': {'type': 'string'},
+                    'start_paragraph': {'type': 'integer'}
+                },
+                'required': ['start_paragraph']
+            }}
+        },
+        'required': ['scenes']
+    },
+    'goals': {
+        'type': 'object',
+        'properties': {'goals': _GOALS},
+        'required': ['goals']
+    },
+    'conflicts': {
+        'type': 'object',
+        'properties': {'conflicts': _CONFLICTS},
+        'required': ['conflicts']
+    },
+    'fused': {
+        'type': 'object',
+        'properties': {'goals': _GOALS, 'conflicts': _CONFLICTS},
+        'required': ['goals', 'conflicts']
+    },
+    'goals_batch': {
+        'type': 'object',
+        'properties': {'scenes': {'type': 'array', 'items': {
+            'type': 'object',
+            'properties': {'scene_id': {'type': 'string'}, 'goals': _GOALS},
+            'required': ['scene_id', 'goals']
+        }}},
+        'required': ['scenes']
+    },
+    'conflicts_batch': {
+        'type': 'object',
+        'properties': {'scenes': {'type': 'array', 'items': {
+            'type': 'object',
+            'properties': {'scene_id': {'type': 'string'}, 'conflicts': _CONFLICTS},
+            'required': ['scene_id', 'conflicts']
+        }}},
+        'required': ['scenes']
+    }
+}
+
+REPROMPT_SUFFIX = '''
+
+Your previous reply could not be parsed. Respond with ONLY the JSON object described above: no prose, no code fences, no comments.'''
+
+_CODE_FENCE = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.DOTALL)
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_WORD = re.compile(r'\w+')
+
+def parse_json_object(response_text) -> Optional[dict]:
+    """The response's JSON object if it parses as-is (after locating it), else None"""
+    json_text = extract_json_text(response_text)
+    if not json_text:
+        return None
+    try:
+        data = json.loads(json_text)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+_JSON_TYPES = {'object': dict, 'array': list, 'string': str, 'integer': int, 'number': (int, float),
+               'boolean': bool}
+
+def has_required_fields(data, schema: dict) -> bool:
+    """data is an object with every top-level key schema requires, each of its declared type.
+
+    Catches replies that parse but are not the payload, e.g. a single goal dict
+    instead of {"goals": [...]}.
+    """
+    if not isinstance(data, dict):
+        return False
+    properties = schema.get('properties', {})
+    for key in schema.get('required', []):
+        if key not in data:
+            return False
+        expected = _JSON_TYPES.get(properties.get(key, {}).get('type'))
+        if expected is not None and not isinstance(data[key], expected):
+            return False
+    return True
+
+def _close_json(text: str) -> str:
+    """Fix near-valid JSON in one string-aware pass.
+
+    Converts smart quotes and Python literals, drops trailing commas, and closes
+    whatever strings/arrays/objects a truncated response left open.
+    """
+    out = []
+    stack = []
+    in_string = False
+    smart_quoted = False
+    escaped = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"' or (smart_quoted and char == '”'):
+                in_string = False
+                char = '"'
+            out.append(char)
+            i += 1
+            continue
+
+        if char in '"“”':
+            in_string = True
+            smart_quoted = char != '"'
+            out.append('"')
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            out.append(char)
+        elif char in '}]':
+            # Trailing comma before a closer
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                break
+        elif char.isalpha():
+            word = _WORD.match(text, i).group()
+            out.append(_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    # A dangling key, colon or comma cannot be completed; cut back to the last full value
+    repaired = ''.join(out).rstrip()
+    repaired = re.sub(r'(,\s*"[^"]*"\s*:?\s*|,\s*|:\s*)$', '', repaired)
+    if repaired.endswith(':'):
+        repaired = repaired[:-1]
+    repaired += ''.join(reversed(stack))
+    # An element cut off before its first complete value is noise, not data
+    return re.sub(r',\s*\{\}(?=\s*\])', '', repaired)
+
+def repair_json(response_text) -> Optional[dict]:
+    """Best-effort local repair of a near-valid JSON response; None if it cannot be salvaged"""
+    if not isinstance(response_text, str):
+        return None
+    fenced = _CODE_FENCE.search(response_text)
+    text = fenced.group(1) if fenced else response_text
+    start = text.find('{')
+    if start == -1:
+        return None
+    text = text[start:]
+
+    candidate = _close_json(text)
+    for _ in range(8):
+        try:
+            data = json.loads(candidate)
+            return data if isinstance(data, dict) else None
+        except json.JSONDecodeError as e:
+            # Drop the broken tail after the last complete element and close again
+            cut = max(candidate.rfind(',', 0, e.pos), candidate.rfind('{', 0, e.pos), candidate.rfind('[', 0, e.pos))
+            if cut <= 0:
+                return None
+            candidate = _close_json(candidate[:cut + 1] if candidate[cut] in '{[' else candidate[:cut])
+    return None
+
+class ParseStats:
+    """Per-phase counts of how responses were turned into JSON (thread-safe)"""
+
+    FIELDS = ('responses', 'valid', 'repaired', 'reprompted', 'recovered_by_reprompt', 'failed', 'empty')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+
+    def record(self, phase: str, outcome: str):
+        with self._lock:
+            counts = self.phases.setdefault(phase, dict.fromkeys(self.FIELDS, 0))
+            counts[outcome] += 1
+
+    def get_status(self) -> dict:
+        with self._lock:
+            status = {phase: dict(counts) for phase, counts in self.phases.items()}
+        totals = dict.fromkeys(self.FIELDS, 0)
+        for counts in status.values():
+            for field_name, value in counts.items():
+                totals[field_name] += value
+        status['total'] = totals
+        return status
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from .call_planner import DryRunProvider, prompt_phase
+from .llm_provider import LLMProvider, ResponseCache
+
+class LatencyModel:
+    """Request latency: a base draw from a distribution plus a per-output-token generation time.
+
+    kind is 'fixed', 'uniform' (median +/- spread), 'exponential' (mean = median)
+    or 'lognormal' (median, sigma = spread). from_spec() parses "lognormal:1.2:0.5".
+    """
+
+    KINDS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+    def __init__(self, kind: str = 'lognormal', median: float = 0.5, spread: float = 0.5,
+                 per_output_token: float = 0.0, seed: Optional[int] = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution {kind!r}; use one of {', '.join(self.KINDS)}")
+        self.kind = kind
+        self.median = median
+        self.spread = spread
+        self.per_output_token = per_output_token
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec: str, per_output_token: float = 0.0, seed: Optional[int] = None):
+        parts = spec.split(':')
+        numbers = [float(part) for part in parts[1:]]
+        return cls(parts[0], *numbers[:2], per_output_token=per_output_token, seed=seed)
+
+    def sample(self, output_tokens: int = 0) -> float:
+        with self._lock:
+            if self.kind == 'fixed':
+                base = self.median
+            elif self.kind == 'uniform':
+                base = self._rng.uniform(self.median - self.spread, self.median + self.spread)
+            elif self.kind == 'exponential':
+                base = self._rng.expovariate(1 / self.median) if self.median > 0 else 0.0
+            else:
+                base = self.median * math.exp(self._rng.gauss(0, self.spread))
+        return max(0.0, base) + output_tokens * self.per_output_token
+
+class _NoSlots:
+    """Stands in for a semaphore when concurrency is unbounded"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class SyntheticError(Exception):
+    """An injected failure, shaped like the SDK errors the retry layer classifies"""
+
+    def __init__(self, status_code: int, message: str = 'synthetic failure'):
+        super().__init__(f"{message} (status code: {status_code})")
+        self.status_code = status_code
+
+class SyntheticResponder:
+    """Schema-valid narrator/segmentation/goal/conflict replies for any pipeline prompt.
+
+    Replies are replayed from a ResponseCache recorded against a real model when
+    the same request was recorded (replay_provider/replay_model name the recording),
+    and generated like the dry-run planner's otherwise. failure_rate injects errors
+    with one of failure_statuses.
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, failure_rate: float = 0.0,
+                 failure_statuses=(503, 429, 500), scenes_per_chapter: int = 3, goals_per_scene: int = 3,
+                 conflicts_per_scene: int = 1, replay_cache: Optional[ResponseCache] = None,
+                 replay_provider: str = 'ollama', replay_model: Optional[str] = None, seed: Optional[int] = None):
+        self.latency = latency or LatencyModel('fixed', 0.0, 0.0)
+        self.failure_rate = failure_rate
+        self.failure_statuses = tuple(failure_statuses)
+        self.generator = DryRunProvider('synthetic', 'synthetic', scenes_per_chapter, goals_per_scene,
+                                        conflicts_per_scene)
+        self.replay_cache = replay_cache
+        self.replay_provider = replay_provider
+        self.replay_model = replay_model
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'failures': 0, 'replayed': 0, 'generated': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _replay(self, model: str, prompt: str, params: dict) -> Optional[str]:
+        if self.replay_cache is None:
+            return None
+        key = self.replay_cache.make_key(self.replay_provider, self.replay_model or model, params, prompt)
+        return self.replay_cache.get(key)
+
+    def respond(self, model: str, prompt: str, params: Optional[dict] = None):
+        """(response_text, latency_s); raises SyntheticError for an injected failure.
+
+        params are the generation parameters the request was recorded with (plus
+        'schema' when structured output was requested), as in the response cache key.
+        """
+        self._count('requests')
+        with self._lock:
+            fail = self._rng.random() < self.failure_rate
+            status = self._rng.choice(self.failure_statuses) if fail else None
+        if fail:
+            self._count('failures')
+            raise SyntheticError(status)
+        response_text = self._replay(model, prompt, params or {})
+        if response_text is not None:
+            self._count('replayed')
+        else:
+            self._count('generated')
+            response_text = json.dumps(self.generator._respond(prompt_phase(prompt), prompt), indent=2)
+        return response_text, self.latency.sample(len(response_text) // 4)
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+def _request_params(format=None, **params) -> dict:
+    # Same shape as LLMProvider._cache_lookup: generation params, plus the schema if any
+    return {**params, 'schema': format} if format else params
+
+def _chat_chunks(response_text: str, chunk_chars: int = 16):
+    return [response_text[i:i + chunk_chars] for i in range(0, len(response_text), chunk_chars)] or ['']
+
+def _chat_reply(model: str, prompt: str, response_text: str, latency: float, content: Optional[str] = None,
+                done: bool = True) -> dict:
+    reply = {'model': model, 'message': {'role': 'assistant', 'content': response_text if content is None else content},
+             'done': done}
+    if done:
+        reply.update({'prompt_eval_count': len(prompt) // 4, 'eval_count': len(response_text) // 4,
+                      'total_duration': int(latency * 1e9)})
+    return reply
+
+class SyntheticOllamaClient:
+    """In-process stand-in for ollama.Client(...).chat, backed by a SyntheticResponder"""
+
+    def __init__(self, responder: SyntheticResponder, parallel: Optional[int] = None):
+        self.responder = responder
+        # Like OLLAMA_NUM_PARALLEL: requests beyond this many queue for a slot
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else _NoSlots()
+
+    def chat(self, model, messages, stream=False, **params):
+        prompt = messages[-1]['content']
+        response_text, latency = self.responder.respond(model, prompt, _request_params(**params))
+        if stream:
+            return self._stream(model, prompt, response_text, latency)
+        with self._slots:
+            time.sleep(latency)
+        return _chat_reply(model, prompt, response_text, latency)
+
+    def _stream(self, model, prompt, response_text, latency):
+        # The slot is held until the last chunk, or until the reader closes the stream early
+        chunks = _chat_chunks(response_text)
+        with self._slots:
+            for i, chunk in enumerate(chunks):
+                time.sleep(latency / len(chunks))
+                yield _chat_reply(model, prompt, response_text, latency, chunk, done=i == len(chunks) - 1)
+
+class AsyncSyntheticOllamaClient:
+    """In-process stand-in for ollama.AsyncClient(...).chat"""
+
+    def __init__(self, responder: SyntheticResponder, parallel: Optional[int] = None):
+        self.responder = responder
+        self.parallel = parallel
+        self._slots = asyncio.Semaphore(parallel) if parallel else _NoSlots()  # Bound to the loop that first uses it
+
+    async def chat(self, model, messages, stream=False, **params):
+        prompt = messages[-1]['content']
+        response_text, latency = self.responder.respond(model, prompt, _request_params(**params))
+        if stream:
+            return self._stream(model, prompt, response_text, latency)
+        async with self._slots:
+            await asyncio.sleep(latency)
+        return _chat_reply(model, prompt, response_text, latency)
+
+    async def _stream(self, model, prompt, response_text, latency):
+        chunks = _chat_chunks(response_text)
+        async with self._slots:
+            for i, chunk in enumerate(chunks):
+                await asyncio.sleep(latency / len(chunks))
+                yield _chat_reply(model, prompt, response_text, latency, chunk, done=i == len(chunks) - 1)
+
+    async def close(self):
+        pass
+
+class SyntheticLLMProvider(LLMProvider):
+    """LLMProvider whose Ollama client is answered in-process by a SyntheticResponder.
+
+    Everything above the client (cache, retries, rate limits, streaming, telemetry)
+    is the real code path, so the pipeline's own overhead and concurrency scaling
+    can be measured without a model. parallel caps concurrent "generations".
+    """
+
+    def __init__(self, responder: Optional[SyntheticResponder] = None, model: str = 'synthetic',
+                 parallel: Optional[int] = None, **provider_kwargs):
+        self.responder = responder or SyntheticResponder()
+        self.parallel = parallel
+        super().__init__('ollama', model, {}, **provider_kwargs)
+
+    def _init_client(self):
+        self.client = SyntheticOllamaClient(self.responder, self.parallel)
+
+    def _init_async_client(self):
+        return AsyncSyntheticOllamaClient(self.responder, self.parallel)
+
+    def get_status(self):
+        status = super().get_status()
+        status['synthetic'] = self.responder.get_status()
+        return status
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/api/tags':
+            self._send_json(200, {'models': [{'name': name, 'model': name} for name in self.server.models]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/api/chat':
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': 'invalid JSON body'})
+            return
+        model = request.get('model', 'synthetic')
+        prompt = request.get('messages', [{}])[-1].get('content', '')
+        params = {key: request[key] for key in ('options', 'keep_alive') if request.get(key) is not None}
+        try:
+            response_text, latency = self.server.responder.respond(model, prompt,
+                                                                   _request_params(request.get('format'), **params))
+        except SyntheticError as e:
+            self._send_json(e.status_code, {'error': str(e)}, {'Retry-After': '1'} if e.status_code == 429 else None)
+            return
+
+        if request.get('stream', True) is False:
+            with self.server.slots:
+                time.sleep(latency)
+            self._send_json(200, _chat_reply(model, prompt, response_text, latency))
+            return
+
+        # NDJSON stream, one line per chunk, as Ollama sends it
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunks = _chat_chunks(response_text)
+        try:
+            with self.server.slots:
+                for i, chunk in enumerate(chunks):
+                    time.sleep(latency / len(chunks))
+                    line = json.dumps(_chat_reply(model, prompt, response_text, latency, chunk,
+                                                  done=i == len(chunks) - 1)).encode('utf-8') + b'\n'
+                    self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b"\r\n")
+                    self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. the JSON object closed); generation stops with it
+            self.close_connection = True
+
+class SyntheticOllamaServer(ThreadingHTTPServer):
+    """Ollama-API-compatible HTTP server (/api/tags, /api/chat) backed by a SyntheticResponder.
+
+    Point LLMProvider('ollama', ..., ollama_url=server.url) or the web app at it;
+    serve_in_background() runs it on a daemon thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, responder: Optional[SyntheticResponder] = None, host: str = '127.0.0.1', port: int = 0,
+                 models=('synthetic',), parallel: Optional[int] = None):
+        super().__init__((host, port), _OllamaHandler)
+        self.responder = responder or SyntheticResponder()
+        self.models = list(models)
+        self.slots = threading.BoundedSemaphore(parallel) if parallel else _NoSlots()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name='synthetic-ollama', daemon=True)
+        thread.start()
+        return thread
+
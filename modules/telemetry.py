@@ -0,0 +1,205 @@
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .data_models import write_json_atomic
+
+# Histogram bucket upper bounds (Prometheus "le"); +Inf is implied
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320, 640, 1280)
+
+HISTOGRAMS = {
+    'llm_request_duration_seconds': ('LLM request latency in seconds (cache hits excluded)', LATENCY_BUCKETS),
+    'llm_prompt_tokens': ('Prompt tokens per LLM request', TOKEN_BUCKETS),
+    'llm_completion_tokens': ('Completion tokens per LLM request', TOKEN_BUCKETS),
+    'llm_tokens_per_second': ('Completion tokens per second of request time', TOKENS_PER_SECOND_BUCKETS)
+}
+COUNTERS = {
+    'llm_requests_total': 'LLM requests sent to the provider, by outcome',
+    'llm_errors_total': 'LLM requests that raised, by exception type',
+    'llm_retries_total': 'LLM requests repeated, by reason',
+    'llm_cache_hits_total': 'LLM calls answered from the response cache',
+    'llm_estimated_usage_total': 'LLM requests whose token counts were estimated (provider reported no usage)'
+}
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus exposes it"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(le, cumulative count) pairs including +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound containing the q-quantile (None without observations)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'mean': round(self.sum / self.count, 4) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': {_format_bound(bound): total for bound, total in self.cumulative()}
+        }
+
+def _format_bound(bound) -> str:
+    return '+Inf' if bound == float('inf') else f"{bound:g}"
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+class Telemetry:
+    """Per-call LLM metrics keyed by provider, model and phase (thread-safe).
+
+    record_call() feeds latency, prompt/completion token and tokens-per-second
+    histograms plus request counters; errors, retries and cache hits are
+    counted separately. render_prometheus() gives the text exposition format
+    for a /metrics scrape, snapshot()/dump() a JSON summary for CLI runs.
+    """
+
+    LABELS = ('provider', 'model', 'phase')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.histograms = {name: {} for name in HISTOGRAMS}  # name -> {label values: Histogram}
+        self.counters = {name: {} for name in COUNTERS}  # name -> {label values: count}
+
+    def _observe(self, name, labels, value):
+        series = self.histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(HISTOGRAMS[name][1])
+        histogram.observe(value)
+
+    def _increment(self, name, labels, amount=1):
+        series = self.counters[name]
+        series[labels] = series.get(labels, 0) + amount
+
+    def record_call(self, provider: str, model: str, phase: Optional[str], latency: float,
+                    prompt_tokens: int, completion_tokens: int, status: str = 'ok', estimated: bool = False):
+        """One request that reached the provider; status is ok, empty or error"""
+        labels = (provider, model, phase or 'none')
+        with self._lock:
+            self._increment('llm_requests_total', labels + (status,))
+            if status == 'error':
+                return
+            self._observe('llm_request_duration_seconds', labels, latency)
+            self._observe('llm_prompt_tokens', labels, prompt_tokens)
+            self._observe('llm_completion_tokens', labels, completion_tokens)
+            if latency > 0:
+                self._observe('llm_tokens_per_second', labels, completion_tokens / latency)
+            if estimated:
+                self._increment('llm_estimated_usage_total', labels)
+
+    def record_error(self, provider: str, model: str, phase: Optional[str], error: str):
+        with self._lock:
+            self._increment('llm_errors_total', (provider, model, phase or 'none', error))
+
+    def record_retry(self, provider: str, model: str, phase: Optional[str], reason: str):
+        with self._lock:
+            self._increment('llm_retries_total', (provider, model, phase or 'none', reason))
+
+    def record_cache_hit(self, provider: str, model: str, phase: Optional[str]):
+        with self._lock:
+            self._increment('llm_cache_hits_total', (provider, model, phase or 'none'))
+
+    @staticmethod
+    def _counter_labels(name):
+        if name == 'llm_requests_total':
+            return Telemetry.LABELS + ('status',)
+        if name == 'llm_errors_total':
+            return Telemetry.LABELS + ('error',)
+        if name == 'llm_retries_total':
+            return Telemetry.LABELS + ('reason',)
+        return Telemetry.LABELS
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    label_text = _labels(self.LABELS, labels)
+                    for bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{label_text},le="{_format_bound(bound)}"}} {total}')
+                    lines.append(f"{name}_sum{{{label_text}}} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+            for name, help_text in COUNTERS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, count in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{{{_labels(self._counter_labels(name), labels)}}} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """JSON-friendly summary: one entry per provider/model/phase"""
+        series = {}
+        with self._lock:
+            for name, by_labels in self.histograms.items():
+                for labels, histogram in by_labels.items():
+                    series.setdefault(labels, {})[name] = histogram.to_dict()
+            for name, by_labels in self.counters.items():
+                for labels, count in by_labels.items():
+                    entry = series.setdefault(labels[:3], {}).setdefault(name, {})
+                    key = labels[3] if len(labels) > 3 else 'total'
+                    entry[key] = entry.get(key, 0) + count
+        return {
+            'started_at': self.started_at,
+            'generated_at': time.time(),
+            'series': [dict(zip(self.LABELS, labels), **metrics) for labels, metrics in sorted(series.items())]
+        }
+
+    def dump(self, path):
+        """Write Prometheus text for *.prom/*.txt paths, a JSON snapshot otherwise"""
+        path = Path(path)
+        if path.suffix in ('.prom', '.txt'):
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            tmp_path.write_text(self.render_prometheus(), encoding='utf-8')
+            tmp_path.replace(path)
+        else:
+            write_json_atomic(path, self.snapshot(), indent=2)
+        return path
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.histograms = {name: {} for name in HISTOGRAMS}
+            self.counters = {name: {} for name in COUNTERS}
+
+# Process-wide registry shared by every LLMProvider unless one is given its own
+TELEMETRY = Telemetry()
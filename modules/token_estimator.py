@@ -1,12 +1,126 @@
-import tiktoken
 import requests
 import os
-from typing import Dict, Tuple, Optional
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Tuple, Optional
+
+# Map models to tiktoken encodings
+ENCODING_MAP = {
+    'gpt-4': 'cl100k_base',
+    'gpt-4-turbo': 'cl100k_base',
+    'gpt-3.5-turbo': 'cl100k_base',
+    'gpt-4o': 'cl100k_base',
+    'gpt-4o-mini': 'cl100k_base',
+    'claude-3-opus': 'cl100k_base',
+    'claude-3-sonnet': 'cl100k_base', 
+    'claude-3-haiku': 'cl100k_base',
+    'claude-3.5-sonnet': 'cl100k_base'
+}
+
+# Below this many uncached files, a process pool costs more than it saves
+PARALLEL_MIN_FILES = 8
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str):
+    """tiktoken encoder, loaded once per process; None if tiktoken is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return None
+
+def encoding_for_model(model: str) -> str:
+    return ENCODING_MAP.get(model, 'cl100k_base')
+
+def count_text_tokens(text: str, encoding_name: str) -> int:
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        # Fallback: approximate 4 chars per token
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+def count_file_tokens(file_path: str, encoding_name: str) -> int:
+    """Read and tokenize one file (runs inside pool workers)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return count_text_tokens(f.read(), encoding_name)
+
+def _count_file_tokens_safe(args):
+    file_path, encoding_name = args
+    try:
+        return count_file_tokens(file_path, encoding_name), None
+    except Exception as e:
+        return None, str(e)
+
+def default_token_cache_path() -> str:
+    """$TOKEN_CACHE_PATH, else token_counts.json in the per-user cache directory ($XDG_CACHE_HOME or ~/.cache).
+
+    Entries are keyed by absolute path, so one file serves every corpus, and corpus
+    folders (possibly read-only or shared) are never written to.
+    """
+    if os.getenv('TOKEN_CACHE_PATH'):
+        return os.getenv('TOKEN_CACHE_PATH')
+    cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'story-corpus-analysis', 'token_counts.json')
+
+class TokenCountCache:
+    """Per-file token counts memoized by path, size and mtime (and encoding), persisted as JSON"""
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self.entries = {}
+
+    @staticmethod
+    def _key(file_path: str, encoding_name: str) -> str:
+        return f"{encoding_name}:{os.path.abspath(file_path)}"
+
+    def get(self, file_path: str, encoding_name: str, stat=None) -> Optional[int]:
+        stat = stat or os.stat(file_path)
+        entry = self.entries.get(self._key(file_path, encoding_name))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['tokens']
+        return None
+
+    def put(self, file_path: str, encoding_name: str, tokens: int, stat=None):
+        stat = stat or os.stat(file_path)
+        with self._lock:
+            self.entries[self._key(file_path, encoding_name)] = {
+                'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'tokens': tokens
+            }
+            self._dirty = True
+
+    def save(self):
+        """Persist new counts; a cache that cannot be written only costs re-tokenizing next time"""
+        if not (self.cache_path and self._dirty):
+            return
+        from .data_models import write_json_atomic
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+                write_json_atomic(self.cache_path, self.entries)
+            except OSError as e:
+                print(f"⚠️ Could not save token counts to {self.cache_path}: {e}")
+                return
+            self._dirty = False
 
 class TokenEstimator:
     """Estimates tokens and costs for different LLM providers"""
     
-    def __init__(self):
+    def __init__(self, token_cache_path: Optional[str] = None, max_workers: Optional[int] = None):
+        """token_cache_path persists per-file counts between runs (default: default_token_cache_path());
+        max_workers sizes the tokenizing process pool (default: CPU count)."""
+        self.token_cache_path = token_cache_path or default_token_cache_path()
+        self.max_workers = max_workers
+        self._file_cache = None
         # Current pricing as of August 2025 (per 1M tokens)
         self.pricing = {
             'openai': {
@@ -34,25 +148,61 @@ class TokenEstimator:
     def count_tokens(self, text: str, model: str = "gpt-4") -> int:
         """Count tokens in text using tiktoken"""
         try:
-            # Map models to tiktoken encodings
-            encoding_map = {
-                'gpt-4': 'cl100k_base',
-                'gpt-4-turbo': 'cl100k_base',
-                'gpt-3.5-turbo': 'cl100k_base',
-                'gpt-4o': 'cl100k_base',
-                'gpt-4o-mini': 'cl100k_base',
-                'claude-3-opus': 'cl100k_base',
-                'claude-3-sonnet': 'cl100k_base', 
-                'claude-3-haiku': 'cl100k_base',
-                'claude-3.5-sonnet': 'cl100k_base'
-            }
-            
-            encoding_name = encoding_map.get(model, 'cl100k_base')
-            encoding = tiktoken.get_encoding(encoding_name)
-            return len(encoding.encode(text))
+            return count_text_tokens(text, encoding_for_model(model))
         except Exception:
             # Fallback: approximate 4 chars per token
             return len(text) // 4
+
+    def count_tokens_batch(self, texts: List[str], model: str = "gpt-4") -> List[int]:
+        """Token counts for many texts at once (tiktoken encodes the batch on native threads)"""
+        encoding = get_encoding(encoding_for_model(model))
+        if encoding is None:
+            return [len(text) // 4 for text in texts]
+        return [len(tokens) for tokens in encoding.encode_batch(texts)]
+
+    def file_cache(self) -> TokenCountCache:
+        if self._file_cache is None:
+            self._file_cache = TokenCountCache(self.token_cache_path)
+        return self._file_cache
+
+    def count_files_tokens(self, file_paths: List[str], model: str) -> Dict:
+        """Token count per file path, reusing memoized counts for unchanged files.
+
+        Files not seen before (or changed since) are tokenized across a process pool.
+        Returns {'counts': {path: tokens}, 'errors': {path: message}, 'cached': n}.
+        """
+        encoding_name = encoding_for_model(model)
+        # Approximate counts (no tiktoken) must not be replayed once real ones are available
+        cache_encoding = encoding_name if get_encoding(encoding_name) is not None else f"{encoding_name}~approx"
+        cache = self.file_cache()
+        counts, errors, stats, pending = {}, {}, {}, []
+        for file_path in file_paths:
+            try:
+                stats[file_path] = os.stat(file_path)
+            except OSError as e:
+                errors[file_path] = str(e)
+                continue
+            cached = cache.get(file_path, cache_encoding, stats[file_path])
+            if cached is None:
+                pending.append(file_path)
+            else:
+                counts[file_path] = cached
+
+        jobs = [(file_path, encoding_name) for file_path in pending]
+        if len(pending) >= PARALLEL_MIN_FILES and (self.max_workers or os.cpu_count() or 1) > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(_count_file_tokens_safe, jobs, chunksize=4))
+        else:
+            results = [_count_file_tokens_safe(job) for job in jobs]
+
+        for file_path, (tokens, error) in zip(pending, results):
+            if error is not None:
+                errors[file_path] = error
+                continue
+            counts[file_path] = tokens
+            cache.put(file_path, cache_encoding, tokens, stats[file_path])
+        cache.save()
+        return {'counts': counts, 'errors': errors, 'cached': len(file_paths) - len(pending) - len(errors)}
     
     def estimate_corpus_tokens(self, corpus_path: str, model: str, sample_size: Optional[int] = None) -> Dict:
         """Estimate tokens for entire corpus or sample"""
@@ -74,21 +224,20 @@ class TokenEstimator:
             if sample_size:
                 files = files[:sample_size]
             
-            for filename in files:
-                file_path = os.path.join(corpus_path, filename) if os.path.isdir(corpus_path) else corpus_path
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Add prompt overhead (roughly 500 tokens for instructions)
-                    prompt_overhead = 500
-                    file_tokens = self.count_tokens(content, model) + prompt_overhead
-                    total_input_tokens += file_tokens
-                    processed_files += 1
-                    
-                except Exception as e:
-                    print(f"Error processing {filename}: {e}")
+            file_paths = [os.path.join(corpus_path, filename) if os.path.isdir(corpus_path) else corpus_path
+                          for filename in files]
+            file_counts = self.count_files_tokens(file_paths, model)
+            
+            for filename, file_path in zip(files, file_paths):
+                if file_path in file_counts['errors']:
+                    print(f"Error processing {filename}: {file_counts['errors'][file_path]}")
                     continue
+                
+                # Add prompt overhead (roughly 500 tokens for instructions)
+                prompt_overhead = 500
+                file_tokens = file_counts['counts'][file_path] + prompt_overhead
+                total_input_tokens += file_tokens
+                processed_files += 1
             
             # Calculate total output tokens
             total_output_tokens = processed_files * output_tokens_per_analysis
@@ -100,7 +249,8 @@ class TokenEstimator:
                 'output_tokens': total_output_tokens,
                 'total_tokens': total_input_tokens + total_output_tokens,
                 'is_sample': sample_size is not None,
-                'sample_size': sample_size if sample_size else processed_files
+                'sample_size': sample_size if sample_size else processed_files,
+                'cached_files': file_counts['cached']
             }
             
         except Exception as e:
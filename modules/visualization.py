@@ -2,16 +2,28 @@ import json
 from pathlib import Path
 from dataclasses import asdict
 
-def prepare_visualization_data(results_dict):
-    visualization_data = {
-        "metadata": {
-            "generated_date": "2025-08-11",
-            "total_books": len(results_dict),
-            "total_scenes": sum(r['scene_count'] for r in results_dict.values()),
-            "total_goals": sum(r['goal_count'] for r in results_dict.values()),
-            "total_conflicts": sum(r['conflict_count'] for r in results_dict.values()),
-            "processor": "SimpleStoryProcessor"
-        },
+def _to_dict(item):
+    # Convert dataclass objects to dictionaries
+    if hasattr(item, '__dict__'):
+        return asdict(item)
+    return item
+
+def book_to_visualization(book_id, book_data):
+    """Per-book entry of the visualization "books" list"""
+    return {
+        "book_id": book_id,
+        "book_title": book_data['book_title'],
+        "scene_count": book_data['scene_count'],
+        "goal_count": book_data['goal_count'],
+        "conflict_count": book_data['conflict_count'],
+        "scenes": [_to_dict(scene) for scene in book_data['scenes']],
+        "goals": [_to_dict(goal) for goal in book_data['goals']],
+        "conflicts": [_to_dict(conflict) for conflict in book_data['conflicts']]
+    }
+
+def new_visualization_data(metadata):
+    return {
+        "metadata": metadata,
         "books": [],
         "characters": {},
         "character_books": {},
@@ -19,87 +31,176 @@ def prepare_visualization_data(results_dict):
         "goals": [],  # Flattened goals for static HTML compatibility
         "goal_network": []  # Goal network data
     }
-    
-    all_characters = set()
-    
-    for book_id, book_data in results_dict.items():
-        # Convert dataclass objects to dictionaries
-        scenes_data = []
-        for scene in book_data['scenes']:
-            if hasattr(scene, '__dict__'):
-                scene_dict = asdict(scene)
-            else:
-                scene_dict = scene
-            scenes_data.append(scene_dict)
-            
-        goals_data = []
-        for goal in book_data['goals']:
-            if hasattr(goal, '__dict__'):
-                goal_dict = asdict(goal)
-            else:
-                goal_dict = goal
-            goals_data.append(goal_dict)
-            all_characters.add(goal_dict.get('character', 'Unknown'))
-            
-        conflicts_data = []
-        for conflict in book_data['conflicts']:
-            if hasattr(conflict, '__dict__'):
-                conflict_dict = asdict(conflict)
+
+def build_metadata(total_books, total_scenes, total_goals, total_conflicts):
+    return {
+        "generated_date": "2025-08-11",
+        "total_books": total_books,
+        "total_scenes": total_scenes,
+        "total_goals": total_goals,
+        "total_conflicts": total_conflicts,
+        "processor": "SimpleStoryProcessor"
+    }
+
+def _network_entry(book_id, conflict):
+    return {
+        "conflict_id": conflict.get('conflict_id'),
+        "characters": conflict.get('characters_involved', []),
+        "book_id": book_id,
+        "conflict_type": conflict.get('conflict_type'),
+        "description": conflict.get('description', ''),
+        "evidence": conflict.get('evidence', '')
+    }
+
+class VisualizationAggregator:
+    """Corpus-level visualization indexes, folded in one book at a time.
+
+    Everything prepare_visualization_data derives (totals, character_books,
+    conflict_network, per-character summaries) is kept in hashed indexes, so
+    adding a book costs time proportional to that book, and a re-analyzed book
+    can be removed or replaced without a rebuild. Output is the same as a
+    from-scratch build over the books in their original order.
+    """
+
+    def __init__(self, keep_books: bool = True):
+        # keep_books=False holds only relationship data, for callers that stream the books list
+        self.keep_books = keep_books
+        self.books = {}  # book_id -> per-book contribution, in first-seen order
+        self._positions = {}  # book_id -> order key, kept when a book is replaced
+        self._next_position = 0
+        self.totals = {'books': 0, 'scenes': 0, 'goals': 0, 'conflicts': 0}
+        self._character_goal_books = {}  # character -> {book_id: index of first goal in that book}
+        self._character_conflicts = {}  # character -> conflict_network entries naming them
+
+    def __contains__(self, book_id):
+        return book_id in self.books
+
+    def __len__(self):
+        return len(self.books)
+
+    def add_book(self, book_id, book_data):
+        """Fold in a corpus results entry; an already present book is replaced in place"""
+        self.add_book_viz(book_to_visualization(book_id, book_data))
+
+    def add_book_viz(self, book_viz):
+        book_id = book_viz["book_id"]
+        if book_id in self.books:
+            self.remove_book(book_id, keep_position=True)
+        if book_id not in self._positions:
+            self._positions[book_id] = self._next_position
+            self._next_position += 1
+
+        goal_characters = [goal.get('character', 'Unknown') for goal in book_viz["goals"]]
+        conflict_characters = [char for conflict in book_viz["conflicts"]
+                               for char in conflict.get('characters_involved', [])]
+        network = [_network_entry(book_id, conflict) for conflict in book_viz["conflicts"]
+                   if len(conflict.get('characters_involved', [])) >= 2]
+        first_goal = {}
+        for i, char in enumerate(goal_characters):
+            first_goal.setdefault(char, i)
+
+        self.books[book_id] = {
+            'viz': book_viz if self.keep_books else None,
+            'counts': (book_viz['scene_count'], book_viz['goal_count'], book_viz['conflict_count']),
+            'characters': goal_characters + conflict_characters,
+            'first_goal': first_goal,
+            'network': network
+        }
+        self._apply(book_id, self.books[book_id], 1)
+
+    def remove_book(self, book_id, keep_position: bool = False):
+        contribution = self.books.pop(book_id, None)
+        if contribution is None:
+            return False
+        self._apply(book_id, contribution, -1)
+        if not keep_position:
+            del self._positions[book_id]
+        return True
+
+    def replace_book(self, book_id, book_data):
+        self.add_book(book_id, book_data)
+
+    def _apply(self, book_id, contribution, sign):
+        scenes, goals, conflicts = contribution['counts']
+        self.totals['books'] += sign
+        self.totals['scenes'] += sign * scenes
+        self.totals['goals'] += sign * goals
+        self.totals['conflicts'] += sign * conflicts
+
+        for char, goal_index in contribution['first_goal'].items():
+            books = self._character_goal_books.setdefault(char, {})
+            if sign > 0:
+                books[book_id] = goal_index
             else:
-                conflict_dict = conflict
-            conflicts_data.append(conflict_dict)
-            
-            # Add characters from conflicts
-            for char in conflict_dict.get('characters_involved', []):
-                all_characters.add(char)
-        
-        book_viz = {
-            "book_id": book_id,
-            "book_title": book_data['book_title'],
-            "scene_count": book_data['scene_count'],
-            "goal_count": book_data['goal_count'],
-            "conflict_count": book_data['conflict_count'],
-            "scenes": scenes_data,
-            "goals": goals_data,
-            "conflicts": conflicts_data
+                del books[book_id]
+                if not books:
+                    del self._character_goal_books[char]
+
+        for entry in contribution['network']:
+            # A character listed twice in one conflict still counts that conflict once
+            for char in set(entry["characters"]):
+                count = self._character_conflicts.get(char, 0) + sign
+                if count:
+                    self._character_conflicts[char] = count
+                else:
+                    del self._character_conflicts[char]
+
+    def _book_order(self):
+        return sorted(self.books, key=self._positions.__getitem__)
+
+    def metadata(self):
+        return build_metadata(
+            total_books=self.totals['books'],
+            total_scenes=self.totals['scenes'],
+            total_goals=self.totals['goals'],
+            total_conflicts=self.totals['conflicts']
+        )
+
+    def character_books(self):
+        # Characters in order of their first goal, books in corpus order
+        first_seen = {
+            char: min((self._positions[book_id], goal_index) for book_id, goal_index in books.items())
+            for char, books in self._character_goal_books.items()
+        }
+        return {
+            char: sorted(self._character_goal_books[char], key=self._positions.__getitem__)
+            for char in sorted(first_seen, key=first_seen.__getitem__)
+        }
+
+    def relationship_sections(self):
+        """The corpus-level members of the visualization data (everything except metadata and books)"""
+        character_books = self.character_books()
+        book_order = self._book_order()
+        characters = {}
+        # In order of first mention in corpus order, as a from-scratch build lists them
+        for char in (char for book_id in book_order for char in self.books[book_id]['characters']):
+            if char != 'Unknown' and char not in characters:
+                char_books = character_books.get(char, [])
+                characters[char] = {
+                    "books": char_books,
+                    "book_count": len(char_books),
+                    "conflict_count": self._character_conflicts.get(char, 0)
+                }
+        return {
+            "characters": characters,
+            "character_books": character_books,
+            "conflict_network": [entry for book_id in book_order for entry in self.books[book_id]['network']],
+            "goals": [],  # Flattened goals for static HTML compatibility
+            "goal_network": []  # Goal network data
         }
-        visualization_data["books"].append(book_viz)
-        
-        # Build character-book relationships
-        book_characters = set()
-        for goal in goals_data:
-            char = goal.get('character', 'Unknown')
-            book_characters.add(char)
-            if char not in visualization_data["character_books"]:
-                visualization_data["character_books"][char] = []
-            if book_id not in visualization_data["character_books"][char]:
-                visualization_data["character_books"][char].append(book_id)
-        
-        # Build conflict network
-        for conflict in conflicts_data:
-            chars = conflict.get('characters_involved', [])
-            if len(chars) >= 2:
-                visualization_data["conflict_network"].append({
-                    "conflict_id": conflict.get('conflict_id'),
-                    "characters": chars,
-                    "book_id": book_id,
-                    "conflict_type": conflict.get('conflict_type'),
-                    "description": conflict.get('description', ''),
-                    "evidence": conflict.get('evidence', '')
-                })
-    
-    # Character summary
-    for char in all_characters:
-        if char != 'Unknown':
-            char_books = visualization_data["character_books"].get(char, [])
-            char_conflicts = [c for c in visualization_data["conflict_network"] if char in c["characters"]]
-            visualization_data["characters"][char] = {
-                "books": char_books,
-                "book_count": len(char_books),
-                "conflict_count": len(char_conflicts)
-            }
-    
-    return visualization_data
+
+    def to_visualization_data(self):
+        visualization_data = new_visualization_data(self.metadata())
+        if self.keep_books:
+            visualization_data["books"] = [self.books[book_id]['viz'] for book_id in self._book_order()]
+        visualization_data.update(self.relationship_sections())
+        return visualization_data
+
+def prepare_visualization_data(results_dict):
+    aggregator = VisualizationAggregator()
+    for book_id, book_data in results_dict.items():
+        aggregator.add_book(book_id, book_data)
+    return aggregator.to_visualization_data()
 
 def export_for_html_visualization(visualization_data, filename="scene_analysis_visualization.json"):
     output_file = Path(filename)
@@ -0,0 +1,155 @@
+import re
+from typing import Callable, List, Optional, Tuple
+
+# Context window per provider/model in tokens (substring match on the model name)
+CONTEXT_LIMITS = {
+    'anthropic': {
+        'claude': 200000,
+        'default': 200000
+    },
+    'openai': {
+        'gpt-4o': 128000,
+        'gpt-4-turbo': 128000,
+        'gpt-3.5-turbo': 16385,
+        'gpt-4': 128000,
+        'default': 128000
+    },
+    'ollama': {
+        'gpt-oss': 32768,
+        'llama3': 8192,
+        'llama2': 4096,
+        'mistral': 32768,
+        'default': 8192
+    }
+}
+
+# Share of max_output a reply may spend repeating input text; the rest is JSON structure
+ECHO_OUTPUT_SHARE = 0.8
+
+_SENTENCE_END = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["”\']))\s+')
+
+def get_optimal_context_size(provider: str, model: str, max_context: Optional[int] = None) -> dict:
+    """Context budget for a model: 80% usable for the prompt, up to 4000 tokens kept for output"""
+    if max_context is None:
+        provider_limits = CONTEXT_LIMITS.get(provider, {})
+        max_context = provider_limits.get('default', 8192)
+        model_name = (model or '').lower()
+        for name, limit in provider_limits.items():
+            if name != 'default' and name in model_name:
+                max_context = limit
+                break
+
+    # Reserve 20% for output and system overhead
+    usable_context = int(max_context * 0.8)
+    max_output = min(4000, int(max_context * 0.2))
+
+    return {
+        'max_context': max_context,
+        'usable_context': usable_context,
+        'max_output': max_output
+    }
+
+def paragraph_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of each paragraph in text"""
+    # Blank lines separate paragraphs when present; otherwise every line is one
+    separator = r'\n\s*\n' if re.search(r'\n\s*\n', text.strip()) else r'\n'
+    spans = []
+    start = 0
+    for match in re.finditer(separator, text):
+        if text[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+def sentence_spans(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """Sentence offsets within text[start:end]"""
+    spans = []
+    position = start
+    for match in _SENTENCE_END.finditer(text, start, end):
+        spans.append((position, match.start()))
+        position = match.end()
+    if position < end:
+        spans.append((position, end))
+    return spans
+
+def text_units(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[Tuple[int, int]]:
+    """Paragraph spans, with any paragraph over max_tokens split into sentences"""
+    units = []
+    for start, end in paragraph_spans(text):
+        if count_tokens(text[start:end]) > max_tokens:
+            units.extend(sentence_spans(text, start, end))
+        else:
+            units.append((start, end))
+    return units
+
+def pack_windows(text: str, units: List[Tuple[int, int]], max_tokens: int, overlap_tokens: int,
+                 count_tokens: Callable[[str], int]) -> List[Tuple[int, int]]:
+    """Group consecutive units into (first, last) index ranges of at most max_tokens.
+
+    Each window after the first repeats trailing units of the previous one, up to
+    overlap_tokens, so content at a boundary is seen whole by at least one window.
+    A single unit larger than max_tokens gets a window of its own.
+    """
+    unit_tokens = [count_tokens(text[start:end]) for start, end in units]
+    windows = []
+    first = 0
+    while first < len(units):
+        last, total = first, unit_tokens[first]
+        while last + 1 < len(units) and total + unit_tokens[last + 1] <= max_tokens:
+            last += 1
+            total += unit_tokens[last]
+        windows.append((first, last))
+        if last + 1 >= len(units):
+            break
+
+        # Step back over the overlap, but always make progress
+        next_first, carried = last + 1, 0
+        while next_first - 1 > first and carried + unit_tokens[next_first - 1] <= overlap_tokens:
+            next_first -= 1
+            carried += unit_tokens[next_first]
+        first = next_first
+    return windows
+
+class TextWindower:
+    """Splits text into token-sized, overlapping windows sized to the model's context length"""
+
+    def __init__(self, provider: str, model: str, count_tokens: Callable[[str], int],
+                 overlap_tokens: int = 200, max_context: Optional[int] = None,
+                 max_window_tokens: Optional[int] = None):
+        self.context = get_optimal_context_size(provider, model, max_context)
+        self.count_tokens = count_tokens
+        self.overlap_tokens = overlap_tokens
+        self.window_tokens = self.context['usable_context'] - self.context['max_output']
+        if max_window_tokens:
+            self.window_tokens = min(self.window_tokens, max_window_tokens)
+
+    def budget(self, prompt_overhead_tokens: int) -> int:
+        """Tokens of text a window may hold next to prompt_overhead_tokens of instructions"""
+        return max(self.overlap_tokens * 2, self.window_tokens - prompt_overhead_tokens)
+
+    def echo_budget(self) -> int:
+        """Tokens of text a response can repeat back verbatim within max_output, leaving room for the JSON
+        around it (keys, descriptions, escaping)"""
+        return max(self.overlap_tokens * 2, int(self.context['max_output'] * ECHO_OUTPUT_SHARE))
+
+    def windows(self, text: str, prompt_overhead_tokens: int = 0, max_tokens: Optional[int] = None) -> List[str]:
+        """Text windows; a text that fits comes back unchanged as the only window.
+
+        max_tokens further caps each window, e.g. at echo_budget() when the reply repeats the text.
+        """
+        budget = self.budget(prompt_overhead_tokens)
+        if max_tokens:
+            budget = min(budget, max_tokens)
+        if self.count_tokens(text) <= budget:
+            return [text]
+        units = text_units(text, budget, self.count_tokens)
+        return [text[units[first][0]:units[last][1]]
+                for first, last in pack_windows(text, units, budget, self.overlap_tokens, self.count_tokens)]
+
+    def paragraph_windows(self, text: str, spans: List[Tuple[int, int]],
+                          prompt_overhead_tokens: int = 0) -> List[Tuple[int, int]]:
+        """(first, last) paragraph index ranges, for callers that address paragraphs by number"""
+        return pack_windows(text, spans, self.budget(prompt_overhead_tokens), self.overlap_tokens,
+                            self.count_tokens)
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Optional
+from .data_models import write_json_atomic
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class LeaseWorkQueue:
+    """File-based work queue in which workers claim books through expiring leases.
+
+    Any number of local processes, or machines sharing `queue_dir` (e.g. over
+    NFS/SMB), can pull from the same queue:
+
+        run.json                 the run the results belong to (provider, model, settings)
+        leases/<book_id>.lease   claimed, owner + expiry (created with O_EXCL)
+        leases/<book_id>.lock    held for a moment while a lease is checked and changed
+        done/<book_id>.json      finished, serialized analysis result
+        failed/<book_id>.json    failure count and last error
+
+    A lease that is not renewed before it expires is reclaimed by the next
+    worker that asks for work. A worker whose lease was lost keeps no result:
+    complete() only writes while the caller still holds the lease. Reclaiming,
+    renewing, releasing and failing a lease happen under the book's lock file, so
+    a live lease is only ever rewritten in place (os.replace) by its owner.
+
+    Finished results are reused by every later worker, so a queue belongs to one
+    run: the first worker records `run_info` in run.json, and opening the queue
+    with a different run_info raises ValueError instead of mixing results.
+    """
+
+    LOCK_STALE_SECONDS = 30
+
+    def __init__(self, queue_dir, lease_seconds: float = 900, max_attempts: int = 3,
+                 run_info: Optional[dict] = None):
+        self.queue_dir = Path(queue_dir)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.leases_dir = self.queue_dir / 'leases'
+        self.done_dir = self.queue_dir / 'done'
+        self.failed_dir = self.queue_dir / 'failed'
+        self.manifest_path = self.queue_dir / 'run.json'
+        for directory in (self.leases_dir, self.done_dir, self.failed_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        if run_info is not None:
+            self._check_run(run_info)
+
+    def _check_run(self, run_info: dict):
+        # Round-trip so tuples and the like compare equal to what was read back from JSON
+        run_info = json.loads(json.dumps(run_info, sort_keys=True))
+        recorded = self._read_json(self.manifest_path)
+        if recorded is None:
+            if any(self.done_dir.iterdir()):
+                raise ValueError(f"Work queue {self.queue_dir} holds results of an unrecorded run; "
+                                 f"use another queue directory")
+            write_json_atomic(self.manifest_path, run_info)
+        elif recorded != run_info:
+            raise ValueError(f"Work queue {self.queue_dir} belongs to another run ({recorded}, not {run_info}); "
+                             f"use another queue directory")
+
+    @property
+    def run_info(self) -> Optional[dict]:
+        return self._read_json(self.manifest_path)
+
+    def _lease_path(self, book_id: str) -> Path:
+        return self.leases_dir / f"{book_id}.lease"
+
+    def _lock_path(self, book_id: str) -> Path:
+        return self.leases_dir / f"{book_id}.lock"
+
+    @contextmanager
+    def _locked(self, book_id: str, worker_id: str):
+        """Hold book_id's lock file; a lock left behind by a crashed worker is broken after LOCK_STALE_SECONDS"""
+        lock_path = self._lock_path(book_id)
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                pass
+            try:
+                if time.time() - lock_path.stat().st_mtime > self.LOCK_STALE_SECONDS:
+                    # Rename first so only one waiting worker breaks it
+                    broken_path = lock_path.with_name(f"{lock_path.name}.{worker_id}.stale")
+                    os.rename(lock_path, broken_path)
+                    os.remove(broken_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+
+    def _holds(self, book_id: str, worker_id: str) -> bool:
+        lease = self._read_json(self._lease_path(book_id))
+        return bool(lease) and lease.get('worker_id') == worker_id
+
+    def _read_json(self, path: Path) -> Optional[dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def is_done(self, book_id: str) -> bool:
+        return (self.done_dir / f"{book_id}.json").exists()
+
+    def failure_count(self, book_id: str) -> int:
+        failure = self._read_json(self.failed_dir / f"{book_id}.json")
+        return failure.get('attempts', 0) if failure else 0
+
+    def claim(self, book_ids: Iterable[str], worker_id: str) -> Optional[str]:
+        """Claim the first available book, reclaiming expired leases; None when nothing is left"""
+        for book_id in book_ids:
+            if self.is_done(book_id) or self.failure_count(book_id) >= self.max_attempts:
+                continue
+            if self._try_acquire(book_id, worker_id):
+                return book_id
+        return None
+
+    def _try_acquire(self, book_id: str, worker_id: str) -> bool:
+        lease_path = self._lease_path(book_id)
+        lease = {'book_id': book_id, 'worker_id': worker_id, 'expires_at': time.time() + self.lease_seconds}
+        try:
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            with self._locked(book_id, worker_id):
+                if not self._reclaim_if_expired(lease_path):
+                    return False
+                try:
+                    fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(lease, f)
+        # Another worker may have finished it between our done-check and the lease
+        if self.is_done(book_id):
+            self.release(book_id, worker_id)
+            return False
+        return True
+
+    def _reclaim_if_expired(self, lease_path: Path) -> bool:
+        # Called with the book locked, so the owner cannot renew in between
+        lease = self._read_json(lease_path)
+        if lease is None:
+            # Half-written or vanished lease; only reclaim if it has been stale for a full lease period
+            try:
+                if time.time() - lease_path.stat().st_mtime < self.lease_seconds:
+                    return False
+            except FileNotFoundError:
+                return True
+        elif lease.get('expires_at', 0) > time.time():
+            return False
+
+        try:
+            os.remove(lease_path)
+        except FileNotFoundError:
+            return True
+        previous = lease or {}
+        print(f"   ♻️ Reclaimed expired lease on {lease_path.stem} from {previous.get('worker_id', 'unknown worker')}")
+        return True
+
+    def renew(self, book_id: str, worker_id: str) -> bool:
+        """Extend our lease; returns False if the lease was lost to another worker"""
+        with self._locked(book_id, worker_id):
+            lease = self._read_json(self._lease_path(book_id))
+            if not lease or lease.get('worker_id') != worker_id:
+                return False
+            lease['expires_at'] = time.time() + self.lease_seconds
+            write_json_atomic(self._lease_path(book_id), lease)
+            return True
+
+    def release(self, book_id: str, worker_id: str):
+        with self._locked(book_id, worker_id):
+            self._remove_if_held(book_id, worker_id)
+
+    def _remove_if_held(self, book_id: str, worker_id: str) -> bool:
+        if not self._holds(book_id, worker_id):
+            return False
+        try:
+            os.remove(self._lease_path(book_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, book_id: str, worker_id: str, result: dict) -> bool:
+        """Store the result if we still hold the lease; False (and nothing written) otherwise"""
+        with self._locked(book_id, worker_id):
+            if not self._holds(book_id, worker_id):
+                return False
+            write_json_atomic(self.done_dir / f"{book_id}.json", result)
+            self._remove_if_held(book_id, worker_id)
+        return True
+
+    def fail(self, book_id: str, worker_id: str, error: str) -> bool:
+        """Count a failed attempt if we still hold the lease; False (and nothing recorded) otherwise"""
+        with self._locked(book_id, worker_id):
+            if not self._holds(book_id, worker_id):
+                return False
+            failure_path = self.failed_dir / f"{book_id}.json"
+            failure = self._read_json(failure_path) or {'attempts': 0}
+            failure.update({
+                'attempts': failure.get('attempts', 0) + 1,
+                'last_error': error,
+                'worker_id': worker_id,
+                'failed_at': time.time()
+            })
+            write_json_atomic(failure_path, failure)
+            self._remove_if_held(book_id, worker_id)
+        return True
+
+    def load_result(self, book_id: str) -> Optional[dict]:
+        return self._read_json(self.done_dir / f"{book_id}.json")
+
+    def heartbeat(self, book_id: str, worker_id: str):
+        """Context manager that keeps renewing the lease while a book is being processed"""
+        return _LeaseHeartbeat(self, book_id, worker_id)
+
+    def get_status(self, book_ids: Iterable[str]) -> dict:
+        status = {'done': 0, 'leased': 0, 'failed': 0, 'pending': 0}
+        now = time.time()
+        for book_id in book_ids:
+            if self.is_done(book_id):
+                status['done'] += 1
+            elif self.failure_count(book_id) >= self.max_attempts:
+                status['failed'] += 1
+            else:
+                lease = self._read_json(self._lease_path(book_id))
+                if lease and lease.get('expires_at', 0) > now:
+                    status['leased'] += 1
+                else:
+                    status['pending'] += 1
+        return status
+
+class _LeaseHeartbeat:
+    def __init__(self, queue: LeaseWorkQueue, book_id: str, worker_id: str):
+        self.queue = queue
+        self.book_id = book_id
+        self.worker_id = worker_id
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        interval = max(0.1, self.queue.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            if not self.queue.renew(self.book_id, self.worker_id):
+                self.lost = True
+                print(f"   ⚠️ Lease on {self.book_id} was lost to another worker")
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
@@ -3,26 +3,113 @@
 Run full corpus analysis with incremental visualization updates.
 This script processes all books in the corpus and updates the visualization
 JSON file after each book is completed.
+
+Sharded runs:
+    --workers N     split the corpus across N local worker processes
+    --worker        join an existing shared work queue (e.g. from another machine)
+    --merge         merge finished shard results into the visualization file
+
+Every phase of every book is checkpointed; --resume skips completed phases
+after a crash or Ctrl-C. --dry-run renders every prompt without calling the
+model and prints per-phase call counts, tokens, cost and projected time.
+--metrics-file writes per-call LLM latency/token telemetry after every book
+(Prometheus text for .prom/.txt, JSON otherwise).
+
+Call handling (streaming, adaptive concurrency, retries, hedging) is on by
+default and only changes speed and resilience; turn each off with --no-<mode>.
+Analysis modes that change prompts, and so the results, stay opt-in until they
+are validated against the original pipeline: --narrator-heuristics,
+--offset-segmentation, --token-windows, --structured-output. --legacy runs the
+original pipeline: one request at a time, no streaming, no retries.
 """
 
 import os
 import sys
+import argparse
 from pathlib import Path
 
 # Add the project root to the path
 sys.path.append(str(Path(__file__).parent))
 
-from modules.story_processor import SimpleStoryProcessor
-from modules.corpus_manager import process_entire_corpus
-from modules.llm_provider import LLMProvider
+from modules.corpus_manager import (process_entire_corpus, process_corpus_sharded, run_shard_worker,
+                                    merge_shard_results, build_processor)
+from modules.checkpoint import default_checkpoint_dir
+from modules.call_planner import PLANNED_SETTINGS, CallPlanner, print_plan
+from modules.telemetry import TELEMETRY
+
+# Modes that change what the model is asked, with their --help text
+OUTPUT_MODES = {
+    'narrator_heuristics': "Resolve chapter narrators locally; only ambiguous chapters go to the LLM",
+    'offset_segmentation': "Have the model return scene-start paragraph numbers instead of scene text",
+    'token_windows': "Send whole chapters and scenes in context-sized windows instead of the 6000/4000-char cut",
+    'structured_output': "Constrain replies with Ollama `format` JSON schemas"
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Baby-Sitters Club full corpus analysis")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of local worker processes sharing a lease-based work queue")
+    parser.add_argument('--worker', action='store_true',
+                        help="Join an existing shared work queue as a single worker")
+    parser.add_argument('--merge', action='store_true',
+                        help="Only merge finished shard results into the visualization file")
+    parser.add_argument('--queue-dir', default=None,
+                        help="Shared work queue directory (default: <corpus>/.work_queue_<model>)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Reuse per-book, per-phase checkpoints from a previous run")
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help="Checkpoint directory (default: checkpoints/<corpus>_<model>)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Plan the run (calls, tokens, cost, time) without calling the model")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Write LLM call telemetry here after every book (.prom/.txt: Prometheus text, else JSON)")
+    parser.add_argument('-y', '--yes', action='store_true', help="Skip the confirmation prompt")
+
+    calls = parser.add_argument_group('call handling (on by default; results are unchanged)')
+    calls.add_argument('--stream', action=argparse.BooleanOptionalAction, default=True,
+                       help="Stop generation as soon as the JSON answer closes")
+    calls.add_argument('--adaptive-concurrency', action=argparse.BooleanOptionalAction, default=True,
+                       help="Let the number of requests in flight follow server latency")
+    calls.add_argument('--retries', action=argparse.BooleanOptionalAction, default=True,
+                       help="Retry overloads and dropped connections with backoff (5 attempts, 600 s timeout)")
+    calls.add_argument('--hedging', action=argparse.BooleanOptionalAction, default=True,
+                       help="With several Ollama hosts, duplicate the slowest 5%% of calls onto a second host")
+    modes = parser.add_argument_group('analysis modes (off by default; they change prompts and results)')
+    for mode in OUTPUT_MODES:
+        modes.add_argument(f"--{mode.replace('_', '-')}", action='store_true', help=OUTPUT_MODES[mode])
+    parser.add_argument('--legacy', action='store_true',
+                        help="Original pipeline: one request at a time, every optional mode off")
+
+    args = parser.parse_args()
+    if args.legacy:
+        enabled = [mode for mode in OUTPUT_MODES if getattr(args, mode)]
+        if enabled:
+            parser.error(f"--legacy cannot be combined with --{enabled[0].replace('_', '-')}")
+        args.stream = args.adaptive_concurrency = args.retries = args.hedging = False
+    return args
+
+def dump_metrics(path):
+    if not path:
+        return
+    try:
+        TELEMETRY.dump(path)
+    except OSError as e:
+        print(f"⚠️ Could not write metrics to {path}: {e}")
+
+def watch_metrics(processor, path):
+    """Rewrite the metrics file each time the processor finishes a book"""
+    if path:
+        processor.events.subscribe(lambda event: event['type'] == 'book_finished' and dump_metrics(path))
 
 def main():
+    args = parse_args()
     print("🕹️ Baby-Sitters Club Full Corpus Analysis")
     print("=" * 60)
     
     # Configuration
     data_dir = "corpus_clean/clean corpus no paratext"
-    llm_base_url = "http://172.21.144.1:11434"
+    # Several GPU boxes can share the run: OLLAMA_URLS="http://a:11434,http://b:11434"
+    llm_base_url = os.getenv('OLLAMA_URLS', "http://172.21.144.1:11434")
     model_name = "gpt-oss:latest"
     
     # Verify data directory exists
@@ -38,35 +125,99 @@ def main():
     print(f"📚 Found {total_files} books to analyze")
     print(f"🤖 Using model: {model_name}")
     print(f"🌐 LLM server: {llm_base_url}")
-    print(f"📊 Visualization will update after each book")
+    print(f"📊 Running totals update after each book; visualization refreshes every 25 books")
+    
+    if args.merge:
+        merge_shard_results(data_dir, args.queue_dir, model=model_name)
+        return
+    
+    processor_config = {
+        'provider': 'ollama',
+        'model': model_name,
+        'ollama_url': llm_base_url,
+        'cache_path': os.getenv('LLM_CACHE_PATH', 'llm_response_cache.sqlite3'),
+        'stream': args.stream,
+        # Fan scene-level calls out over the provider's worker slots (OLLAMA_MAX_WORKERS etc.)
+        'max_workers': 1 if args.legacy else None,
+        'adaptive_concurrency': args.adaptive_concurrency,
+        'max_attempts': 5 if args.retries else None,
+        'request_timeout': 600 if args.retries else None,
+        'hedge_percentile': 0.95 if args.hedging else None,
+        **{mode: getattr(args, mode) for mode in OUTPUT_MODES}
+    }
+    enabled_modes = [mode for mode in OUTPUT_MODES if processor_config[mode]]
+    print(f"🧪 Analysis modes: {', '.join(enabled_modes) if enabled_modes else 'none (original prompts)'}")
+    
+    if args.dry_run:
+        planner_kwargs = {key: value for key, value in processor_config.items() if key in PLANNED_SETTINGS}
+        print_plan(CallPlanner(processor_config['provider'], model_name, **planner_kwargs).plan_corpus(data_dir))
+        return
+    
+    checkpoint_dir = args.checkpoint_dir or default_checkpoint_dir(data_dir, model_name)
+    
+    if args.worker:
+        processor = build_processor(**processor_config)
+        watch_metrics(processor, args.metrics_file)
+        try:
+            run_shard_worker(data_dir, processor, args.queue_dir, checkpoint_dir=checkpoint_dir,
+                             resume=args.resume)
+        except ValueError as e:
+            print(f"❌ {e}")
+        finally:
+            dump_metrics(args.metrics_file)
+        return
     
     # Ask for confirmation
-    response = input(f"\n⚡ Process all {total_files} books with incremental updates? (y/N): ")
-    if response.lower() != 'y':
-        print("❌ Analysis cancelled")
+    if not args.yes:
+        response = input(f"\n⚡ Process all {total_files} books with incremental updates? (y/N): ")
+        if response.lower() != 'y':
+            print("❌ Analysis cancelled")
+            return
+    
+    if args.workers > 1:
+        if args.metrics_file:
+            # Each worker process has its own registry
+            print(f"⚠️ --metrics-file is ignored with --workers; start each worker with --worker --metrics-file")
+        try:
+            results = process_corpus_sharded(data_dir, processor_config, args.workers, args.queue_dir,
+                                             checkpoint_dir=checkpoint_dir, resume=args.resume)
+            print(f"\n✨ Sharded analysis merged: {len(results)} books")
+        except ValueError as e:
+            print(f"❌ {e}")
+        except KeyboardInterrupt:
+            print(f"\n⚠️ Analysis interrupted by user")
+            print(f"📊 Finished books stay in the work queue; rerun to continue or use --merge")
         return
     
     # Initialize components
     try:
-        llm_provider = LLMProvider(
-            provider='ollama',
-            model=model_name,
-            api_keys={},
-            ollama_url=llm_base_url
-        )
-        processor = SimpleStoryProcessor(llm_provider)
+        processor = build_processor(**processor_config)
+        llm_provider = processor.llm_provider
+        watch_metrics(processor, args.metrics_file)
         
         print(f"\n🚀 Starting analysis...")
-        print(f"💡 You can monitor progress by checking the visualization file")
+        print(f"💡 You can monitor progress in the .meta.json file next to the visualization file")
         print(f"📂 File: '{Path(data_dir).name}_gpt-oss:latest_visualization.json'")
         print(f"🌐 Or refresh the dashboard at http://172.21.148.127:5002/dashboard")
         
-        # Process the entire corpus with incremental updates
-        results = process_entire_corpus(data_dir, processor)
+        # Process the entire corpus with incremental updates and per-phase checkpoints
+        results = process_entire_corpus(data_dir, processor, checkpoint_dir=checkpoint_dir, resume=args.resume,
+                                        keep_results=False, compact_every=25)
         
         if results:
             print(f"\n✨ SUCCESS! Analysis complete!")
             print(f"📊 Processed {len(results)} books successfully")
+            cache_stats = llm_provider.cache.stats()
+            print(f"💾 Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                  f"({cache_stats['entries']} entries)")
+            parse_totals = processor.parse_stats.get_status()['total']
+            print(f"🧩 JSON replies: {parse_totals['valid']} valid, {parse_totals['repaired']} repaired locally, "
+                  f"{parse_totals['recovered_by_reprompt']}/{parse_totals['reprompted']} recovered by re-prompt, "
+                  f"{parse_totals['failed']} unusable")
+            if llm_provider.stream:
+                stream_stats = llm_provider.get_stream_stats()
+                print(f"⏱️ Streaming: {stream_stats['early_stops']}/{stream_stats['calls']} calls stopped at the "
+                      f"closing brace, time to first token p50 {stream_stats.get('ttft_p50', 0)}s")
             print(f"📈 Check the dashboard for updated visualizations")
         else:
             print(f"\n❌ No results generated")
@@ -74,10 +225,13 @@ def main():
     except KeyboardInterrupt:
         print(f"\n⚠️ Analysis interrupted by user")
         print(f"📊 Partial results may be available in the visualization file")
+        print(f"⏩ Completed phases are checkpointed in {checkpoint_dir}; rerun with --resume to continue")
     except Exception as e:
         print(f"\n❌ Error during analysis: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        dump_metrics(args.metrics_file)
 
 if __name__ == "__main__":
     main()
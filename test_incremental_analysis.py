@@ -12,7 +12,7 @@ sys.path.append(str(Path(__file__).parent))
 
 from modules.story_processor import SimpleStoryProcessor
 from modules.corpus_manager import process_entire_corpus
-from modules.llm_provider import LLMProvider
+from modules.llm_provider import LLMProvider, ResponseCache
 
 def main():
     print("🧪 Testing Incremental Corpus Analysis")
@@ -39,7 +39,8 @@ def main():
             provider='ollama',
             model=model_name,
             api_keys={},
-            ollama_url=llm_base_url
+            ollama_url=llm_base_url,
+            cache=ResponseCache()
         )
         processor = SimpleStoryProcessor(llm_provider)
         
@@ -51,6 +52,9 @@ def main():
         if results:
             print(f"\n✨ Test complete!")
             print(f"📊 Processed {len(results)} books successfully")
+            cache_stats = llm_provider.cache.stats()
+            print(f"💾 Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                  f"({cache_stats['entries']} entries)")
             print(f"📈 Check the visualization file for updates")
         else:
             print(f"\n❌ No results generated")
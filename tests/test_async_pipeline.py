@@ -0,0 +1,146 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from modules.checkpoint import CheckpointStore
+from modules.story_processor import SimpleStoryProcessor
+
+STORY = "\n\n".join(
+    f"Chapter {n}\n\n" + "\n\n".join(f"Kristy and Stacey argued about dues, part {n}.{p}." for p in range(1, 4))
+    for n in range(1, 4))
+
+class ScriptedProvider:
+    """Deterministic replies for every phase, sync and async; counts requests per phase marker"""
+
+    def __init__(self):
+        self.provider = 'ollama'
+        self.model = 'scripted'
+        self.prompts = []
+
+    def call_llm(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        head = prompt[:200]
+        if 'narrator' in head:
+            return json.dumps({'narrator': 'Kristy', 'confidence': 'high', 'evidence': 'I said'})
+        if 'scene breaks' in head:
+            text = prompt.split('\nText:\n', 1)[-1].rsplit('\n\nReturn JSON', 1)[0]
+            paragraphs = text.split('\n\n')
+            return json.dumps({'scenes': [{'scene_id': f'scene_{i + 1}', 'description': 'dues', 'text': paragraph}
+                                          for i, paragraph in enumerate(paragraphs)]})
+        scene_ids = re.findall(r'^=== Scene: (.+?) ===$', prompt, re.MULTILINE)
+        if 'in each of these' in head:
+            key = 'goals' if 'goals' in head else 'conflicts'
+            return json.dumps({'scenes': [{'scene_id': scene_id, key: self._items(key, scene_id)}
+                                          for scene_id in scene_ids]})
+        key = 'goals' if 'goals' in head else 'conflicts'
+        return json.dumps({key: self._items(key, 'single')})
+
+    def _items(self, key, tag):
+        if key == 'goals':
+            return [{'character': 'Kristy', 'goal': f'collect dues ({tag})', 'motivation': 'club',
+                     'goal_type': 'social', 'evidence': 'dues', 'confidence': 0.9}]
+        return [{'type': 'goal_opposition', 'description': f'dues ({tag})', 'characters_involved': ['Stacey', 'Kristy'],
+                 'evidence': 'argued', 'explanation': 'money', 'intensity': 'low'}]
+
+    async def acall_llm(self, prompt, **kwargs):
+        await asyncio.sleep(0)
+        return self.call_llm(prompt, **kwargs)
+
+def summary(result):
+    return ([(scene.scene_id, scene.text) for scene in result['scenes']],
+            [(goal.goal_id, goal.scene_id, goal.goal_text) for goal in result['goals']],
+            [(conflict.conflict_id, conflict.scene_id, conflict.description) for conflict in result['conflicts']])
+
+def test_async_checkpoints_resume_like_the_sync_pipeline(tmp_path):
+    llm = ScriptedProvider()
+    first = asyncio.run(SimpleStoryProcessor(llm).aanalyze_story(
+        STORY, 'book', checkpoint=CheckpointStore(tmp_path)))
+    assert llm.prompts
+    store = CheckpointStore(tmp_path)
+    assert store.get_status()['conflicts_analyzed'] == 1
+
+    llm.prompts.clear()
+    resumed = asyncio.run(SimpleStoryProcessor(llm).aanalyze_story(STORY, 'book', checkpoint=store))
+    assert llm.prompts == []
+    assert summary(resumed) == summary(first)
+    # A sync run over the same checkpoints reuses them too
+    assert summary(SimpleStoryProcessor(llm).analyze_story(STORY, 'book', checkpoint=CheckpointStore(tmp_path))) \
+        == summary(first)
+    assert llm.prompts == []
+
+def test_async_checkpoints_are_discarded_for_edited_text(tmp_path):
+    llm = ScriptedProvider()
+    asyncio.run(SimpleStoryProcessor(llm).aanalyze_story(STORY, 'book', checkpoint=CheckpointStore(tmp_path)))
+    llm.prompts.clear()
+    asyncio.run(SimpleStoryProcessor(llm).aanalyze_story(STORY + " Dawn laughed.", 'book',
+                                                         checkpoint=CheckpointStore(tmp_path)))
+    assert llm.prompts
+
+def test_async_batches_match_the_sync_pipeline():
+    pytest.importorskip('requests')
+    llm = ScriptedProvider()
+    sync = SimpleStoryProcessor(llm, batch_scenes=True).analyze_story(STORY, 'book')
+    sync_prompts = sorted(llm.prompts)
+    llm.prompts.clear()
+    result = asyncio.run(SimpleStoryProcessor(llm, batch_scenes=True).aanalyze_story(STORY, 'book'))
+    assert summary(result) == summary(sync)
+    assert sorted(llm.prompts) == sync_prompts
+    assert any('in each of these' in prompt[:200] for prompt in llm.prompts)
+
+def test_async_matches_the_sync_pipeline():
+    llm = ScriptedProvider()
+    for settings in ({}, {'fused_analysis': True}):
+        sync = SimpleStoryProcessor(llm, **settings).analyze_story(STORY, 'book')
+        sync_prompts = sorted(llm.prompts)
+        llm.prompts.clear()
+        result = asyncio.run(SimpleStoryProcessor(llm, **settings).aanalyze_story(STORY, 'book'))
+        assert summary(result) == summary(sync)
+        assert sorted(llm.prompts) == sync_prompts
+        llm.prompts.clear()
+
+class InFlightProvider(ScriptedProvider):
+    """Async replies that take a moment and record the peak number in flight"""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.peak = 0
+
+    async def acall_llm(self, prompt, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.005)
+            return self.call_llm(prompt, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+def test_requests_in_flight_are_bounded():
+    llm = InFlightProvider()
+    asyncio.run(SimpleStoryProcessor(llm, max_in_flight=2).aanalyze_story(STORY, 'book'))
+    assert llm.peak == 2
+
+def test_shared_semaphore_bounds_several_books():
+    llm = InFlightProvider()
+    processor = SimpleStoryProcessor(llm, max_in_flight=64)
+
+    async def run_books():
+        semaphore = asyncio.Semaphore(3)
+        return await asyncio.gather(*[processor.aanalyze_story(STORY, f"book{i}", semaphore) for i in range(3)])
+
+    results = asyncio.run(run_books())
+    assert [len(result['scenes']) for result in results] == [9, 9, 9]
+    assert llm.peak == 3
+
+def test_events_cover_every_scene():
+    llm = ScriptedProvider()
+    processor = SimpleStoryProcessor(llm)
+    events = []
+    processor.events.subscribe(events.append)
+    asyncio.run(processor.aanalyze_story(STORY, 'book'))
+    finished = [event for event in events if event['type'] == 'scene_finished']
+    assert sorted((event['phase'], event['index']) for event in finished) == \
+        sorted((phase, i) for phase in ('goals', 'conflicts') for i in range(1, 10))
+    assert [event['type'] for event in events][-1] == 'book_finished'
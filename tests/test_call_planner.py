@@ -0,0 +1,59 @@
+from collections import Counter
+
+import pytest
+
+pytest.importorskip('requests')
+
+from modules.call_planner import CallPlanner, DryRunProvider, prompt_phase
+from modules.story_processor import SimpleStoryProcessor
+
+def chapter(num):
+    return f"Chapter {num}\n\n" + "\n\n".join(f"Kristy talked to Claudia about the club, part {num}.{p}."
+                                                  for p in range(1, 7))
+
+def write_corpus(folder, books=2, chapters=2):
+    folder.mkdir()
+    for b in range(books):
+        (folder / f"book{b}.txt").write_text("\n\n".join(chapter(n) for n in range(1, chapters + 1)),
+                                             encoding='utf-8')
+    return folder
+
+def phase_calls(plan):
+    return {phase: totals['calls'] for phase, totals in plan['phases'].items()}
+
+def test_counts_follow_the_assumptions(tmp_path):
+    plan = CallPlanner('ollama', 'llama3', scenes_per_chapter=3, goals_per_scene=2).plan_corpus(
+        write_corpus(tmp_path / 'corpus'))
+    assert (plan['books'], plan['chapters'], plan['scenes']) == (2, 4, 12)
+    assert phase_calls(plan) == {'narrator': 4, 'segmentation': 4, 'goals': 12, 'conflicts': 12}
+    assert plan['total_calls'] == 32
+    assert plan['input_tokens'] == sum(totals['input_tokens'] for totals in plan['phases'].values()) > 0
+    assert [book['calls'] for book in plan['per_book']] == [16, 16]
+
+def test_fused_and_batched_modes_change_the_plan(tmp_path):
+    corpus = write_corpus(tmp_path / 'corpus')
+    fused = CallPlanner('ollama', 'llama3', fused_analysis=True).plan_corpus(corpus)
+    assert phase_calls(fused) == {'narrator': 4, 'segmentation': 4, 'fused': 12}
+    batched = CallPlanner('ollama', 'llama3', batch_scenes=True).plan_corpus(corpus)
+    # Three short scenes per chapter fit one batch each
+    assert phase_calls(batched) == {'narrator': 4, 'segmentation': 4, 'goals_batch': 4, 'conflicts_batch': 4}
+
+def test_plan_matches_a_dry_run_of_the_processor(tmp_path):
+    corpus = write_corpus(tmp_path / 'corpus', books=1, chapters=3)
+    plan = CallPlanner('ollama', 'llama3').plan_corpus(corpus)
+    provider = DryRunProvider('ollama', 'llama3')
+    SimpleStoryProcessor(provider).analyze_story((corpus / 'book0.txt').read_text(encoding='utf-8').strip(), 'book0')
+    assert plan['total_calls'] == len(provider.calls)
+    assert phase_calls(plan) == Counter(phase for phase, _, _ in provider.calls)
+
+def test_time_projection_divides_by_workers(tmp_path):
+    corpus = write_corpus(tmp_path / 'corpus')
+    serial = CallPlanner('ollama', 'llama3', max_workers=1).plan_corpus(corpus)['time']
+    parallel = CallPlanner('ollama', 'llama3', max_workers=4).plan_corpus(corpus)['time']
+    assert parallel['serial_seconds'] == serial['serial_seconds']
+    assert parallel['wall_clock_seconds'] == pytest.approx(serial['wall_clock_seconds'] / 4, abs=0.1)
+
+def test_prompt_phase_recognizes_every_prompt():
+    processor = SimpleStoryProcessor(DryRunProvider('ollama', 'llama3'))
+    assert prompt_phase(processor._build_narrator_prompt("I ran home.")) == 'narrator'
+    assert prompt_phase("Write a poem") == 'other'
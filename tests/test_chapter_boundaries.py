@@ -0,0 +1,111 @@
+import random
+import re
+
+import pytest
+
+from modules.chapter_boundaries import chapter_spans, find_chapter_markers, mapped_text
+from modules.story_processor import SimpleStoryProcessor
+
+def legacy_segment_chapters(story_text, story_id="story"):
+    """segment_chapters as it was before chapter_boundaries (see benchmarks/bench_chapters.py)"""
+    chapter_patterns = [
+        r'Chapter \d+',
+        r'CHAPTER \d+',
+        r'Chapter [IVX]+',
+        r'CHAPTER [IVX]+',
+        r'\n\d+\n',
+        r'\n[IVX]+\n'
+    ]
+    chapters = []
+    current_pos = 0
+    for pattern in chapter_patterns:
+        matches = list(re.finditer(pattern, story_text, re.IGNORECASE))
+        if matches:
+            for i, match in enumerate(matches):
+                if i > 0:
+                    chapter_text = story_text[matches[i-1].end():match.start()].strip()
+                    if len(chapter_text) > 100:
+                        chapters.append({'chapter_id': f"{story_id}_chapter_{i}", 'chapter_num': i,
+                                         'text': chapter_text})
+                current_pos = match.end()
+            final_text = story_text[current_pos:].strip()
+            if len(final_text) > 100:
+                chapters.append({'chapter_id': f"{story_id}_chapter_{len(matches)+1}",
+                                 'chapter_num': len(matches) + 1, 'text': final_text})
+            break
+    if not chapters:
+        chapters = [{'chapter_id': f"{story_id}_chapter_1", 'chapter_num': 1, 'text': story_text}]
+    return chapters
+
+SENTENCE = "Kristy called the meeting to order while Claudia passed around the licorice. "
+
+# Pieces random books are assembled from: headings of every style, in several cases and
+# spacings, markers inside sentences, and bodies either side of MIN_CHAPTER_LENGTH
+FRAGMENTS = [
+    lambda rng: f"Chapter {rng.randint(1, 30)}", lambda rng: f"CHAPTER {rng.randint(1, 30)}",
+    lambda rng: f"chapter {rng.choice(['IV', 'xii', 'V', 'ix'])}", lambda rng: f"Chapter {rng.choice(['I', 'X'])}",
+    lambda rng: f"\n{rng.randint(1, 30)}\n", lambda rng: f"\n{rng.choice(['I', 'iv', 'XV', 'vi'])}\n",
+    lambda rng: f"\n{rng.randint(1, 9)}\n{rng.randint(1, 9)}\n", lambda rng: "\n\n",
+    lambda rng: " \t ", lambda rng: "See chapter 4 for details. ", lambda rng: "Chapterhouse ",
+    lambda rng: "Chapter Victory ", lambda rng: SENTENCE, lambda rng: SENTENCE * rng.randint(1, 4),
+    lambda rng: "Short. ", lambda rng: "Café — notes. "
+]
+
+def random_book(rng, fragments=FRAGMENTS):
+    # Half the books have no "Chapter" fragments, so the bare number and numeral styles get split on too
+    if rng.random() < 0.5:
+        fragments = [fragment for fragment in fragments if 'hapter' not in fragment(rng)]
+    return ''.join(rng.choice(fragments)(rng) for _ in range(rng.randint(0, 40)))
+
+class NoLLM:
+    provider = 'ollama'
+    model = 'none'
+
+    def call_llm(self, prompt, **kwargs):
+        raise AssertionError("chapter splitting sends no requests")
+
+def new_segment_chapters(text, story_id="story"):
+    return [{'chapter_id': chapter['chapter_id'], 'chapter_num': chapter['chapter_num'], 'text': chapter['text']}
+            for chapter in SimpleStoryProcessor(NoLLM()).segment_chapters(text, story_id)]
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_the_legacy_splitter_on_random_books(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        text = random_book(rng)
+        assert new_segment_chapters(text, 'book') == legacy_segment_chapters(text, 'book'), text
+
+def test_matches_the_legacy_splitter_on_typical_books():
+    body = "\n\n".join([SENTENCE * 3] * 4)
+    books = [
+        "\n\n".join(f"Chapter {n}\n\n{body}" for n in range(1, 16)),
+        "Title page\n\nCHAPTER I\n\n" + "\n\nCHAPTER II\n\n".join([body] * 2),
+        "\n".join(f"\n{n}\n{body}" for n in range(1, 8)),
+        "\n".join(f"\n{numeral}\n{body}" for numeral in ('I', 'II', 'III', 'IV')),
+        # A mention of a chapter heading wins over bare number lines
+        f"\n1\n{body}\n2\n{body} as chapter 3 says",
+        body,
+        "",
+    ]
+    for text in books:
+        assert new_segment_chapters(text, 'book') == legacy_segment_chapters(text, 'book')
+
+def test_spans_index_the_text():
+    text = "Front matter\nChapter 1\n\n" + SENTENCE * 2 + "\nChapter 2\n" + SENTENCE * 3 + "  \n"
+    spans = chapter_spans(text)
+    # As before, the chapter after the last of n markers is numbered n + 1
+    assert [(span.chapter_num, span.marker) for span in spans] == [(1, 'chapter_number'), (3, 'chapter_number')]
+    assert [text[span.start:span.end] for span in spans] == [(SENTENCE * 2).strip(), (SENTENCE * 3).strip()]
+    assert find_chapter_markers("no markers here") == (None, [])
+    assert [(span.start, span.end, span.marker) for span in chapter_spans("too short")] == [(0, 9, None)]
+
+def test_mapped_file_gives_the_same_chapters(tmp_path):
+    rng = random.Random(0)
+    for i in range(50):
+        text = random_book(rng, FRAGMENTS[:-1])  # ASCII only
+        path = tmp_path / f"book{i}.txt"
+        path.write_bytes(text.encode('utf-8'))
+        with mapped_text(path) as view:
+            mapped = [(span.chapter_num, span.marker, view[span.start:span.end].decode('utf-8'))
+                      for span in chapter_spans(view)]
+        assert mapped == [(span.chapter_num, span.marker, text[span.start:span.end]) for span in chapter_spans(text)]
@@ -0,0 +1,110 @@
+import json
+import re
+
+from modules.checkpoint import PHASES, CheckpointStore
+from modules.story_processor import SimpleStoryProcessor
+
+class ScriptedProvider:
+    """One scene per chapter, one goal and one conflict per scene; counts requests"""
+
+    def __init__(self):
+        self.provider = 'ollama'
+        self.model = 'scripted'
+        self.calls = 0
+
+    def call_llm(self, prompt, **kwargs):
+        self.calls += 1
+        head = prompt[:200]
+        if 'narrator' in head:
+            return json.dumps({'narrator': 'Kristy', 'confidence': 'high', 'evidence': 'I said'})
+        if 'scene breaks' in head:
+            numbered = re.findall(r'^\[(\d+)\] ', prompt, re.MULTILINE)
+            if numbered:
+                return json.dumps({'scenes': [{'scene_id': 'scene_1', 'start_paragraph': int(numbered[0])}]})
+            text = prompt.split('\nText:\n', 1)[-1].rsplit('\n\nReturn JSON', 1)[0]
+            return json.dumps({'scenes': [{'scene_id': 'scene_1', 'description': 'meeting', 'text': text}]})
+        if 'goals' in head:
+            return json.dumps({'goals': [{'character': 'Kristy', 'goal': 'run the meeting', 'motivation': 'club',
+                                          'goal_type': 'social', 'evidence': 'order', 'confidence': 0.9}]})
+        return json.dumps({'conflicts': [{'type': 'goal_opposition', 'description': 'budget',
+                                          'characters_involved': ['Stacey', 'Kristy'], 'evidence': 'argued',
+                                          'explanation': 'money', 'intensity': 'low'}]})
+
+STORY = "Chapter 1\n\nKristy called the meeting to order. Claudia passed the snacks.\n\n" \
+        "Chapter 2\n\nStacey argued with Kristy about the budget. Dawn stayed calm."
+
+def analyze(tmp_path, text=STORY, resume=True, **kwargs):
+    llm = ScriptedProvider()
+    processor = SimpleStoryProcessor(llm, **kwargs)
+    store = CheckpointStore(tmp_path / 'checkpoints', resume=resume)
+    result = processor.analyze_story(text, 'book', checkpoint=store)
+    return result, llm.calls, store
+
+def test_resume_reuses_every_phase(tmp_path):
+    first, calls, store = analyze(tmp_path)
+    assert calls > 0
+    assert store.is_book_complete('book')
+    assert store.get_status()['conflicts_analyzed'] == 1
+    second, calls, _ = analyze(tmp_path)
+    assert calls == 0
+    assert [scene.text for scene in second['scenes']] == [scene.text for scene in first['scenes']]
+    assert len(second['goals']) == len(first['goals']) > 0
+
+def test_resume_false_recomputes(tmp_path):
+    analyze(tmp_path)
+    _, calls, _ = analyze(tmp_path, resume=False)
+    assert calls > 0
+
+def test_edited_text_discards_checkpoints(tmp_path, capsys):
+    analyze(tmp_path)
+    _, calls, store = analyze(tmp_path, text=STORY + " Mary Anne cried.")
+    assert calls > 0
+    assert 'Discarding' in capsys.readouterr().out
+    manifest = json.loads((tmp_path / 'checkpoints' / 'book' / 'book.json').read_text())
+    assert manifest['run_info']['model'] == 'scripted'
+    assert store.is_book_complete('book')
+
+def test_changed_settings_discard_checkpoints(tmp_path):
+    analyze(tmp_path)
+    _, calls, _ = analyze(tmp_path, offset_segmentation=True)
+    assert calls > 0
+    _, calls, _ = analyze(tmp_path, offset_segmentation=True)
+    assert calls == 0
+
+def test_mismatch_removes_stale_phases_and_progress(tmp_path):
+    analyze(tmp_path)
+    store = CheckpointStore(tmp_path / 'checkpoints')
+    assert not store.has_phase('book', 'segmentation')  # not begun for this text yet
+    store.begin_book('book', 'different text', {'model': 'scripted'})
+    assert not any((tmp_path / 'checkpoints' / 'book' / f"{phase}.json").exists() for phase in PHASES)
+    assert store.get_status()['segmented'] == 0
+    reopened = CheckpointStore(tmp_path / 'checkpoints')
+    assert reopened.get_status()['conflicts_analyzed'] == 0
+
+class CrashingProvider(ScriptedProvider):
+    """Raises once the conflicts phase starts, like a Ctrl-C in the middle of a book"""
+
+    def call_llm(self, prompt, **kwargs):
+        if 'conflicts' in prompt[:200]:
+            raise KeyboardInterrupt
+        return super().call_llm(prompt, **kwargs)
+
+def test_interrupted_run_resumes_at_the_unfinished_phase(tmp_path):
+    store = CheckpointStore(tmp_path / 'checkpoints')
+    try:
+        SimpleStoryProcessor(CrashingProvider()).analyze_story(STORY, 'book', checkpoint=store)
+    except KeyboardInterrupt:
+        pass
+    assert [store.has_phase('book', phase) for phase in PHASES] == [True, True, True, False]
+
+    llm = ScriptedProvider()
+    result = SimpleStoryProcessor(llm).analyze_story(STORY, 'book', checkpoint=CheckpointStore(tmp_path / 'checkpoints'))
+    assert llm.calls == len(result['scenes'])  # one conflicts request per scene, nothing else
+    assert result['conflicts']
+
+def test_unreadable_phase_is_recomputed(tmp_path):
+    analyze(tmp_path)
+    (tmp_path / 'checkpoints' / 'book' / 'goals.json').write_text('[{"goal_id": ', encoding='utf-8')
+    result, calls, _ = analyze(tmp_path)
+    assert calls == len(result['scenes'])  # goals again; conflicts still checkpointed
+    assert result['goals']
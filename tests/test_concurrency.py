@@ -0,0 +1,83 @@
+import threading
+import time
+
+from modules.concurrency import AdaptiveLimiter, map_ordered
+from modules.llm_provider import LLMProvider, ResponseCache
+from modules.rate_limit import RetryPolicy
+from modules.story_processor import SimpleStoryProcessor
+from modules.telemetry import Telemetry
+
+class FixedBackoff(RetryPolicy):
+    def delay(self, attempt, retry_after=None):
+        return self.base_delay
+
+class SlowProvider(LLMProvider):
+    """LLMProvider whose requests sleep instead of reaching a server; the first `failures` raise"""
+
+    def __init__(self, cache_path, delay=0.01, failures=0):
+        super().__init__('ollama', 'slow', {}, cache=ResponseCache(str(cache_path)), telemetry=Telemetry(),
+                         retry_policy=FixedBackoff(max_attempts=3, base_delay=0.2))
+        self.client = object()
+        self.delay = delay
+        self.failures = failures
+        self.requests = 0
+
+    def _request(self, prompt, schema=None, client=None):
+        self.requests += 1
+        time.sleep(self.delay)
+        if self.requests <= self.failures:
+            raise TimeoutError('read timed out')
+        return '{"goals": []}'
+
+def processor_for(provider):
+    return SimpleStoryProcessor(provider, max_workers=4, adaptive_concurrency=True)
+
+def test_release_without_latency_frees_the_slot_only():
+    limiter = AdaptiveLimiter(4, initial_limit=2)
+    limiter.acquire()
+    limiter.release(None)
+    status = limiter.get_status()
+    assert status['in_flight'] == 0
+    assert status['successes'] == 0 and status['avg_latency'] is None
+
+def test_cache_hits_do_not_feed_latency(tmp_path):
+    provider = SlowProvider(tmp_path / 'cache.sqlite3')
+    processor = processor_for(provider)
+    processor._call_provider('prompt', phase='goals')
+    baseline = processor.limiter.get_status()['baseline_latency']
+    for _ in range(20):
+        processor._call_provider('prompt', phase='goals')
+    status = processor.limiter.get_status()
+    assert provider.requests == 1
+    assert status['successes'] == 1
+    assert status['baseline_latency'] == baseline
+
+def test_retry_backoff_is_not_counted_as_latency(tmp_path):
+    provider = SlowProvider(tmp_path / 'cache.sqlite3', failures=1)
+    processor = processor_for(provider)
+    assert processor._call_provider('prompt', phase='goals') == '{"goals": []}'
+    status = processor.limiter.get_status()
+    assert provider.requests == 2
+    # The sample is the successful request (~10ms), not the 200ms backoff before it
+    assert status['avg_latency'] < 0.15
+
+def test_nested_map_ordered_runs_inside_the_outer_task():
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def request(_):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+
+    results = map_ordered(lambda outer: map_ordered(lambda inner: request(inner) or (outer, inner), range(4), 4),
+                          range(4), 4)
+    assert results == [[(outer, inner) for inner in range(4)] for outer in range(4)]
+    assert peak[0] <= 4
+    # Outside any pool, map_ordered still fans out
+    peak[0] = 0
+    map_ordered(request, range(4), 4)
+    assert peak[0] > 1
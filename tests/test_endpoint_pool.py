@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from modules.endpoint_pool import OllamaEndpointPool, is_endpoint_failure, shared_endpoint_pool
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+def healthy_probe(url, timeout):
+    return {'success': True}
+
+def failing_send(error):
+    def send(endpoint):
+        raise error
+    return send
+
+def test_only_connection_errors_timeouts_and_5xx_are_endpoint_failures():
+    assert is_endpoint_failure(ConnectionError('refused'))
+    assert is_endpoint_failure(TimeoutError('read timed out'))
+    assert is_endpoint_failure(StatusError(503))
+    assert is_endpoint_failure(StatusError(500))
+    for status in (400, 404, 429):
+        assert not is_endpoint_failure(StatusError(status))
+    assert not is_endpoint_failure(ValueError('bad json'))
+
+def test_client_errors_do_not_evict():
+    pool = OllamaEndpointPool(['http://a', 'http://b'], failure_threshold=2, probe=healthy_probe)
+    for _ in range(4):
+        with pytest.raises(StatusError):
+            pool.call(failing_send(StatusError(404)))
+    assert pool.get_status()['healthy'] == 2
+    assert all(endpoint.failures == 0 for endpoint in pool.endpoints)
+
+def test_server_errors_evict_after_the_threshold():
+    pool = OllamaEndpointPool(['http://a'], failure_threshold=2, readmit_after=60, probe=healthy_probe)
+    for _ in range(2):
+        with pytest.raises(StatusError):
+            pool.call(failing_send(StatusError(503)))
+    assert pool.endpoints[0].evicted
+    # A 4xx answer in between resets the streak like a success would
+    pool = OllamaEndpointPool(['http://a'], failure_threshold=2, readmit_after=60, probe=healthy_probe)
+    for error in (ConnectionError('refused'), StatusError(400), TimeoutError('slow')):
+        with pytest.raises(type(error)):
+            pool.call(failing_send(error))
+    assert not pool.endpoints[0].evicted
+
+def test_shared_pool_refuses_conflicting_settings():
+    urls = 'http://shared-a, http://shared-b'
+    pool = shared_endpoint_pool(urls, hedge_percentile=0.95)
+    assert shared_endpoint_pool('http://shared-a,http://shared-b/', hedge_percentile=0.95) is pool
+    with pytest.raises(ValueError):
+        shared_endpoint_pool(urls, hedge_percentile=0.5)
+    with pytest.raises(ValueError):
+        shared_endpoint_pool(urls)
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def warmed_pool(**kwargs):
+    """Two endpoints with enough fast samples that hedge_delay() is set"""
+    pool = OllamaEndpointPool(['http://a', 'http://b'], hedge_percentile=0.9, hedge_min_samples=5,
+                              probe=healthy_probe, **kwargs)
+    for _ in range(5):
+        pool.call(lambda endpoint: endpoint.url)
+    assert pool.hedge_delay() is not None
+    return pool
+
+def test_requests_go_to_the_least_busy_endpoint():
+    pool = OllamaEndpointPool(['http://a', 'http://b', 'http://c'], probe=healthy_probe)
+    held = [pool.acquire(), pool.acquire()]
+    assert {endpoint.url for endpoint in held} == {'http://a', 'http://b'}
+    assert pool.acquire().url == 'http://c'
+    pool.release(held[0], 0.1, ok=True)
+    assert pool.acquire() is held[0]
+    # Idle endpoints take turns
+    pool = OllamaEndpointPool(['http://a', 'http://b'], probe=healthy_probe)
+    assert [pool.call(lambda endpoint: endpoint.url) for _ in range(4)] == ['http://a', 'http://b'] * 2
+
+def test_evicted_endpoint_is_readmitted_after_a_successful_probe():
+    probes = []
+    def probe(url, timeout):
+        probes.append(url)
+        return {'success': len(probes) > 1}
+
+    pool = OllamaEndpointPool(['http://a', 'http://b'], failure_threshold=1, readmit_after=0, probe=probe)
+    with pytest.raises(ConnectionError):
+        pool.call(failing_send(ConnectionError('refused')))
+    evicted = next(endpoint for endpoint in pool.endpoints if endpoint.evicted)
+    # Traffic avoids it; each acquire past readmit_after starts one background probe
+    assert pool.call(lambda endpoint: endpoint.url) != evicted.url
+    wait_for(lambda: probes and not evicted.probing)
+    assert evicted.evicted
+    pool.call(lambda endpoint: endpoint.url)
+    wait_for(lambda: not evicted.evicted)
+    assert probes == [evicted.url, evicted.url]
+    assert evicted.consecutive_failures == 0
+    assert pool.get_status()['healthy'] == 2
+
+def test_slow_call_is_hedged_onto_the_other_endpoint():
+    pool = warmed_pool()
+    release_primary = threading.Event()
+    calls = []
+    def send(endpoint):
+        calls.append(endpoint.url)
+        if len(calls) == 1:
+            release_primary.wait(2)
+            return 'primary'
+        return 'backup'
+
+    try:
+        assert pool.call(send) == 'backup'
+    finally:
+        release_primary.set()
+    assert len(set(calls)) == 2
+    assert (pool.hedges, pool.hedge_wins) == (1, 1)
+    wait_for(lambda: all(endpoint.outstanding == 0 for endpoint in pool.endpoints))
+
+def test_async_hedge_cancels_the_slow_call():
+    pool = warmed_pool()
+    cancelled = []
+    async def send(endpoint):
+        if not cancelled:
+            cancelled.append(False)
+            try:
+                await asyncio.sleep(2)
+            except asyncio.CancelledError:
+                cancelled[0] = True
+                raise
+            return 'primary'
+        return 'backup'
+
+    assert asyncio.run(pool.acall(send)) == 'backup'
+    assert cancelled == [True]
+    assert (pool.hedges, pool.hedge_wins) == (1, 1)
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+def test_no_hedging_without_enough_samples():
+    pool = OllamaEndpointPool(['http://a', 'http://b'], hedge_percentile=0.9, hedge_min_samples=50,
+                              probe=healthy_probe)
+    for _ in range(10):
+        pool.call(lambda endpoint: endpoint.url)
+    assert pool.hedge_delay() is None
+    assert pool.call(lambda endpoint: time.sleep(0.05) or endpoint.url)
+    assert pool.hedges == 0
@@ -0,0 +1,82 @@
+import json
+
+from modules.events import EVENT_TYPES, EventBus
+from modules.story_processor import SimpleStoryProcessor
+
+def test_every_subscriber_gets_each_event_in_order():
+    bus = EventBus()
+    first, second = [], []
+    bus.subscribe(first.append)
+    bus.subscribe(second.append)
+    bus.emit('book_started', book_id='a')
+    bus.emit('book_finished', book_id='a', scenes=3)
+    assert [event['type'] for event in first] == ['book_started', 'book_finished']
+    assert first == second
+    assert first[1]['scenes'] == 3 and 'time' in first[1]
+
+def test_unsubscribed_and_inactive_buses_emit_nothing():
+    bus = EventBus()
+    assert not bus.active
+    events = []
+    callback = bus.subscribe(events.append)
+    assert bus.active
+    bus.unsubscribe(callback)
+    bus.emit('book_started', book_id='a')
+    assert events == [] and not bus.active
+
+def test_failing_subscriber_does_not_stop_the_others(capsys):
+    bus = EventBus()
+    events = []
+
+    def broken(event):
+        raise RuntimeError('boom')
+
+    bus.subscribe(broken)
+    bus.subscribe(events.append)
+    bus.emit('error', message='x')
+    assert len(events) == 1
+    assert 'Event subscriber failed on error' in capsys.readouterr().out
+
+def test_slow_queue_drops_its_oldest_events():
+    bus = EventBus()
+    events = bus.subscribe_queue(maxsize=3)
+    for i in range(5):
+        bus.emit('llm_call', index=i)
+    assert events.dropped == 2
+    assert [events.get(timeout=0)['index'] for _ in range(3)] == [2, 3, 4]
+    assert events.get(timeout=0) is None
+    events.close()
+    assert not bus.active
+
+class StoryProvider:
+    provider = 'ollama'
+    model = 'events'
+
+    def call_llm(self, prompt, **kwargs):
+        head = prompt[:200]
+        if 'narrator' in head:
+            return json.dumps({'narrator': 'Kristy'})
+        if 'scene breaks' in head:
+            text = prompt.split('\nText:\n', 1)[-1].rsplit('\n\nReturn JSON', 1)[0]
+            return json.dumps({'scenes': [{'scene_id': 'scene_1', 'text': text}]})
+        if 'goals' in head:
+            return json.dumps({'goals': [{'character': 'Kristy', 'goal': 'win', 'evidence': 'q'}]})
+        return json.dumps({'conflicts': []})
+
+def test_processor_events_describe_the_whole_book():
+    processor = SimpleStoryProcessor(StoryProvider())
+    events = []
+    processor.events.subscribe(events.append)
+    story = "\n\n".join(f"Chapter {n}\n\n" + "\n\n".join(f"Kristy ran all the way to club meeting number {n}.{p}." for p in range(3))
+                        for n in (1, 2))
+    processor.analyze_story(story, 'bk')
+    types = [event['type'] for event in events]
+    assert set(types) <= set(EVENT_TYPES)
+    assert types[0] == 'book_started' and types[-1] == 'book_finished'
+    assert types.count('chapter_finished') == 2
+    assert [event['phase'] for event in events if event['type'] == 'phase_started'] == \
+        ['segmentation', 'goals', 'conflicts']
+    calls = [event for event in events if event['type'] == 'llm_call']
+    assert len(calls) == 2 + 2 + 2 + 2  # narrators, segmentation, goals, conflicts
+    assert all(event['ok'] and event['latency_s'] >= 0 for event in calls)
+    assert events[-1]['goals'] == 2
@@ -0,0 +1,58 @@
+import json
+
+from modules.data_models import Scene
+from modules.story_processor import SimpleStoryProcessor
+
+GOALS = [{'character': 'Kristy', 'goal': 'Start the club', 'evidence': 'We need a club', 'category': 'social'},
+         {'character': 'Stacey', 'goal': 'Keep her secret', 'evidence': 'Nobody can know', 'category': 'personal'}]
+CONFLICTS = [{'type': 'goal_opposition', 'description': 'Kristy pries', 'characters_involved': ['Kristy', 'Stacey'],
+              'evidence': 'Tell me!', 'severity': 'high'}]
+
+class PhaseProvider:
+    """Replies per phase with fixed goals and conflicts; records prompts"""
+
+    def __init__(self, fused_reply=None):
+        self.provider = 'ollama'
+        self.model = 'phase'
+        self.prompts = []
+        self.fused_reply = fused_reply
+
+    def call_llm(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        head = prompt[:200]
+        if 'goals and conflicts' in head:
+            return self.fused_reply or json.dumps({'goals': GOALS, 'conflicts': CONFLICTS})
+        if 'goals' in head:
+            return json.dumps({'goals': GOALS})
+        return json.dumps({'conflicts': CONFLICTS})
+
+def scene(i=1):
+    return Scene(f"bk_ch1_s{i}", 'bk', 1, i, "Kristy said we need a club. Stacey said nobody can know.", 'Kristy')
+
+def test_fused_matches_the_two_phase_objects():
+    llm = PhaseProvider()
+    processor = SimpleStoryProcessor(llm)
+    goals = processor.analyze_goals(scene())
+    conflicts = processor.analyze_conflicts(scene(), goals)
+    assert len(llm.prompts) == 2
+    assert processor.analyze_scene_fused(scene()) == (goals, conflicts)
+    assert len(llm.prompts) == 3
+    assert conflicts[0].goals_affected == ['bk_ch1_s1_goal_1', 'bk_ch1_s1_goal_2']
+
+def test_fused_reply_wrapped_in_prose_is_parsed():
+    reply = "Here is the analysis:\n```json\n" + json.dumps({'goals': GOALS[:1], 'conflicts': []}) + "\n```\nDone."
+    goals, conflicts = SimpleStoryProcessor(PhaseProvider(reply)).analyze_scene_fused(scene())
+    assert [goal.character for goal in goals] == ['Kristy'] and conflicts == []
+
+def test_unusable_fused_reply_gives_no_goals_or_conflicts():
+    processor = SimpleStoryProcessor(PhaseProvider('Sorry, I cannot help with that.'), json_retries=0)
+    assert processor.analyze_scene_fused(scene()) == ([], [])
+
+def test_fused_story_sends_one_request_per_scene():
+    llm = PhaseProvider()
+    processor = SimpleStoryProcessor(llm, fused_analysis=True)
+    scenes = [scene(i) for i in range(1, 5)]
+    all_goals, all_conflicts = processor._analyze_scenes_fused(scenes)
+    assert len(llm.prompts) == 4
+    assert [goal.goal_id for goal in all_goals][:3] == ['bk_ch1_s1_goal_1', 'bk_ch1_s1_goal_2', 'bk_ch1_s2_goal_1']
+    assert [conflict.scene_id for conflict in all_conflicts] == [s.scene_id for s in scenes]
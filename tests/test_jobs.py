@@ -0,0 +1,97 @@
+import json
+import threading
+
+from modules.jobs import JobManager
+
+def wait_for(manager, job_id, timeout=5.0):
+    after = 0
+    while True:
+        events = manager.wait_events(job_id, after, timeout=timeout)
+        if events:
+            after = events[-1]['seq']
+        job = manager.get(job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        assert events, f"job {job_id} made no progress"
+
+def test_job_runs_and_persists(tmp_path):
+    manager = JobManager(tmp_path / 'jobs.json')
+    job, created = manager.submit('corpus', {'corpus': 'a'}, lambda context: {'books': 3})
+    assert created
+    job = wait_for(manager, job['job_id'])
+    assert (job['status'], job['result']) == ('completed', {'books': 3})
+    saved = json.loads((tmp_path / 'jobs.json').read_text())['jobs']
+    assert [(saved_job['job_id'], saved_job['status']) for saved_job in saved] == [(job['job_id'], 'completed')]
+
+def test_same_params_while_active_return_the_same_job(tmp_path):
+    manager = JobManager(tmp_path / 'jobs.json')
+    release = threading.Event()
+    first, _ = manager.submit('corpus', {'corpus': 'a'}, lambda context: release.wait(5))
+    second, created = manager.submit('corpus', {'corpus': 'a'}, lambda context: None)
+    assert not created and second['job_id'] == first['job_id']
+    release.set()
+    wait_for(manager, first['job_id'])
+    _, created = manager.submit('corpus', {'corpus': 'a'}, lambda context: None)
+    assert created
+
+def test_running_job_is_cancelled_cooperatively(tmp_path):
+    manager = JobManager(tmp_path / 'jobs.json')
+    started = threading.Event()
+
+    def target(context):
+        started.set()
+        context.cancel_event.wait(5)
+        return {'stopped': context.cancelled}
+
+    job, _ = manager.submit('corpus', {}, target)
+    started.wait(5)
+    assert manager.cancel(job['job_id'])['cancel_requested']
+    job = wait_for(manager, job['job_id'])
+    assert (job['status'], job['result']) == ('cancelled', {'stopped': True})
+
+def test_unfinished_jobs_are_interrupted_after_a_restart(tmp_path):
+    state = tmp_path / 'jobs.json'
+    state.write_text(json.dumps({'jobs': [{'job_id': 'x', 'kind': 'corpus', 'params': {}, 'dedupe_key': 'k',
+                                           'status': 'running', 'created_at': '2026-01-01T00:00:00',
+                                           'progress': {}, 'result': None, 'error': None}]}))
+    job = JobManager(state, finished_ttl=None).get('x')
+    assert job['status'] == 'interrupted'
+
+def test_returned_jobs_are_snapshots(tmp_path):
+    manager = JobManager(tmp_path / 'jobs.json')
+    release = threading.Event()
+
+    def target(context):
+        context.report({'type': 'corpus_book_finished', 'books_done': 1})
+        release.wait(5)
+
+    job, _ = manager.submit('corpus', {}, target)
+    # Events 1 and 2 are queued and running; 3 is the book
+    manager.wait_events(job['job_id'], 2)
+    listed = manager.list_jobs()[0]
+    release.set()
+    wait_for(manager, job['job_id'])
+    assert job['progress'] == {}
+    assert listed['progress'] == {'books_done': 1, 'last_event': 'corpus_book_finished'}
+    listed['progress']['books_done'] = 99
+    assert manager.get(job['job_id'])['progress']['books_done'] == 1
+
+def test_finished_jobs_are_capped(tmp_path):
+    manager = JobManager(tmp_path / 'jobs.json', max_finished=3)
+    job_ids = []
+    for n in range(5):
+        job, _ = manager.submit('corpus', {'n': n}, lambda context: None)
+        wait_for(manager, job['job_id'])
+        job_ids.append(job['job_id'])
+    assert [job['job_id'] for job in manager.list_jobs()] == job_ids[:1:-1]
+    assert manager.get(job_ids[0]) is None
+    assert len(json.loads((tmp_path / 'jobs.json').read_text())['jobs']) == 3
+
+def test_expired_jobs_are_dropped_on_load(tmp_path):
+    state = tmp_path / 'jobs.json'
+    old = {'job_id': 'old', 'kind': 'corpus', 'params': {}, 'dedupe_key': 'k', 'status': 'completed',
+           'created_at': '2020-01-01T00:00:00', 'finished_at': '2020-01-01T00:10:00', 'progress': {},
+           'result': None, 'error': None}
+    state.write_text(json.dumps({'jobs': [old]}))
+    assert JobManager(state).get('old') is None
+    assert json.loads(state.read_text())['jobs'] == []
@@ -0,0 +1,34 @@
+import json
+
+from modules.json_stream import JsonStreamScanner, extract_json_object, extract_json_text
+
+TRAILING_COMMA = '{"goals": [{"character": "Kristy", "goal": "win", "evidence": "x"},]}'
+
+def test_payload_after_preamble_and_before_chatter():
+    text = 'Sure! Here it is:\n{"narrator": "Kristy"}\nAnything else? {"narrator": "Dawn"}'
+    assert json.loads(extract_json_text(text)) == {'narrator': 'Kristy'}
+
+def test_braces_in_strings_and_prose_are_skipped():
+    text = 'The {about} section: {"evidence": "she said \\"}{\\" twice"}'
+    assert json.loads(extract_json_object(text)) == {'evidence': 'she said "}{" twice'}
+
+def test_invalid_outer_object_never_yields_a_nested_one():
+    assert extract_json_object(TRAILING_COMMA) is None
+    assert extract_json_text(TRAILING_COMMA) == TRAILING_COMMA
+    assert extract_json_text('Result: ' + TRAILING_COMMA + ' Done.') == TRAILING_COMMA
+
+def test_truncated_object_is_returned_for_repair():
+    assert extract_json_text('{"goals": [{"character": "Kristy"') == '{"goals": [{"character": "Kristy"'
+
+def test_scanner_completes_across_chunks():
+    scanner = JsonStreamScanner()
+    chunks = ['thinking... ', '{"scenes": [{"te', 'xt": "a}"}', ']}', ' trailing']
+    completed = [scanner.feed(chunk) for chunk in chunks]
+    assert completed == [False, False, False, True, True]
+    assert json.loads(scanner.payload) == {'scenes': [{'text': 'a}'}]}
+
+def test_scanner_does_not_complete_on_invalid_payload():
+    scanner = JsonStreamScanner()
+    assert not scanner.feed(TRAILING_COMMA)
+    assert scanner.payload is None
+    assert scanner.rejected_text == TRAILING_COMMA
@@ -0,0 +1,48 @@
+from modules.narrator_detection import detect_narrator, first_person_density, resolve_book_narrators
+
+# First-person filler dense enough to count as first-person narration
+FIRST_PERSON = "I looked at my watch. I knew I was late, so I ran home by myself. " * 5
+
+def chapter(num, text):
+    return {'chapter_num': num, 'text': text}
+
+def test_self_identification_wins():
+    guess = detect_narrator("My name is Stacey McGill, and I love New York. " + FIRST_PERSON)
+    assert (guess.narrator, guess.method) == ('Stacey', 'self-identification')
+    assert guess.confidence >= 0.9
+
+def test_third_person_text_is_left_to_the_llm():
+    text = "Kristy walked to the park. She saw Claudia there. They talked for hours. " * 5
+    assert first_person_density(text) < 0.02
+    assert detect_narrator(text).confidence == 0.0
+
+def test_book_narrator_confirmed_when_addressed():
+    text = FIRST_PERSON + '"Come on, Dawn," said Kristy. "Dawn, hurry!"'
+    guess = detect_narrator(text, book_narrator='Dawn')
+    assert (guess.narrator, guess.confidence) == ('Dawn', 0.9)
+
+def test_book_narrator_kept_without_contrary_evidence():
+    guess = detect_narrator(FIRST_PERSON, book_narrator='Dawn')
+    assert (guess.narrator, guess.confidence) == ('Dawn', 0.8)
+
+def test_someone_else_addressed_lowers_confidence_below_cutoff():
+    # Mary Anne is addressed (score 1) and Dawn never is: too weak to call a change, too strong to ignore
+    text = FIRST_PERSON + '"Thanks, Mary Anne," said Kristy.'
+    guess = detect_narrator(text, book_narrator='Dawn')
+    assert guess.narrator == 'Dawn'
+    assert guess.confidence < 0.75
+
+def test_clear_change_of_narrator():
+    text = FIRST_PERSON + 'Dawn waved at me. "Mallory! Mallory, over here!" "Hi, Mallory."'
+    guess = detect_narrator(text, book_narrator='Dawn')
+    assert guess.narrator == 'Mallory'
+
+def test_resolve_book_narrators_shares_the_book_narrator():
+    chapters = [
+        chapter(1, "My name is Kristy Thomas. " + FIRST_PERSON),
+        chapter(2, FIRST_PERSON + '"Kristy, wait!" Mary Anne called. "Kristy!"'),
+        chapter(3, FIRST_PERSON),
+        chapter(4, FIRST_PERSON + '"See you, Stacey," Claudia said.'),
+        chapter(5, "The club met at five. Claudia handed out snacks. Everyone laughed. " * 5)
+    ]
+    assert resolve_book_narrators(chapters) == {1: 'Kristy', 2: 'Kristy', 3: 'Kristy', 4: None, 5: None}
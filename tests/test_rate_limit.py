@@ -0,0 +1,128 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from modules.llm_provider import LLMProvider
+from modules.rate_limit import (LLMCallError, RateLimiter, RetryPolicy, classify_error, retry_after_seconds)
+from modules.telemetry import Telemetry
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class APIStatusError(Exception):
+    """Shaped like the SDK errors: the status and headers hang off .response"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code, headers)
+
+class ReadTimeout(Exception):
+    pass
+
+class NoWait(RetryPolicy):
+    """Records the Retry-After each retry was given instead of sleeping"""
+
+    def __init__(self, max_attempts):
+        super().__init__(max_attempts=max_attempts)
+        self.delays = []
+
+    def delay(self, attempt, retry_after=None):
+        self.delays.append(retry_after)
+        return 0
+
+class PausingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__()
+        self.pauses = []
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+
+class ScriptedLLM(LLMProvider):
+    """Requests fail with the queued errors first, then answer"""
+
+    def __init__(self, errors, retry_policy, rate_limiter=None):
+        super().__init__('ollama', 'retry', {}, telemetry=Telemetry(), retry_policy=retry_policy,
+                         rate_limiter=rate_limiter)
+        self.client = object()
+        self.errors = list(errors)
+        self.requests = 0
+
+    def _request(self, prompt, schema=None, client=None):
+        self.requests += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+@pytest.mark.parametrize('error, expected', [
+    (APIStatusError(429), (True, 'rate_limited')),
+    (APIStatusError(408), (True, 'timeout')),
+    (APIStatusError(503), (True, 'server_error')),
+    (APIStatusError(529), (True, 'server_error')),
+    (APIStatusError(400), (False, 'http_400')),
+    (APIStatusError(401), (False, 'http_401')),
+    (TimeoutError('slow'), (True, 'timeout')),
+    (ReadTimeout('slow'), (True, 'timeout')),
+    (ConnectionError('reset'), (True, 'connection')),
+    (ValueError('bad json'), (False, 'ValueError')),
+])
+def test_errors_are_classified(error, expected):
+    assert classify_error(error) == expected
+
+def test_retry_after_headers():
+    assert retry_after_seconds(APIStatusError(429, {'retry-after': '12'})) == 12
+    assert retry_after_seconds(APIStatusError(429, {'retry-after-ms': '1500', 'retry-after': '9'})) == 1.5
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < retry_after_seconds(APIStatusError(429, {'retry-after': later})) <= 30
+    earlier = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+    assert retry_after_seconds(APIStatusError(429, {'retry-after': earlier})) == 0
+    assert retry_after_seconds(APIStatusError(429, {'retry-after': 'soon'})) is None
+    assert retry_after_seconds(APIStatusError(429)) is None
+    assert retry_after_seconds(TimeoutError('slow')) is None
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, max_retry_after=60.0)
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(attempt) <= min(5.0, 2 ** (attempt - 1))
+    assert policy.delay(1, retry_after=20) == 20
+    assert policy.delay(1, retry_after=600) == 60.0
+
+def test_provider_retries_transient_errors():
+    policy = NoWait(3)
+    llm = ScriptedLLM([APIStatusError(503), TimeoutError('slow')], policy)
+    assert llm.call_llm('prompt') == 'ok'
+    assert llm.requests == 3
+    assert policy.delays == [None, None]
+
+def test_provider_gives_up_on_a_client_error():
+    llm = ScriptedLLM([APIStatusError(400), APIStatusError(400)], NoWait(5))
+    with pytest.raises(LLMCallError) as raised:
+        llm.call_llm('prompt', phase='goals')
+    assert llm.requests == 1
+    assert (raised.value.attempts, raised.value.reason, raised.value.phase) == (1, 'http_400', 'goals')
+
+def test_provider_gives_up_after_max_attempts():
+    llm = ScriptedLLM([APIStatusError(502)] * 5, NoWait(3))
+    with pytest.raises(LLMCallError) as raised:
+        llm.call_llm('prompt')
+    assert llm.requests == 3
+    assert (raised.value.attempts, raised.value.reason) == (3, 'server_error')
+    assert isinstance(raised.value.__cause__, APIStatusError)
+
+def test_retry_after_pauses_the_shared_limiter():
+    limiter = PausingLimiter()
+    llm = ScriptedLLM([APIStatusError(429, {'retry-after': '600'}), APIStatusError(500)],
+                      RetryPolicy(max_retry_after=0.01, base_delay=0.001), rate_limiter=limiter)
+    assert llm.call_llm('prompt') == 'ok'
+    # Only the rate limit carried Retry-After; its delay was capped at max_retry_after
+    assert limiter.pauses == [0.01]
+
+def test_pause_holds_back_the_next_reservation():
+    limiter = RateLimiter()
+    assert limiter.reserve() == 0
+    limiter.pause(30)
+    assert 29 < limiter.reserve() <= 30
+    assert 29 < limiter.get_status()['paused_for'] <= 30
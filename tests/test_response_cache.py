@@ -0,0 +1,81 @@
+import time
+
+from modules.llm_provider import LLMProvider, ResponseCache
+from modules.telemetry import Telemetry
+
+def key(provider='ollama', model='llama3', params=None, prompt='Analyze this scene.'):
+    return ResponseCache.make_key(provider, model, {'temperature': 0.1} if params is None else params, prompt)
+
+def test_key_covers_every_request_field():
+    base = key()
+    assert key() == base
+    assert key(params={'temperature': 0.1}) == base
+    variants = [key(provider='openai'), key(model='mistral'), key(params={'temperature': 0.2}),
+                key(params={'temperature': 0.1, 'schema': {'type': 'object'}}), key(prompt='Analyze that scene.')]
+    assert len({base, *variants}) == len(variants) + 1
+
+def test_key_ignores_param_order():
+    assert key(params={'a': 1, 'b': {'x': 1, 'y': 2}}) == key(params={'b': {'y': 2, 'x': 1}, 'a': 1})
+
+def test_hits_misses_and_persistence(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ResponseCache(path)
+    assert cache.get(key()) is None
+    cache.put(key(), '{"goals": []}', 'ollama', 'llama3')
+    assert cache.get(key()) == '{"goals": []}'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    # Another process (or app restart) opening the same file sees the entry
+    assert ResponseCache(path).get(key()) == '{"goals": []}'
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_age_seconds=0.05)
+    cache.put(key(), 'old')
+    time.sleep(0.1)
+    assert cache.get(key()) is None
+    assert cache.stats()['entries'] == 0
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    for name in ('a', 'b', 'c'):
+        cache.put(key(prompt=name), name)
+        time.sleep(0.01)
+    cache.get(key(prompt='a'))  # a is now more recent than b
+    cache.evict()
+    assert cache.get(key(prompt='b')) is None
+    assert cache.get(key(prompt='a')) == 'a' and cache.get(key(prompt='c')) == 'c'
+
+def test_size_limit_evicts_oldest_first(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_bytes=250)
+    for name in ('a', 'b', 'c'):
+        cache.put(key(prompt=name), name * 100)
+        time.sleep(0.01)
+    cache.evict()
+    assert cache.get(key(prompt='a')) is None
+    assert cache.get(key(prompt='c')) == 'c' * 100
+    assert cache.stats()['bytes'] <= 250
+
+class CountingProvider(LLMProvider):
+    def __init__(self, cache, response='{"goals": []}'):
+        super().__init__('ollama', 'counting', {}, cache=cache, telemetry=Telemetry())
+        self.client = object()
+        self.response = response
+        self.requests = 0
+
+    def _request(self, prompt, schema=None, client=None):
+        self.requests += 1
+        return self.response
+
+def test_provider_replays_cached_responses(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    llm = CountingProvider(cache)
+    assert llm.call_llm('Analyze this scene.') == llm.call_llm('Analyze this scene.') == '{"goals": []}'
+    assert llm.requests == 1
+    # A different schema is a different request
+    llm.call_llm('Analyze this scene.', schema={'type': 'object'})
+    assert llm.requests == 2
+
+def test_empty_responses_are_not_cached(tmp_path):
+    llm = CountingProvider(ResponseCache(str(tmp_path / 'cache.sqlite3')), response='')
+    llm.call_llm('Analyze this scene.')
+    llm.call_llm('Analyze this scene.')
+    assert llm.requests == 2
@@ -0,0 +1,38 @@
+from modules.result_cache import VisualizationResultCache, corpus_fingerprint
+
+def write_corpus(folder, books):
+    folder.mkdir(exist_ok=True)
+    for path in folder.glob('*.txt'):
+        path.unlink()
+    for name, text in books.items():
+        (folder / f"{name}.txt").write_text(text, encoding='utf-8')
+    return folder
+
+def test_fingerprint_follows_book_content(tmp_path):
+    corpus = write_corpus(tmp_path / 'corpus', {'a': 'One.', 'b': 'Two.'})
+    original = corpus_fingerprint(corpus)
+    assert corpus_fingerprint(corpus) == original
+    write_corpus(corpus, {'a': 'One, edited.', 'b': 'Two.'})
+    assert corpus_fingerprint(corpus) != original
+    write_corpus(corpus, {'a': 'One.'})
+    assert corpus_fingerprint(corpus) != original
+    write_corpus(corpus, {'a': 'One.', 'b': 'Two.'})
+    assert corpus_fingerprint(corpus) == original
+
+def test_each_key_has_its_own_entry_and_run_output(tmp_path):
+    cache = VisualizationResultCache(tmp_path / 'cache')
+    key = cache.make_key('corpus-v1', 'ollama', 'llama3')
+    others = {cache.make_key('corpus-v2', 'ollama', 'llama3'), cache.make_key('corpus-v1', 'openai', 'llama3'),
+              cache.make_key('corpus-v1', 'ollama', 'mistral')}
+    assert key not in others and len(others) == 3
+    assert cache.get(key) is None
+    cache.put(key, {'metadata': {'total_books': 1}})
+    assert cache.get(key) == {'metadata': {'total_books': 1}}
+    assert all(cache.get(other) is None for other in others)
+    assert len({cache.run_output_file(k) for k in others | {key}}) == 4
+    assert cache.run_output_file(key).parent.is_dir()
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = VisualizationResultCache(tmp_path / 'cache')
+    cache.path_for('broken').write_text('{"metadata": ', encoding='utf-8')
+    assert cache.get('broken') is None
@@ -0,0 +1,65 @@
+import json
+
+from modules.corpus_manager import build_book_entry
+from modules.data_models import Conflict, Goal, Scene
+from modules.result_sink import StreamingResultSink
+from modules.visualization import prepare_visualization_data
+
+def book(book_id, characters, scenes=2):
+    result = {
+        'scenes': [Scene(f"{book_id}_s{i}", book_id, 1, i, f"Scene {i} of {book_id}.") for i in range(scenes)],
+        'goals': [Goal(f"{book_id}_g{i}", f"{book_id}_s0", char, 'win', 'want', 'social', 'quote', 0.9, book_id)
+                  for i, char in enumerate(characters)],
+        'conflicts': [Conflict(f"{book_id}_c0", f"{book_id}_s0", 'goal_opposition', 'argue', list(characters),
+                               [], 'quote', 'why', 'low', book_id)]
+    }
+    return build_book_entry(book_id, result)
+
+def expected_file(results):
+    return json.dumps(prepare_visualization_data(results), indent=2, default=str)
+
+def test_compact_matches_a_full_build(tmp_path):
+    output = tmp_path / 'corpus_visualization.json'
+    sink = StreamingResultSink(output)
+    results = {'a': book('a', ['Kristy', 'Stacey']), 'b': book('b', ['Dawn']), 'c': book('c', ['Stacey', 'Dawn'])}
+    for book_id, entry in results.items():
+        sink.append_book(book_id, entry)
+    data = sink.compact()
+    assert output.read_text() == expected_file(results)
+    assert {key: value for key, value in data.items() if key != 'books'} == \
+        {key: value for key, value in prepare_visualization_data(results).items() if key != 'books'}
+    meta = json.loads(sink.meta_file.read_text())
+    assert (meta['total_books'], meta['total_scenes'], meta['last_book']) == (3, 6, 'c')
+
+def test_reanalyzed_book_keeps_its_place_and_latest_record(tmp_path):
+    output = tmp_path / 'corpus_visualization.json'
+    sink = StreamingResultSink(output)
+    sink.append_book('a', book('a', ['Kristy']))
+    sink.append_book('b', book('b', ['Dawn']))
+    sink.append_book('a', book('a', ['Claudia', 'Mallory'], scenes=5))
+    sink.compact()
+    results = {'a': book('a', ['Claudia', 'Mallory'], scenes=5), 'b': book('b', ['Dawn'])}
+    assert output.read_text() == expected_file(results)
+    assert sink.totals == {'books': 2, 'scenes': 7, 'goals': 3, 'conflicts': 2}
+
+def test_resume_reloads_the_stream_and_skips_a_torn_line(tmp_path):
+    output = tmp_path / 'corpus_visualization.json'
+    sink = StreamingResultSink(output)
+    sink.append_book('a', book('a', ['Kristy']))
+    sink.append_book('b', book('b', ['Dawn']))
+    # A crash in the middle of writing the next record
+    with open(sink.records_file, 'a', encoding='utf-8') as f:
+        f.write('{"book_id": "c", "scen')
+
+    resumed = StreamingResultSink(output, reset=False)
+    assert resumed.totals['books'] == 2
+    resumed.compact()
+    assert output.read_text() == expected_file({'a': book('a', ['Kristy']), 'b': book('b', ['Dawn'])})
+
+def test_reset_starts_a_new_stream(tmp_path):
+    output = tmp_path / 'corpus_visualization.json'
+    StreamingResultSink(output).append_book('a', book('a', ['Kristy']))
+    sink = StreamingResultSink(output, reset=True)
+    assert not sink.records_file.exists() and not sink.meta_file.exists()
+    sink.compact()
+    assert output.read_text() == expected_file({})
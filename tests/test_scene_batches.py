@@ -0,0 +1,93 @@
+import json
+
+from modules.data_models import Scene
+from modules.story_processor import SimpleStoryProcessor
+
+class WordCounter:
+    def count_tokens(self, text, model=None):
+        return len(text.split())
+
+class BatchProvider:
+    """Batch replies covering the scenes listed in `answered` (all by default); records prompts"""
+
+    def __init__(self, answered=None):
+        self.provider = 'ollama'
+        self.model = 'batch'
+        self.prompts = []
+        self.answered = answered
+
+    def call_llm(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        head = prompt[:200]
+        key = 'goals' if 'goals' in head else 'conflicts'
+        item = ({'character': 'Kristy', 'goal': 'win', 'evidence': 'quote', 'category': 'social'} if key == 'goals'
+                else {'type': 'goal_opposition', 'description': 'argue', 'characters_involved': ['Kristy']})
+        if 'in each of these' not in head:
+            return json.dumps({key: [dict(item, evidence='single')]})
+        scene_ids = [line[len('=== Scene: '):-len(' ===')] for line in prompt.splitlines()
+                     if line.startswith('=== Scene: ')]
+        return json.dumps({'scenes': [{'scene_id': scene_id, key: [dict(item, evidence=scene_id)]}
+                                      for scene_id in scene_ids
+                                      if self.answered is None or scene_id in self.answered]})
+
+def batching_processor(llm, budget=1000):
+    processor = SimpleStoryProcessor(llm)
+    processor.batch_scenes = True
+    processor.batch_token_budget = budget
+    processor.token_estimator = WordCounter()
+    return processor
+
+def scenes(per_chapter=(3, 2), words=20):
+    return [Scene(f"bk_ch{c}_s{i}", 'bk', c, i, " ".join(["word"] * words), 'Kristy')
+            for c, count in enumerate(per_chapter, 1) for i in range(1, count + 1)]
+
+def test_batches_stay_within_a_chapter_and_the_budget():
+    processor = batching_processor(BatchProvider())
+    overhead = processor._count_tokens(processor._build_goals_batch_prompt([]))
+    assert [[s.scene_id for s in batch] for batch in processor.build_scene_batches(scenes())] == \
+        [['bk_ch1_s1', 'bk_ch1_s2', 'bk_ch1_s3'], ['bk_ch2_s1', 'bk_ch2_s2']]
+    # Room for two 40-token scenes per batch
+    processor.batch_token_budget = overhead + 80
+    assert [len(batch) for batch in processor.build_scene_batches(scenes())] == [2, 1, 2]
+
+def test_batch_reply_is_split_back_per_scene():
+    llm = BatchProvider()
+    processor = batching_processor(llm)
+    per_scene = processor._analyze_goals_per_scene(scenes())
+    assert len(llm.prompts) == 2
+    assert [[goal.evidence for goal in goals] for goals in per_scene] == \
+        [[s.scene_id] for s in scenes()]
+    assert per_scene[1][0].goal_id == 'bk_ch1_s2_goal_1'
+
+def test_scene_missing_from_the_reply_is_asked_alone():
+    llm = BatchProvider(answered={'bk_ch1_s1', 'bk_ch1_s3'})
+    processor = batching_processor(llm)
+    goals = processor.analyze_goals_batch(scenes((3,)))
+    assert [[goal.evidence for goal in scene_goals] for scene_goals in goals] == \
+        [['bk_ch1_s1'], ['single'], ['bk_ch1_s3']]
+    assert len(llm.prompts) == 2 and 'in each of these' not in llm.prompts[1][:200]
+
+def test_unusable_batch_reply_falls_back_to_every_scene():
+    llm = BatchProvider(answered=set())
+    processor = batching_processor(llm)
+    all_goals = [goal for scene_goals in processor.analyze_goals_batch(scenes((2,))) for goal in scene_goals]
+    conflicts = processor.analyze_conflicts_batch(scenes((2,)), all_goals)
+    assert [len(scene_conflicts) for scene_conflicts in conflicts] == [1, 1]
+    assert len(llm.prompts) == 6
+
+def test_single_scene_batch_uses_the_normal_prompt():
+    llm = BatchProvider()
+    processor = batching_processor(llm)
+    processor.analyze_goals_batch(scenes((1,)))
+    assert llm.prompts == [processor._build_goals_prompt(scenes((1,))[0])]
+
+def test_conflict_batches_see_each_scene_goals():
+    llm = BatchProvider()
+    processor = batching_processor(llm)
+    batch = scenes((2,))
+    goals = [goal for scene_goals in processor.analyze_goals_batch(batch) for goal in scene_goals]
+    conflicts = processor.analyze_conflicts_batch(batch, goals)
+    prompt = llm.prompts[-1]
+    assert prompt.count('- Kristy: win') == 2
+    assert [c.goals_affected for scene_conflicts in conflicts for c in scene_conflicts] == \
+        [['bk_ch1_s1_goal_1'], ['bk_ch1_s2_goal_1']]
@@ -0,0 +1,63 @@
+import json
+
+from modules.data_models import Scene
+from modules.story_processor import SimpleStoryProcessor
+from modules.structured_output import PHASE_SCHEMAS, has_required_fields, parse_json_object, repair_json
+
+TRAILING_COMMA = ('{"goals": [{"character": "Kristy", "goal": "win", "evidence": "x"},'
+                  ' {"character": "Stacey", "goal": "help", "evidence": "y"},]}')
+
+class ScriptedProvider:
+    """Replies from a fixed list, recording each prompt"""
+
+    def __init__(self, replies):
+        self.provider = 'ollama'
+        self.model = 'scripted'
+        self.replies = list(replies)
+        self.prompts = []
+
+    def call_llm(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self.replies.pop(0) if self.replies else ''
+
+def scene():
+    return Scene(scene_id='bk_chapter_1_scene_1', book_id='bk', chapter_num=1, scene_num=1,
+                 text='Kristy called a meeting. Stacey agreed to help.', narrator='Kristy')
+
+def test_has_required_fields_checks_keys_and_types():
+    schema = PHASE_SCHEMAS['goals']
+    assert has_required_fields({'goals': []}, schema)
+    assert not has_required_fields({'character': 'Kristy', 'goal': 'win', 'evidence': 'x'}, schema)
+    assert not has_required_fields({'goals': 'none'}, schema)
+    assert not has_required_fields(['goals'], schema)
+    assert has_required_fields({'scenes': [{'scene_id': 's', 'goals': []}]}, PHASE_SCHEMAS['goals_batch'])
+
+def test_repair_drops_trailing_commas_and_closes_truncation():
+    assert len(repair_json(TRAILING_COMMA)['goals']) == 2
+    truncated = '```json\n{"goals": [{"character": "Kristy", "goal": "win", "evidence": "x"}, {"charac'
+    assert repair_json(truncated) == {'goals': [{'character': 'Kristy', 'goal': 'win', 'evidence': 'x'}]}
+    assert repair_json('no json here') is None
+
+def test_parse_json_object_rejects_invalid_payload():
+    assert parse_json_object(TRAILING_COMMA) is None
+    assert parse_json_object('Here: {"narrator": "Dawn"} ok') == {'narrator': 'Dawn'}
+
+def test_trailing_comma_reply_is_repaired_not_taken_as_valid():
+    llm = ScriptedProvider([TRAILING_COMMA])
+    processor = SimpleStoryProcessor(llm, structured_output=True)
+    goals = processor.analyze_goals(scene())
+    assert [goal.character for goal in goals] == ['Kristy', 'Stacey']
+    assert len(llm.prompts) == 1
+    stats = processor.parse_stats.get_status()['goals']
+    assert stats['valid'] == 0 and stats['repaired'] == 1
+
+def test_reply_without_phase_key_is_reprompted():
+    single_goal = '{"character": "Kristy", "goal": "win", "evidence": "x"}'
+    valid = json.dumps({'goals': [{'character': 'Kristy', 'goal': 'win', 'evidence': 'x'}]})
+    llm = ScriptedProvider([single_goal, valid])
+    processor = SimpleStoryProcessor(llm, json_retries=1)
+    goals = processor.analyze_goals(scene())
+    assert [goal.character for goal in goals] == ['Kristy']
+    assert len(llm.prompts) == 2
+    stats = processor.parse_stats.get_status()['goals']
+    assert stats['valid'] == 0 and stats['reprompted'] == 1 and stats['recovered_by_reprompt'] == 1
@@ -0,0 +1,112 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytest.importorskip('requests')
+
+from modules.llm_provider import ResponseCache
+from modules.rate_limit import RetryPolicy
+from modules.synthetic_backend import (LatencyModel, SyntheticError, SyntheticLLMProvider, SyntheticOllamaServer,
+                                       SyntheticResponder)
+from modules.telemetry import Telemetry
+
+GOALS_PROMPT = "Analyze character goals in this scene.\n\nScene:\nKristy called the meeting to order."
+
+class NoWait(RetryPolicy):
+    def delay(self, attempt, retry_after=None):
+        return 0
+
+def provider(responder, **kwargs):
+    return SyntheticLLMProvider(responder, telemetry=Telemetry(), **kwargs)
+
+def post(url, payload):
+    request = urllib.request.Request(url, json.dumps(payload).encode('utf-8'),
+                                     {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read().decode('utf-8')
+
+def test_latency_specs():
+    assert LatencyModel.from_spec('fixed:0.25', per_output_token=0.01).sample(10) == pytest.approx(0.35)
+    uniform = LatencyModel.from_spec('uniform:1:0.5', seed=1)
+    assert all(0.5 <= uniform.sample() <= 1.5 for _ in range(100))
+    # Seeded models replay the same draws
+    first, second = (LatencyModel.from_spec('lognormal:1.2:0.5', seed=7) for _ in range(2))
+    assert [first.sample() for _ in range(5)] == [second.sample() for _ in range(5)]
+    assert LatencyModel('exponential', 0.0).sample() == 0
+    with pytest.raises(ValueError):
+        LatencyModel.from_spec('gamma:1')
+
+def test_responder_injects_failures():
+    responder = SyntheticResponder(failure_rate=1.0, failure_statuses=(503,), seed=1)
+    with pytest.raises(SyntheticError) as raised:
+        responder.respond('synthetic', GOALS_PROMPT)
+    assert raised.value.status_code == 503
+    assert responder.get_status() == {'requests': 1, 'failures': 1, 'replayed': 0, 'generated': 0}
+
+    responder = SyntheticResponder(failure_rate=0.3, seed=3)
+    outcomes = []
+    for _ in range(200):
+        try:
+            responder.respond('synthetic', GOALS_PROMPT)
+            outcomes.append(True)
+        except SyntheticError:
+            outcomes.append(False)
+    assert 30 < outcomes.count(False) < 90
+
+def test_provider_answers_pipeline_prompts():
+    llm = provider(SyntheticResponder(goals_per_scene=2, conflicts_per_scene=1))
+    goals = json.loads(llm.call_llm(GOALS_PROMPT))
+    assert len(goals['goals']) == 2
+    narrator = json.loads(llm.call_llm("Identify the narrator/point-of-view character of this chapter."))
+    assert narrator['narrator']
+    assert llm.get_status()['synthetic']['generated'] == 2
+
+def test_injected_failures_go_through_the_retry_path():
+    responder = SyntheticResponder(failure_rate=0.5, failure_statuses=(503,), seed=5)
+    llm = provider(responder, retry_policy=NoWait(max_attempts=50))
+    for _ in range(10):
+        assert json.loads(llm.call_llm(GOALS_PROMPT))['goals']
+    stats = responder.get_status()
+    assert stats['failures'] > 0
+    assert stats['requests'] == stats['failures'] + 10
+    retries = llm.telemetry.counters['llm_retries_total']
+    assert sum(retries.values()) == stats['failures']
+
+def test_replays_a_recorded_response(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'recorded.sqlite3'))
+    # Record under the real model's key, exactly as a caching provider would have stored it
+    recorder = provider(SyntheticResponder(), model='llama3', cache=cache)
+    key, _ = recorder._cache_lookup(GOALS_PROMPT)
+    cache.put(key, '{"goals": [{"character": "Kristy"}]}', 'ollama', 'llama3')
+
+    responder = SyntheticResponder(replay_cache=cache, replay_model='llama3')
+    llm = provider(responder)
+    assert llm.call_llm(GOALS_PROMPT) == '{"goals": [{"character": "Kristy"}]}'
+    assert json.loads(llm.call_llm(GOALS_PROMPT + ' Unrecorded.'))['goals']
+    assert responder.get_status() == {'requests': 2, 'failures': 0, 'replayed': 1, 'generated': 1}
+
+def test_http_server_speaks_the_ollama_api():
+    server = SyntheticOllamaServer(SyntheticResponder(goals_per_scene=1), models=('llama3',))
+    server.serve_in_background()
+    try:
+        with urllib.request.urlopen(f"{server.url}/api/tags", timeout=5) as response:
+            assert [model['name'] for model in json.load(response)['models']] == ['llama3']
+
+        message = {'model': 'llama3', 'messages': [{'role': 'user', 'content': GOALS_PROMPT}]}
+        reply = json.loads(post(f"{server.url}/api/chat", {**message, 'stream': False}))
+        assert reply['done'] and len(json.loads(reply['message']['content'])['goals']) == 1
+
+        lines = [json.loads(line) for line in post(f"{server.url}/api/chat", message).splitlines()]
+        assert [line['done'] for line in lines] == [False] * (len(lines) - 1) + [True]
+        assert json.loads(''.join(line['message']['content'] for line in lines))['goals']
+
+        server.responder.failure_rate = 1.0
+        server.responder.failure_statuses = (429,)
+        with pytest.raises(urllib.error.HTTPError) as raised:
+            post(f"{server.url}/api/chat", message)
+        assert raised.value.code == 429 and raised.value.headers['Retry-After'] == '1'
+    finally:
+        server.shutdown()
+        server.server_close()
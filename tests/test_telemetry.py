@@ -0,0 +1,78 @@
+import json
+
+from modules.llm_provider import LLMProvider, ResponseCache
+from modules.rate_limit import RetryPolicy
+from modules.telemetry import Histogram, Telemetry
+
+class NoWait(RetryPolicy):
+    def delay(self, attempt, retry_after=None):
+        return 0
+
+class ScriptedLLM(LLMProvider):
+    """Requests fail with the queued errors first, then answer"""
+
+    def __init__(self, telemetry, errors=(), cache=None, retries=3):
+        super().__init__('ollama', 'tele', {}, cache=cache, telemetry=telemetry,
+                         retry_policy=NoWait(max_attempts=retries) if retries else None)
+        self.client = object()
+        self.errors = list(errors)
+
+    def _request(self, prompt, schema=None, client=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        return '{"goals": []}'
+
+def counter(telemetry, name, *labels):
+    return telemetry.counters[name].get(('ollama', 'tele') + labels, 0)
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram((1, 2, 5))
+    for value in (0.5, 1.5, 1.5, 4, 10):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(1, 1), (2, 3), (5, 4), (float('inf'), 5)]
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(0.99) == float('inf')
+    assert Histogram((1,)).quantile(0.5) is None
+
+def test_calls_are_counted_by_outcome():
+    telemetry = Telemetry()
+    telemetry.record_call('ollama', 'tele', 'goals', 2.0, 100, 40)
+    telemetry.record_call('ollama', 'tele', 'goals', 1.0, 100, 0, status='empty', estimated=True)
+    telemetry.record_call('ollama', 'tele', 'goals', 0.5, 0, 0, status='error')
+    assert counter(telemetry, 'llm_requests_total', 'goals', 'ok') == 1
+    assert counter(telemetry, 'llm_requests_total', 'goals', 'empty') == 1
+    assert counter(telemetry, 'llm_requests_total', 'goals', 'error') == 1
+    assert counter(telemetry, 'llm_estimated_usage_total', 'goals') == 1
+    latency = telemetry.histograms['llm_request_duration_seconds'][('ollama', 'tele', 'goals')]
+    assert (latency.count, latency.sum) == (2, 3.0)  # errors are not timed
+    assert telemetry.histograms['llm_tokens_per_second'][('ollama', 'tele', 'goals')].sum == 20
+
+def test_provider_counts_retries_errors_and_cache_hits(tmp_path):
+    telemetry = Telemetry()
+    llm = ScriptedLLM(telemetry, errors=[TimeoutError('slow'), ConnectionError('reset')],
+                      cache=ResponseCache(str(tmp_path / 'cache.sqlite3')))
+    assert llm.call_llm('prompt', phase='goals') == '{"goals": []}'
+    assert llm.call_llm('prompt', phase='goals') == '{"goals": []}'
+    assert counter(telemetry, 'llm_requests_total', 'goals', 'ok') == 1
+    assert counter(telemetry, 'llm_requests_total', 'goals', 'error') == 2
+    assert counter(telemetry, 'llm_retries_total', 'goals', 'timeout') == 1
+    assert counter(telemetry, 'llm_retries_total', 'goals', 'connection') == 1
+    assert counter(telemetry, 'llm_errors_total', 'goals', 'TimeoutError') == 1
+    assert counter(telemetry, 'llm_cache_hits_total', 'goals') == 1
+
+def test_prometheus_text_and_json_dump(tmp_path):
+    telemetry = Telemetry()
+    telemetry.record_call('ollama', 'tele', 'goals', 0.3, 100, 40)
+    text = telemetry.render_prometheus()
+    assert '# TYPE llm_request_duration_seconds histogram' in text
+    assert 'llm_request_duration_seconds_bucket{provider="ollama",model="tele",phase="goals",le="0.5"} 1' in text
+    assert 'llm_requests_total{provider="ollama",model="tele",phase="goals",status="ok"} 1' in text
+    assert text.endswith('\n')
+    telemetry.dump(tmp_path / 'metrics.prom')
+    assert (tmp_path / 'metrics.prom').read_text(encoding='utf-8') == text
+    snapshot = json.loads(telemetry.dump(tmp_path / 'metrics.json').read_text(encoding='utf-8'))
+    series = snapshot['series'][0]
+    assert (series['phase'], series['llm_requests_total'], series['llm_prompt_tokens']['count']) == \
+        ('goals', {'ok': 1}, 1)
+    telemetry.reset()
+    assert telemetry.snapshot()['series'] == []
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+pytest.importorskip('requests')
+
+from modules.token_estimator import TokenEstimator, default_token_cache_path
+
+def write_corpus(folder):
+    folder.mkdir()
+    for name in ('a', 'b'):
+        (folder / f"{name}.txt").write_text(f"Book {name}. " * 200, encoding='utf-8')
+    return folder
+
+def test_default_cache_lives_in_the_user_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv('TOKEN_CACHE_PATH', raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    corpus = write_corpus(tmp_path / 'corpus')
+    estimate = TokenEstimator(max_workers=1).estimate_corpus_tokens(str(corpus), 'gpt-4')
+    assert estimate['processed_files'] == 2
+    assert sorted(os.listdir(corpus)) == ['a.txt', 'b.txt']
+    assert default_token_cache_path().startswith(str(tmp_path / 'cache'))
+    assert os.path.exists(default_token_cache_path())
+
+def test_counts_are_reused_across_estimators(tmp_path):
+    corpus = write_corpus(tmp_path / 'corpus')
+    cache_path = str(tmp_path / 'counts.json')
+    paths = [str(corpus / 'a.txt'), str(corpus / 'b.txt')]
+    first = TokenEstimator(cache_path, max_workers=1).count_files_tokens(paths, 'gpt-4')
+    second = TokenEstimator(cache_path, max_workers=1).count_files_tokens(paths, 'gpt-4')
+    assert first['cached'] == 0 and second['cached'] == 2
+    assert first['counts'] == second['counts']
+
+def test_unwritable_cache_only_warns(tmp_path, capsys):
+    corpus = write_corpus(tmp_path / 'corpus')
+    blocker = tmp_path / 'not_a_dir'
+    blocker.write_text('', encoding='utf-8')
+    estimator = TokenEstimator(str(blocker / 'counts.json'), max_workers=1)
+    estimate = estimator.estimate_corpus_tokens(str(corpus), 'gpt-4')
+    assert 'error' not in estimate
+    assert estimate['processed_files'] == 2
+    assert 'Could not save token counts' in capsys.readouterr().out
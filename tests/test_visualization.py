@@ -0,0 +1,150 @@
+import random
+from dataclasses import asdict
+
+import pytest
+
+from modules.data_models import Conflict, Goal, Scene
+from modules.visualization import VisualizationAggregator, prepare_visualization_data
+
+CHARACTERS = ['Kristy', 'Claudia', 'Mary Anne', 'Stacey', 'Dawn', 'Mallory', 'Unknown']
+
+def baseline_prepare_visualization_data(results_dict):
+    """prepare_visualization_data as it was before VisualizationAggregator: one full pass per call"""
+    visualization_data = {
+        "metadata": {
+            "generated_date": "2025-08-11",
+            "total_books": len(results_dict),
+            "total_scenes": sum(r['scene_count'] for r in results_dict.values()),
+            "total_goals": sum(r['goal_count'] for r in results_dict.values()),
+            "total_conflicts": sum(r['conflict_count'] for r in results_dict.values()),
+            "processor": "SimpleStoryProcessor"
+        },
+        "books": [],
+        "characters": {},
+        "character_books": {},
+        "conflict_network": [],
+        "goals": [],
+        "goal_network": []
+    }
+    all_characters = set()
+    for book_id, book_data in results_dict.items():
+        scenes_data = [asdict(scene) if hasattr(scene, '__dict__') else scene for scene in book_data['scenes']]
+        goals_data = []
+        for goal in book_data['goals']:
+            goal_dict = asdict(goal) if hasattr(goal, '__dict__') else goal
+            goals_data.append(goal_dict)
+            all_characters.add(goal_dict.get('character', 'Unknown'))
+        conflicts_data = []
+        for conflict in book_data['conflicts']:
+            conflict_dict = asdict(conflict) if hasattr(conflict, '__dict__') else conflict
+            conflicts_data.append(conflict_dict)
+            for char in conflict_dict.get('characters_involved', []):
+                all_characters.add(char)
+        visualization_data["books"].append({
+            "book_id": book_id,
+            "book_title": book_data['book_title'],
+            "scene_count": book_data['scene_count'],
+            "goal_count": book_data['goal_count'],
+            "conflict_count": book_data['conflict_count'],
+            "scenes": scenes_data,
+            "goals": goals_data,
+            "conflicts": conflicts_data
+        })
+        for goal in goals_data:
+            char = goal.get('character', 'Unknown')
+            if char not in visualization_data["character_books"]:
+                visualization_data["character_books"][char] = []
+            if book_id not in visualization_data["character_books"][char]:
+                visualization_data["character_books"][char].append(book_id)
+        for conflict in conflicts_data:
+            chars = conflict.get('characters_involved', [])
+            if len(chars) >= 2:
+                visualization_data["conflict_network"].append({
+                    "conflict_id": conflict.get('conflict_id'),
+                    "characters": chars,
+                    "book_id": book_id,
+                    "conflict_type": conflict.get('conflict_type'),
+                    "description": conflict.get('description', ''),
+                    "evidence": conflict.get('evidence', '')
+                })
+    for char in all_characters:
+        if char != 'Unknown':
+            char_books = visualization_data["character_books"].get(char, [])
+            char_conflicts = [c for c in visualization_data["conflict_network"] if char in c["characters"]]
+            visualization_data["characters"][char] = {
+                "books": char_books,
+                "book_count": len(char_books),
+                "conflict_count": len(char_conflicts)
+            }
+    return visualization_data
+
+def random_book(rng, book_id):
+    """A corpus results entry mixing dataclasses and plain dicts, repeated names and missing fields"""
+    scenes = [Scene(f"{book_id}_s{i}", book_id, 1, i, 'text') for i in range(rng.randint(0, 4))]
+    goals = []
+    for i in range(rng.randint(0, 6)):
+        if rng.random() < 0.2:
+            goals.append({'goal_id': f"{book_id}_g{i}", 'goal_text': 'no character given'})
+        else:
+            goals.append(Goal(f"{book_id}_g{i}", f"{book_id}_s0", rng.choice(CHARACTERS), 'goal', 'want',
+                              'social', 'quote', 0.9, book_id))
+    conflicts = []
+    for i in range(rng.randint(0, 5)):
+        # Duplicates on purpose: a character named twice in one conflict
+        characters = [rng.choice(CHARACTERS) for _ in range(rng.randint(0, 3))]
+        if rng.random() < 0.2:
+            conflicts.append({'conflict_id': f"{book_id}_c{i}", 'characters_involved': characters})
+        else:
+            conflicts.append(Conflict(f"{book_id}_c{i}", f"{book_id}_s0", 'goal_opposition', 'fight', characters,
+                                      [], 'quote', 'why', 'low', book_id))
+    return {'book_title': book_id, 'scene_count': len(scenes), 'goal_count': len(goals),
+            'conflict_count': len(conflicts), 'scenes': scenes, 'goals': goals, 'conflicts': conflicts}
+
+def assert_same(actual, expected):
+    assert actual == expected
+    # Dict equality ignores order, but the dashboard lists characters in this order
+    assert list(actual['character_books']) == list(expected['character_books'])
+
+@pytest.mark.parametrize('seed', range(20))
+def test_prepare_matches_baseline_on_random_corpora(seed):
+    rng = random.Random(seed)
+    results = {f"book_{i}": random_book(rng, f"book_{i}") for i in range(rng.randint(0, 12))}
+    assert_same(prepare_visualization_data(results), baseline_prepare_visualization_data(results))
+
+@pytest.mark.parametrize('seed', range(20))
+def test_add_remove_replace_sequences_match_a_rebuild(seed):
+    rng = random.Random(1000 + seed)
+    aggregator = VisualizationAggregator()
+    # A dict has the same ordering rules: replacing keeps a book's place, re-adding moves it to the end
+    results = {}
+    for step in range(60):
+        action = rng.random()
+        book_id = f"book_{rng.randint(0, 9)}"
+        if action < 0.6:
+            book = random_book(rng, book_id)
+            results[book_id] = book
+            aggregator.add_book(book_id, book)
+        elif action < 0.8:
+            assert aggregator.remove_book(book_id) == (results.pop(book_id, None) is not None)
+        elif book_id in results:
+            book = random_book(rng, book_id)
+            results[book_id] = book
+            aggregator.replace_book(book_id, book)
+        assert len(aggregator) == len(results)
+        if step % 10 == 9:
+            assert_same(aggregator.to_visualization_data(), baseline_prepare_visualization_data(results))
+    data = aggregator.to_visualization_data()
+    assert_same(data, baseline_prepare_visualization_data(results))
+    # The baseline lists characters in set order; a rebuild and the updated aggregator must agree exactly
+    assert list(data['characters']) == list(prepare_visualization_data(results)['characters'])
+
+def test_relationships_without_books_match_the_full_build():
+    rng = random.Random(7)
+    results = {f"book_{i}": random_book(rng, f"book_{i}") for i in range(8)}
+    aggregator = VisualizationAggregator(keep_books=False)
+    for book_id, book in results.items():
+        aggregator.add_book(book_id, book)
+    expected = baseline_prepare_visualization_data(results)
+    data = aggregator.to_visualization_data()
+    assert data['books'] == []
+    assert data == {**expected, 'books': []}
@@ -0,0 +1,117 @@
+import json
+import re
+import threading
+import time
+
+from modules.data_models import Scene
+from modules.story_processor import SimpleStoryProcessor
+from modules.windowing import TextWindower, pack_windows, paragraph_spans
+
+def count_words(text, model=None):
+    return len(text.split())
+
+class WordCounter:
+    def count_tokens(self, text, model=None):
+        return count_words(text)
+
+class SegmentingProvider:
+    """Offset replies that open a scene at each window's first paragraph and at BREAK"""
+
+    BREAK = 30
+
+    def __init__(self):
+        self.provider = 'ollama'
+        self.model = 'tiny'
+        self.prompts = []
+
+    def call_llm(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        numbered = [int(n) for n in re.findall(r'^\[(\d+)\] ', prompt, re.MULTILINE)]
+        if numbered:
+            starts = {numbered[0]} | ({self.BREAK} & set(numbered))
+            return json.dumps({'scenes': [{'start_paragraph': start} for start in sorted(starts)]})
+        text = prompt.split('\nText:\n', 1)[1].rsplit('\n\nReturn JSON', 1)[0]
+        return json.dumps({'scenes': [{'text': text}]})
+
+def chapter_text(paragraphs=60, words=20):
+    return "\n\n".join(" ".join(f"p{i}w{j}" for j in range(words)) for i in range(1, paragraphs + 1))
+
+def windowed_processor(llm, **kwargs):
+    processor = SimpleStoryProcessor(llm, **kwargs)
+    processor.token_estimator = WordCounter()
+    processor.windower = TextWindower('ollama', 'tiny', count_words, overlap_tokens=40, max_context=2000)
+    return processor
+
+def test_pack_windows_overlap_and_progress():
+    text = chapter_text(30)
+    spans = paragraph_spans(text)
+    windows = pack_windows(text, spans, 100, 40, count_words)
+    assert windows[0][0] == 0 and windows[-1][1] == len(spans) - 1
+    for (first, last), (next_first, next_last) in zip(windows, windows[1:]):
+        assert count_words(text[spans[first][0]:spans[last][1]]) <= 100
+        assert first < next_first <= last + 1 and next_last > last
+        # Two paragraphs (40 words) are repeated across every boundary
+        assert last - next_first + 1 == 2
+
+def test_windows_fit_and_cover_the_text():
+    windower = TextWindower('ollama', 'tiny', count_words, overlap_tokens=40, max_context=2000)
+    text = chapter_text()
+    assert windower.windows("short text") == ["short text"]
+    windows = windower.windows(text, max_tokens=windower.echo_budget())
+    assert len(windows) > 1
+    assert all(count_words(window) <= windower.echo_budget() for window in windows)
+    assert windows[0].startswith('p1w0') and windows[-1].endswith('p60w19')
+
+def test_offset_windows_do_not_break_scenes_at_window_starts():
+    llm = SegmentingProvider()
+    processor = windowed_processor(llm, offset_segmentation=True)
+    chapter = {'chapter_id': 'bk_chapter_1', 'chapter_num': 1, 'text': chapter_text()}
+    prompts, finish = processor._segmentation_requests(chapter, 'bk', 'Kristy')
+    assert len(prompts) > 1
+    assert 'continues from the previous one' not in prompts[0]
+    assert all('continues from the previous one' in prompt for prompt in prompts[1:])
+    scenes = finish([llm.call_llm(prompt) for prompt in prompts])
+    assert [(scene.start_paragraph, scene.end_paragraph) for scene in scenes] == [(1, 29), (30, 60)]
+
+def test_echo_windows_fit_the_output_budget():
+    llm = SegmentingProvider()
+    processor = windowed_processor(llm)
+    chapter = {'chapter_id': 'bk_chapter_1', 'chapter_num': 1, 'text': chapter_text()}
+    prompts, finish = processor._segmentation_requests(chapter, 'bk', 'Kristy')
+    budget = processor.windower.echo_budget()
+    assert budget < processor.windower.budget(0)
+    for prompt in prompts:
+        echoed = prompt.split('\nText:\n', 1)[1].rsplit('\n\nReturn JSON', 1)[0]
+        assert count_words(echoed) <= budget
+    scenes = finish([llm.call_llm(prompt) for prompt in prompts])
+    assert all(isinstance(scene, Scene) and scene.text for scene in scenes)
+
+class ConcurrencyProbe:
+    """Goal replies that record the peak number of requests in flight"""
+
+    def __init__(self):
+        self.provider = 'ollama'
+        self.model = 'tiny'
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def call_llm(self, prompt, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+        return json.dumps({'goals': []})
+
+def test_window_requests_stay_within_the_scene_pool():
+    llm = ConcurrencyProbe()
+    processor = windowed_processor(llm, max_workers=3)
+    processor.windower = TextWindower('ollama', 'tiny', count_words, overlap_tokens=40, max_context=900)
+    scenes = [Scene(f"bk_s{i}", 'bk', 1, i, chapter_text()) for i in range(6)]
+    processor._analyze_goals_per_scene(scenes)
+    assert llm.calls > len(scenes)
+    assert llm.peak <= 3
@@ -0,0 +1,161 @@
+import threading
+import time
+
+import pytest
+
+from modules.corpus_manager import processor_run_info, run_shard_worker
+from modules.story_processor import SimpleStoryProcessor
+from modules.work_queue import LeaseWorkQueue
+
+def test_claim_skips_leased_and_done_books(tmp_path):
+    queue = LeaseWorkQueue(tmp_path)
+    assert queue.claim(['a', 'b'], 'w1') == 'a'
+    assert queue.claim(['a', 'b'], 'w2') == 'b'
+    assert queue.claim(['a', 'b'], 'w3') is None
+    assert queue.complete('a', 'w1', {'book': 'a'})
+    assert queue.load_result('a') == {'book': 'a'}
+    assert queue.get_status(['a', 'b', 'c']) == {'done': 1, 'leased': 1, 'failed': 0, 'pending': 1}
+
+def test_expired_lease_is_reclaimed_and_old_owner_cannot_complete(tmp_path):
+    queue = LeaseWorkQueue(tmp_path, lease_seconds=0.05)
+    assert queue.claim(['a'], 'w1') == 'a'
+    time.sleep(0.1)
+    assert queue.claim(['a'], 'w2') == 'a'
+    assert not queue.renew('a', 'w1')
+    assert not queue.complete('a', 'w1', {'by': 'w1'})
+    assert queue.load_result('a') is None
+    # The failed renew left w2's lease untouched
+    assert queue.renew('a', 'w2')
+    assert queue.complete('a', 'w2', {'by': 'w2'})
+    assert queue.load_result('a') == {'by': 'w2'}
+    assert list(queue.leases_dir.iterdir()) == []
+
+def test_heartbeat_keeps_the_lease_alive(tmp_path):
+    queue = LeaseWorkQueue(tmp_path, lease_seconds=0.3)
+    queue.claim(['a'], 'w1')
+    with queue.heartbeat('a', 'w1') as heartbeat:
+        time.sleep(0.5)
+        assert queue.claim(['a'], 'w2') is None
+    assert not heartbeat.lost
+
+def test_heartbeat_reports_a_lost_lease(tmp_path):
+    queue = LeaseWorkQueue(tmp_path, lease_seconds=0.3)
+    queue.claim(['a'], 'w1')
+    with queue.heartbeat('a', 'w1') as heartbeat:
+        queue._lease_path('a').unlink()
+        assert queue.claim(['a'], 'w2') == 'a'
+        time.sleep(0.25)
+    assert heartbeat.lost
+
+def test_failures_stop_after_max_attempts(tmp_path):
+    queue = LeaseWorkQueue(tmp_path, max_attempts=2)
+    for _ in range(2):
+        assert queue.claim(['a'], 'w1') == 'a'
+        queue.fail('a', 'w1', 'boom')
+    assert queue.claim(['a'], 'w1') is None
+    assert queue.get_status(['a'])['failed'] == 1
+
+def test_renewing_never_frees_a_live_lease(tmp_path):
+    queue = LeaseWorkQueue(tmp_path, lease_seconds=60)
+    queue.claim(['a'], 'w1')
+    stop = threading.Event()
+    stolen = []
+
+    def steal(worker_id):
+        while not stop.is_set():
+            if queue.claim(['a'], worker_id):
+                stolen.append(worker_id)
+
+    thieves = [threading.Thread(target=steal, args=(f"w{n}",)) for n in (2, 3)]
+    for thief in thieves:
+        thief.start()
+    try:
+        for _ in range(200):
+            assert queue.renew('a', 'w1')
+    finally:
+        stop.set()
+        for thief in thieves:
+            thief.join()
+    assert stolen == []
+
+def test_only_the_lease_holder_records_a_failure(tmp_path):
+    queue = LeaseWorkQueue(tmp_path)
+    queue.claim(['a'], 'w1')
+    assert not queue.fail('a', 'w2', 'not mine')
+    assert queue.failure_count('a') == 0
+    assert queue.renew('a', 'w1')
+    assert queue.fail('a', 'w1', 'boom')
+    assert queue.failure_count('a') == 1
+    assert list(queue.leases_dir.iterdir()) == []
+
+def test_lock_left_by_a_crashed_worker_is_broken(tmp_path):
+    queue = LeaseWorkQueue(tmp_path)
+    queue.LOCK_STALE_SECONDS = 0.05
+    queue.claim(['a'], 'w1')
+    queue._lock_path('a').touch()
+    time.sleep(0.1)
+    assert queue.renew('a', 'w1')
+    assert not queue._lock_path('a').exists()
+
+class FakeProvider:
+    def __init__(self, model='fake'):
+        self.provider = 'ollama'
+        self.model = model
+
+class StealingProcessor(SimpleStoryProcessor):
+    """Analyzes a book while another worker takes over its lease"""
+
+    def __init__(self, queue):
+        super().__init__(FakeProvider())
+        self.queue = queue
+
+    def analyze_story(self, text, book_id, checkpoint=None):
+        self.queue._lease_path(book_id).unlink()
+        assert self.queue.claim([book_id], 'other') == book_id
+        return {'scenes': [], 'goals': [], 'conflicts': []}
+
+def test_worker_discards_the_result_of_a_lost_lease(tmp_path):
+    corpus = tmp_path / 'corpus'
+    corpus.mkdir()
+    (corpus / 'a.txt').write_text('Once upon a time.', encoding='utf-8')
+    queue = LeaseWorkQueue(tmp_path / 'queue')
+    assert run_shard_worker(corpus, StealingProcessor(queue), queue_dir=queue.queue_dir, worker_id='w1') == 0
+    assert queue.load_result('a') is None
+    assert queue.renew('a', 'other')
+
+def test_queue_refuses_results_of_another_run(tmp_path):
+    run = processor_run_info(SimpleStoryProcessor(FakeProvider('model-a')))
+    queue = LeaseWorkQueue(tmp_path, run_info=run)
+    queue.claim(['a'], 'w1')
+    queue.complete('a', 'w1', {'book': 'a'})
+    assert LeaseWorkQueue(tmp_path, run_info=dict(run)).run_info == run
+    for other in (processor_run_info(SimpleStoryProcessor(FakeProvider('model-b'))),
+                  processor_run_info(SimpleStoryProcessor(FakeProvider('model-a'), offset_segmentation=True))):
+        with pytest.raises(ValueError):
+            LeaseWorkQueue(tmp_path, run_info=other)
+
+def test_queue_without_a_manifest_is_not_adopted(tmp_path):
+    queue = LeaseWorkQueue(tmp_path)
+    queue.claim(['a'], 'w1')
+    queue.complete('a', 'w1', {'book': 'a'})
+    with pytest.raises(ValueError):
+        LeaseWorkQueue(tmp_path, run_info={'provider': 'ollama', 'model': 'fake'})
+
+class RecordingProcessor(SimpleStoryProcessor):
+    def __init__(self):
+        super().__init__(FakeProvider())
+        self.stores = []
+
+    def analyze_story(self, text, book_id, checkpoint=None):
+        self.stores.append(checkpoint)
+        return {'scenes': [], 'goals': [], 'conflicts': []}
+
+@pytest.mark.parametrize('resume', [False, True])
+def test_worker_checkpoints_follow_the_resume_flag(tmp_path, resume):
+    corpus = tmp_path / 'corpus'
+    corpus.mkdir()
+    (corpus / 'a.txt').write_text('Once upon a time.', encoding='utf-8')
+    processor = RecordingProcessor()
+    run_shard_worker(corpus, processor, queue_dir=tmp_path / 'queue', worker_id='w1',
+                     checkpoint_dir=tmp_path / 'checkpoints', resume=resume)
+    assert [store.resume for store in processor.stores] == [resume]